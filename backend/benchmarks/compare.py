@@ -0,0 +1,98 @@
+"""
+Compare two benchmark result files and flag regressions
+
+An operation regresses when its p95 latency grew, or its throughput dropped, by more than --max-regression
+(default 20%). Operations with fewer than --min-samples requests in either run are reported but never flagged.
+
+Usage: python compare.py results/<baseline>.json results/<current>.json [--max-regression 0.2]
+Exit status is 1 if anything regressed, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+DEFAULT_MAX_REGRESSION = 0.2
+DEFAULT_MIN_SAMPLES = 50
+
+
+def _change(before, after):
+    if not before:
+        return None
+    return (after - before) / before
+
+
+def compare(baseline, current, max_regression=DEFAULT_MAX_REGRESSION, min_samples=DEFAULT_MIN_SAMPLES):
+    """Per-operation comparison rows and the names of regressed operations"""
+    rows = []
+    regressions = []
+    for name in sorted(set(baseline['operations']) | set(current['operations'])):
+        before = baseline['operations'].get(name)
+        after = current['operations'].get(name)
+        if before is None or after is None:
+            rows.append({'operation': name, 'note': 'only in baseline' if after is None else 'only in current'})
+            continue
+        row = {
+            'operation': name,
+            'throughput': (before['throughput_rps'], after['throughput_rps'],
+                           _change(before['throughput_rps'], after['throughput_rps'])),
+            'p50_ms': (before['p50_ms'], after['p50_ms'], _change(before['p50_ms'], after['p50_ms'])),
+            'p95_ms': (before['p95_ms'], after['p95_ms'], _change(before['p95_ms'], after['p95_ms'])),
+            'p99_ms': (before['p99_ms'], after['p99_ms'], _change(before['p99_ms'], after['p99_ms'])),
+            'error_rate': (before['error_rate'], after['error_rate'], None),
+        }
+        regressed = []
+        if min(before['count'], after['count']) >= min_samples:
+            if (row['p95_ms'][2] or 0) > max_regression:
+                regressed.append('p95')
+            if (row['throughput'][2] or 0) < -max_regression:
+                regressed.append('throughput')
+            if after['error_rate'] > before['error_rate'] + 0.01:
+                regressed.append('errors')
+        else:
+            row['note'] = 'too few samples'
+        row['regressed'] = regressed
+        if regressed:
+            regressions.append(name)
+        rows.append(row)
+    return rows, regressions
+
+
+def _fmt(value, spec='>9.2f'):
+    before, after, change = value
+    text = f'{before:{spec}} -> {after:{spec}}'
+    return text + (f' ({change:+6.1%})' if change is not None else '          ')
+
+
+def print_report(rows, regressions, baseline, current):
+    print(f"baseline: {baseline['meta'].get('commit', '?')[:12]}  ({baseline['meta'].get('timestamp')})")
+    print(f"current:  {current['meta'].get('commit', '?')[:12]}  ({current['meta'].get('timestamp')})")
+    for row in rows:
+        print()
+        flag = f"  REGRESSED: {', '.join(row['regressed'])}" if row.get('regressed') else ''
+        print(f"{row['operation']}{flag}{'  (' + row['note'] + ')' if row.get('note') else ''}")
+        for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate'):
+            if key in row:
+                print(f"  {key:<11} {_fmt(row[key], '>9.2%' if key == 'error_rate' else '>9.2f')}")
+    print()
+    print(f"{len(regressions)} regression(s){': ' + ', '.join(regressions) if regressions else ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION)
+    parser.add_argument('--min-samples', type=int, default=DEFAULT_MIN_SAMPLES)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressions = compare(baseline, current, args.max_regression, args.min_samples)
+    print_report(rows, regressions, baseline, current)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
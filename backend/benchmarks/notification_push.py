@@ -0,0 +1,307 @@
+"""
+Notification benchmark: database queries per minute for idle clients, unreadCount polling vs push streams
+
+Runs three phases of --duration seconds each and reads MySQL's global `Questions` counter around every phase:
+- idle: no clients; the background queries of the running services (outbox dispatcher, pool pings)
+- poll: --clients clients each running `unreadCount` every --poll-interval seconds, as the apps did
+- push: --clients clients holding GET /notifications/stream open, with no new notifications
+
+Queries per minute are reported with and without the idle baseline. After the push phase one notification is
+created for the first user and the time until every one of that user's streams received it is reported.
+
+Assumptions:
+- MySQL serves nothing but these services during the run (the counter is server-wide)
+- each open stream holds a notification-service thread, and the service starts one per allowed stream
+  (NOTIFICATION_STREAM_MAX_CONNECTIONS) on top of SERVER_THREADS: with --start-services it is raised to
+  --clients when the default is lower; otherwise configure it yourself
+- clients are spread over ceil(clients / --streams-per-user) benchmark users, registered on the first run
+
+Usage:
+    python notification_push.py --start-services --mysql docker
+    python notification_push.py --clients 1000 --duration 60 --poll-interval 10
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+import requests
+
+import services
+import workload
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+CREATE_NOTIFICATION_MUTATION = '''mutation Create($userId: Int!, $message: String!){
+  createNotification(userId: $userId, message: $message) { notificationId } }'''
+
+
+class QuestionCounter:
+    """MySQL's server-wide statement counter, read over one dedicated connection"""
+
+    def __init__(self, db_env):
+        setting = lambda key, default: db_env.get(key) or os.getenv(key, default)
+        self.conn = mysql.connector.connect(
+            host=setting('DB_HOST', 'localhost'), port=int(setting('DB_PORT', 3306)), user=setting('DB_USER', 'root'),
+            password=setting('DB_PASSWORD', ''), database=setting('DB_NAME', 'doswallet')
+        )
+
+    def read(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        value = int(cursor.fetchone()[1])
+        cursor.close()
+        return value
+
+    def measure(self, seconds):
+        """Statements the server executed during `seconds`, excluding this counter's own"""
+        before = self.read()
+        time.sleep(seconds)
+        return self.read() - before - 1
+
+    def close(self):
+        self.conn.close()
+
+
+class Counter:
+    """unreadCount requests made by the poll clients"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def add(self, ok):
+        with self._lock:
+            if ok:
+                self.requests += 1
+            else:
+                self.errors += 1
+
+    def reset(self):
+        with self._lock:
+            self.requests = self.errors = 0
+
+
+def poll_client(urls, user, interval, stop, stats):
+    client = workload.GraphQLClient(urls)
+    client.set_token(user.token)
+    # Clients opened at random moments, so their timers are spread over the interval
+    if stop.wait(random.uniform(0, interval)):
+        return
+    while True:
+        try:
+            client.execute('notification', workload.UNREAD_COUNT_QUERY)
+            stats.add(True)
+        except Exception:
+            stats.add(False)
+        if stop.wait(interval):
+            return
+
+
+class StreamClient:
+    """One open GET /notifications/stream; records when each notification event arrived"""
+
+    def __init__(self, url, user):
+        self.url = url
+        self.user = user
+        self.received = {}  # notification_id -> arrival time
+        self.status = None
+        self.response = None
+
+    def run(self, stop):
+        try:
+            self.response = requests.get(f'{self.url}/notifications/stream', stream=True, timeout=(10, 120),
+                                         headers={'Authorization': f'Bearer {self.user.token}',
+                                                  'Accept': 'text/event-stream'})
+            self.status = self.response.status_code
+            if self.status != 200:
+                return
+            event_id = None
+            # chunk_size=None: hand over each chunk as it arrives instead of waiting for 512 bytes
+            for line in self.response.iter_lines(chunk_size=None, decode_unicode=True):
+                if stop.is_set():
+                    return
+                if line.startswith('id: '):
+                    event_id = int(line[4:])
+                elif line.startswith('event: notification') and event_id is not None:
+                    self.received[event_id] = time.perf_counter()
+        except Exception:
+            if self.status is None:
+                self.status = 'error'
+        finally:
+            if self.response is not None:
+                self.response.close()
+
+
+def prepare_users(args, urls):
+    count = math.ceil(args.clients / args.streams_per_user)
+    users = workload.make_users(count, args.user_prefix, args.password)
+    print(f'Preparing {len(users)} benchmark users...')
+
+    def prepare(user):
+        workload.ensure_user(workload.GraphQLClient(urls), user)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(prepare, users))
+    return users
+
+
+def run_poll(args, urls, users, counter):
+    stop = threading.Event()
+    stats = Counter()
+    threads = [threading.Thread(target=poll_client, args=(urls, users[i % len(users)], args.poll_interval, stop, stats),
+                                daemon=True) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    # One full interval first so every client's timer is running
+    time.sleep(args.poll_interval)
+    stats.reset()
+    queries = counter.measure(args.duration)
+    requests_made, errors = stats.requests, stats.errors
+    stop.set()
+    for t in threads:
+        t.join()
+    return {'queries': queries, 'requests': requests_made, 'errors': errors}
+
+
+def run_push(args, urls, users, counter):
+    stop = threading.Event()
+    clients = [StreamClient(urls['notification'], users[i % len(users)]) for i in range(args.clients)]
+    threads = [threading.Thread(target=client.run, args=(stop,), daemon=True) for client in clients]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 60
+    while any(client.status is None for client in clients) and time.monotonic() < deadline:
+        time.sleep(0.5)
+    statuses = {}
+    for client in clients:
+        statuses[str(client.status)] = statuses.get(str(client.status), 0) + 1
+    connected = [client for client in clients if client.status == 200]
+    print(f'  streams: {statuses}')
+    time.sleep(2)  # let the connect-time queries settle
+
+    queries = counter.measure(args.duration)
+
+    # Delivery latency of one notification to every stream of the first user
+    target = users[0]
+    admin = workload.GraphQLClient(urls)
+    created_at = time.perf_counter()
+    notification_id = admin.execute('notification', CREATE_NOTIFICATION_MUTATION, {
+        'userId': target.user_id, 'message': 'notification push benchmark'
+    })['createNotification']['notificationId']
+    receivers = [client for client in connected if client.user is target]
+    wait_until = time.monotonic() + 30
+    while any(notification_id not in client.received for client in receivers) and time.monotonic() < wait_until:
+        time.sleep(0.01)
+    latencies = [client.received[notification_id] - created_at for client in receivers if notification_id in client.received]
+
+    stop.set()
+    for client in clients:
+        if client.response is not None:
+            client.response.close()
+    for t in threads:
+        t.join(timeout=5)
+    return {
+        'queries': queries,
+        'connected': len(connected),
+        'statuses': statuses,
+        'delivery': {
+            'streams': len(receivers),
+            'received': len(latencies),
+            'max_ms': round(max(latencies) * 1000, 1) if latencies else None,
+        },
+    }
+
+
+def per_minute(queries, seconds):
+    return round(queries * 60 / seconds, 1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Notification polling vs push: DB queries per minute')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds per phase')
+    parser.add_argument('--poll-interval', type=float, default=10, help='seconds between unreadCount polls')
+    parser.add_argument('--streams-per-user', type=int, default=4,
+                        help='open clients per benchmark user (keep <= NOTIFICATION_STREAM_MAX_PER_USER)')
+    parser.add_argument('--modes', default='idle,poll,push')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--start-services', action='store_true', help='start the four services from this tree')
+    parser.add_argument('--mysql', choices=['local', 'docker'], default='local')
+    parser.add_argument('--user-prefix', default='pushbench')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--output', help='result file (default: results/notification-push-<timestamp>.json)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    urls = services.service_urls(args.host)
+    processes = []
+    db_env = {}
+    results = {}
+    try:
+        if args.start_services:
+            db_env = services.start_docker_mysql() if args.mysql == 'docker' else {}
+            # Streams are not spread evenly over the workers, so leave each one room for all of them
+            max_connections = max(args.clients, int(os.getenv('NOTIFICATION_STREAM_MAX_CONNECTIONS', 100)))
+            env = dict(db_env, NOTIFICATION_STREAM_MAX_CONNECTIONS=str(max_connections),
+                       NOTIFICATION_STREAM_MAX_PER_USER=str(max(args.streams_per_user, 5)))
+            print(f'Notification service allows {max_connections} streams per worker')
+            processes = services.start_services(env, os.path.join(RESULTS_DIR, 'logs'))
+        else:
+            services.wait_healthy(urls, timeout=5)
+        users = prepare_users(args, urls)
+        counter = QuestionCounter(db_env)
+        try:
+            for mode in modes:
+                print(f'{mode}: {args.clients if mode != "idle" else 0} clients for {args.duration:g}s...')
+                if mode == 'idle':
+                    results[mode] = {'queries': counter.measure(args.duration)}
+                elif mode == 'poll':
+                    results[mode] = run_poll(args, urls, users, counter)
+                elif mode == 'push':
+                    results[mode] = run_push(args, urls, users, counter)
+                else:
+                    raise SystemExit(f'unknown mode {mode!r}')
+                results[mode]['queries_per_minute'] = per_minute(results[mode]['queries'], args.duration)
+        finally:
+            counter.close()
+    finally:
+        services.stop_services(processes)
+
+    baseline = results.get('idle', {}).get('queries_per_minute', 0)
+    print()
+    print(f"{'mode':<8}{'queries/min':>14}{'minus idle':>14}")
+    for mode, result in results.items():
+        result['queries_per_minute_over_idle'] = round(result['queries_per_minute'] - baseline, 1)
+        print(f"{mode:<8}{result['queries_per_minute']:>14.1f}{result['queries_per_minute_over_idle']:>14.1f}")
+    if 'poll' in results:
+        print(f"poll: {results['poll']['requests']} unreadCount requests, {results['poll']['errors']} errors")
+    if 'push' in results:
+        push = results['push']
+        print(f"push: {push['connected']}/{args.clients} streams open; new notification reached "
+              f"{push['delivery']['received']}/{push['delivery']['streams']} of its user's streams, "
+              f"slowest after {push['delivery']['max_ms']} ms")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"notification-push-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'clients': args.clients, 'duration_s': args.duration, 'poll_interval_s': args.poll_interval,
+                   'results': results}, f, indent=2)
+    print(f'\nResults written to {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Password hashing benchmark: login password checks per second per core, by bcrypt cost factor
+
+For each cost in --rounds, builds the user service's PasswordHasher with --workers processes and has --clients
+threads call check_password (what a login does) for --duration seconds. Reports checks/s, checks/s per worker
+process (per core, with one process per core) and the latency of a check including its wait for a free process.
+Clients beyond workers + --queue get HasherBusy, which the login mutation turns into HTTP 429; they are counted as
+rejected and retried after 10 ms.
+
+No services or database are needed. Pick PASSWORD_HASH_ROUNDS from the per-core rate and the login rate
+the user service must sustain per core.
+
+Usage:
+    python password_hashing.py                               # costs 10-13, one process per core
+    python password_hashing.py --rounds 12 --workers 2 --clients 64 --queue 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'user-service'))
+import passwords
+
+PASSWORD = 'benchmark-password'
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values))) - 1))]
+
+
+def run(rounds, args):
+    hasher = passwords.PasswordHasher(workers=args.workers, queue_size=args.queue, rounds=rounds)
+    stored = hasher.hash_password(PASSWORD)
+    # Start every process before measuring
+    warm = [threading.Thread(target=hasher.check_password, args=(PASSWORD, stored)) for _ in range(args.workers)]
+    for t in warm:
+        t.start()
+    for t in warm:
+        t.join()
+
+    lock = threading.Lock()
+    latencies = []
+    rejected = [0]
+    deadline = time.perf_counter() + args.duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                hasher.check_password(PASSWORD, stored)
+            except passwords.HasherBusy:
+                with lock:
+                    rejected[0] += 1
+                time.sleep(0.01)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    hasher.close()
+
+    latencies.sort()
+    rate = len(latencies) / elapsed
+    return {
+        'rounds': rounds,
+        'checks_per_s': rate,
+        'per_core': rate / max(args.workers, 1),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'rejected': rejected[0],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='bcrypt login checks per second per core, by cost factor')
+    parser.add_argument('--rounds', default='10,11,12,13', help='comma-separated bcrypt cost factors')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='hashing processes')
+    parser.add_argument('--queue', type=int, default=16, help='jobs allowed to wait for a process')
+    parser.add_argument('--clients', type=int, default=None, help='concurrent logins (default: workers + queue)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per cost factor')
+    args = parser.parse_args(argv)
+    if args.clients is None:
+        args.clients = args.workers + args.queue
+
+    print(f'{args.workers} hashing processes, queue {args.queue}, {args.clients} clients, {args.duration:g}s per cost')
+    print(f"{'cost':>4}{'checks/s':>11}{'per core':>10}{'p50 ms':>10}{'p99 ms':>10}{'429s':>8}")
+    for rounds in [int(r) for r in args.rounds.split(',')]:
+        r = run(rounds, args)
+        print(f"{r['rounds']:>4}{r['checks_per_s']:>11.1f}{r['per_core']:>10.1f}{r['p50_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['rejected']:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+DosWallet benchmark harness
+
+Drives a weighted mix of user-facing operations (login, my_wallet, deposit, hot-pair transfers, history paging,
+notification polling) against the four services with CONCURRENCY client threads, and writes throughput and
+p50/p95/p99 latency per operation to a JSON file tagged with the git commit. Compare two runs with compare.py.
+
+Assumptions:
+- either the services are already running (default: localhost:5001-5004), or --start-services starts them from
+  this working tree, against a local MySQL (DB_* env / backend/.env) or, with --mysql docker, the compose container
+- benchmark users (bench<N>@bench.doswallet.local) are registered on the first run and reused afterwards
+
+Usage:
+    python run.py --start-services --mysql docker --duration 60
+    python run.py --duration 30 --concurrency 32 --mix my_wallet=50,transfer_hot_pair=50
+    python run.py --baseline results/<earlier-run>.json      # exit status 1 on regression
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import compare
+import services
+import workload
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput / latency summary of one operation; latencies in seconds"""
+    latencies = sorted(latencies)
+    count = len(latencies) + errors
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'count': count,
+        'ok': len(latencies),
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+class Recorder:
+    """Per-operation latencies and error messages, collected from all worker threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    def ok(self, name, seconds):
+        with self._lock:
+            self.latencies[name].append(seconds)
+
+    def error(self, name, message):
+        with self._lock:
+            self.errors[name][message[:200]] += 1
+
+
+def worker(index, ctx, urls, mix, warmup_until, deadline, recorder):
+    user = ctx.users[index % len(ctx.users)]
+    client = workload.GraphQLClient(urls)
+    client.set_token(user.token)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    rng = random.Random(index)
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        name = rng.choices(names, weights)[0]
+        try:
+            workload.OPERATIONS[name](client, ctx, user)
+            failure = None
+        except Exception as e:
+            failure = str(e) or type(e).__name__
+        if start < warmup_until:
+            continue
+        if failure is None:
+            recorder.ok(name, time.perf_counter() - start)
+        else:
+            recorder.error(name, failure)
+
+
+def prepare_users(args, urls):
+    users = workload.make_users(max(args.users, 2), args.user_prefix, args.password)
+    client = workload.GraphQLClient(urls)
+    print(f'Preparing {len(users)} benchmark users...')
+    for user in users:
+        workload.ensure_user(client, user)
+        workload.seed(client, user)
+    return workload.WorkloadContext(users)
+
+
+def run(args, urls):
+    mix = workload.parse_mix(args.mix)
+    ctx = prepare_users(args, urls)
+    recorder = Recorder()
+    warmup_until = time.perf_counter() + args.warmup
+    deadline = warmup_until + args.duration
+    threads = [threading.Thread(target=worker, args=(i, ctx, urls, mix, warmup_until, deadline, recorder), daemon=True)
+               for i in range(args.concurrency)]
+    print(f'Running {args.concurrency} clients for {args.warmup:g}s warmup + {args.duration:g}s: '
+          + ', '.join(f'{name}={weight:g}' for name, weight in mix.items()))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    operations = {}
+    for name in mix:
+        operations[name] = summarize(recorder.latencies[name], sum(recorder.errors[name].values()), args.duration)
+        if recorder.errors[name]:
+            operations[name]['top_errors'] = dict(recorder.errors[name].most_common(5))
+    all_latencies = [s for name in mix for s in recorder.latencies[name]]
+    all_errors = sum(sum(recorder.errors[name].values()) for name in mix)
+    return {
+        'meta': run_metadata(args, mix),
+        'operations': operations,
+        'total': summarize(all_latencies, all_errors, args.duration),
+    }
+
+
+def _git(*argv):
+    try:
+        return subprocess.run(['git', *argv], cwd=services.REPO_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(args, mix):
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'commit_subject': _git('log', '-1', '--format=%s'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'duration_s': args.duration,
+        'warmup_s': args.warmup,
+        'concurrency': args.concurrency,
+        'users': max(args.users, 2),
+        'mix': mix,
+        'services_started': args.start_services,
+        'mysql': args.mysql,
+        'server_mode': os.getenv('SERVER_MODE', 'production') if args.start_services else None,
+        'python': platform.python_version(),
+        'host': platform.node(),
+    }
+
+
+def print_summary(result):
+    print()
+    print(f"{'operation':<20}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, s in list(result['operations'].items()) + [('TOTAL', result['total'])]:
+        print(f"{name:<20}{s['throughput_rps']:>9.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+              f"{s['errors']:>8}")
+    for name, s in result['operations'].items():
+        for message, count in s.get('top_errors', {}).items():
+            print(f'  {name}: {count} x {message}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='DosWallet benchmark harness')
+    parser.add_argument('--duration', type=float, default=float(os.getenv('DURATION', 60)), help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=float(os.getenv('WARMUP', 5)),
+                        help='seconds run before measuring')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('CONCURRENCY', 16)))
+    parser.add_argument('--users', type=int, default=int(os.getenv('BENCH_USERS', 16)),
+                        help='distinct users; the first two are the hot transfer pair')
+    parser.add_argument('--mix', default=os.getenv('BENCH_MIX'),
+                        help='weights, e.g. login=5,my_wallet=30 (default: %s)'
+                             % ','.join(f'{k}={v}' for k, v in workload.DEFAULT_MIX.items()))
+    parser.add_argument('--host', default='localhost', help='host the services listen on')
+    parser.add_argument('--start-services', action='store_true', help='start the four services from this tree')
+    parser.add_argument('--mysql', choices=['local', 'docker'], default='local',
+                        help='with --start-services: use DB_* settings as-is, or start the compose mysql container')
+    parser.add_argument('--user-prefix', default='bench')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--output', help='result file (default: results/<timestamp>-<commit>.json)')
+    parser.add_argument('--baseline', help='earlier result file to compare against')
+    parser.add_argument('--max-regression', type=float, default=compare.DEFAULT_MAX_REGRESSION)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    urls = services.service_urls(args.host)
+    processes = []
+    try:
+        if args.start_services:
+            db_env = services.start_docker_mysql() if args.mysql == 'docker' else {}
+            processes = services.start_services(db_env, os.path.join(RESULTS_DIR, 'logs'))
+        else:
+            services.wait_healthy(urls, timeout=5)
+        result = run(args, urls)
+    finally:
+        services.stop_services(processes)
+
+    print_summary(result)
+    output = args.output
+    if not output:
+        commit = (result['meta']['commit'] or 'nogit')[:12] + ('-dirty' if result['meta']['dirty'] else '')
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{stamp}-{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        rows, regressions = compare.compare(baseline, result, args.max_regression)
+        compare.print_report(rows, regressions, baseline, result)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Start MySQL and the four services for a benchmark run
+
+The services always run from the working tree (not from docker images), so a result measures the checked-out
+commit. MySQL is either the `mysql` container from docker-compose.yml or an instance you already run locally.
+"""
+import os
+import subprocess
+import sys
+import time
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..')
+REPO_DIR = os.path.join(BACKEND_DIR, '..')
+sys.path.insert(0, BACKEND_DIR)
+from start_all_services import services as SERVICES
+
+# Same key -> service name mapping as the workload's GraphQLClient
+SERVICE_KEYS = {5001: 'user', 5002: 'wallet', 5003: 'transaction', 5004: 'notification'}
+MYSQL_CONTAINER = 'doswallet-mysql'
+
+
+def service_urls(host='localhost'):
+    return {SERVICE_KEYS[s['port']]: f"http://{host}:{s['port']}" for s in SERVICES}
+
+
+def _read_env_file(path):
+    values = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, _, value = line.partition('=')
+                values[key.strip()] = value.strip()
+    return values
+
+
+def start_docker_mysql(timeout=180):
+    """`docker compose up -d mysql` and wait for its healthcheck. Returns the DB env the services should use."""
+    print('Starting MySQL container...')
+    subprocess.run(['docker', 'compose', 'up', '-d', 'mysql'], cwd=REPO_DIR, check=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        status = subprocess.run(['docker', 'inspect', '--format', '{{.State.Health.Status}}', MYSQL_CONTAINER],
+                                capture_output=True, text=True).stdout.strip()
+        if status == 'healthy':
+            break
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'MySQL container not healthy after {timeout}s (status: {status or "unknown"})')
+        time.sleep(2)
+    # Host-side connection settings for the container (published on port 3310)
+    env = _read_env_file(os.path.join(BACKEND_DIR, 'docker-db-config.env'))
+    return {key: env[key] for key in ('DB_HOST', 'DB_PORT', 'DB_USER', 'DB_PASSWORD', 'DB_NAME') if key in env}
+
+
+def wait_healthy(urls, timeout=60):
+    deadline = time.monotonic() + timeout
+    pending = dict(urls)
+    while pending:
+        for name, url in list(pending.items()):
+            try:
+                if requests.get(f'{url}/health', timeout=2).status_code == 200:
+                    del pending[name]
+            except requests.RequestException:
+                pass
+        if pending:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Services not healthy after {timeout}s: {', '.join(sorted(pending))}")
+            time.sleep(0.5)
+
+
+def start_services(env_overrides, log_dir):
+    """Start every service like start_all_services.py does; output goes to <log_dir>/<service>.log"""
+    env = os.environ.copy()
+    env.update(env_overrides)
+    env.setdefault('SERVER_MODE', 'production')
+    os.makedirs(log_dir, exist_ok=True)
+    processes = []
+    try:
+        for service in SERVICES:
+            key = SERVICE_KEYS[service['port']]
+            log = open(os.path.join(log_dir, f'{key}-service.log'), 'wb')
+            print(f"Starting {service['name']} on port {service['port']} (log: {log.name})")
+            processes.append((subprocess.Popen([sys.executable, service['script']], cwd=service['path'], env=env,
+                                               stdout=log, stderr=subprocess.STDOUT), log))
+        wait_healthy(service_urls())
+    except Exception:
+        stop_services(processes)
+        raise
+    return processes
+
+
+def stop_services(processes):
+    for process, _ in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process, log in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
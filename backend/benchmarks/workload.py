@@ -0,0 +1,215 @@
+"""
+Benchmark workload: GraphQL operations against the four services and the weighted mix they are drawn from
+
+Every operation is a function taking (client, ctx, user) that raises on failure. `client` is a per-thread
+GraphQLClient logged in as `user`; `ctx` is the shared WorkloadContext (user pool, hot pair).
+"""
+import random
+import threading
+import uuid
+import zlib
+import requests
+
+LOGIN_MUTATION = '''mutation Login($email: String!, $password: String!){
+  login(input: {email: $email, password: $password}) { token message user { userId } } }'''
+
+REGISTER_MUTATION = '''mutation Register($name: String!, $email: String!, $phone: String!, $password: String!){
+  register(input: {name: $name, email: $email, phone: $phone, password: $password}) { token message user { userId } } }'''
+
+MY_WALLET_QUERY = '''query { my_wallet { balance points } }'''
+
+DEPOSIT_MUTATION = '''mutation Deposit($amount: Float!, $key: String){
+  deposit(amount: $amount, paymentMethod: "benchmark", idempotencyKey: $key) { transaction_id amount } }'''
+
+TRANSFER_MUTATION = '''mutation Transfer($receiverId: Int!, $amount: Float!, $key: String){
+  transfer(receiverId: $receiverId, amount: $amount, description: "benchmark", idempotencyKey: $key) { transaction_id } }'''
+
+HISTORY_QUERY = '''query History($first: Int, $after: String){
+  myTransactionsConnection(first: $first, after: $after) {
+    edges { node { transaction_id amount type date } }
+    pageInfo { hasNextPage endCursor } } }'''
+
+UNREAD_COUNT_QUERY = '''query { unreadCount }'''
+
+NOTIFICATIONS_QUERY = '''query Notifications($limit: Int){
+  myNotifications(limit: $limit, unreadOnly: true) { notificationId message date } }'''
+
+# Relative weight of each operation in the default mix
+DEFAULT_MIX = {
+    'login': 5,
+    'my_wallet': 30,
+    'deposit': 15,
+    'transfer_hot_pair': 10,
+    'history_page': 20,
+    'notification_poll': 20,
+}
+
+# Balance every benchmark user is topped up to before the run, so transfers never fail for lack of funds
+SEED_BALANCE = 1_000_000.0
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGES = 5
+
+
+class GraphQLError(Exception):
+    """Request failed at the HTTP or GraphQL layer"""
+
+
+class GraphQLClient:
+    """requests.Session wrapper posting GraphQL to the per-service endpoints"""
+
+    def __init__(self, urls, timeout=30):
+        self.urls = urls
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['Content-Type'] = 'application/json'
+
+    def set_token(self, token):
+        self.session.headers['Authorization'] = f'Bearer {token}'
+
+    def execute(self, service, query, variables=None):
+        response = self.session.post(f'{self.urls[service]}/graphql', json={'query': query, 'variables': variables or {}},
+                                     timeout=self.timeout)
+        if response.status_code != 200:
+            raise GraphQLError(f'{service} returned HTTP {response.status_code}')
+        body = response.json()
+        if body.get('errors'):
+            raise GraphQLError(f"{service}: {body['errors'][0].get('message')}")
+        return body['data']
+
+
+class BenchUser:
+    def __init__(self, index, email, phone, password):
+        self.index = index
+        self.email = email
+        self.phone = phone
+        self.password = password
+        self.user_id = None
+        self.token = None
+
+
+class WorkloadContext:
+    """Users shared by all workers, plus the two wallets the hot-pair transfers bounce between"""
+
+    def __init__(self, users):
+        self.users = users
+        self.hot_pair = users[:2]
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    def history_position(self, user_id):
+        """(cursor, pages read) where this user's history paging stopped, so consecutive pages walk back"""
+        with self._lock:
+            return self._cursors.get(user_id, (None, 0))
+
+    def set_history_position(self, user_id, cursor, pages):
+        with self._lock:
+            if cursor is None:
+                self._cursors.pop(user_id, None)
+            else:
+                self._cursors[user_id] = (cursor, pages)
+
+
+def make_users(count, prefix, password):
+    """Deterministic user identities, so repeated runs reuse (and log in to) the same accounts"""
+    return [
+        BenchUser(i, f'{prefix}{i}@bench.doswallet.local', f'0899{zlib.crc32(prefix.encode()) % 1000:03d}{i:05d}', password)
+        for i in range(count)
+    ]
+
+
+def login(client, user):
+    data = client.execute('user', LOGIN_MUTATION, {'email': user.email, 'password': user.password})['login']
+    if not data.get('token'):
+        raise GraphQLError(f"login failed for {user.email}: {data.get('message')}")
+    user.user_id = data['user']['userId']
+    user.token = data['token']
+    return data['token']
+
+
+def ensure_user(client, user):
+    """Register `user` if it does not exist yet, then log in"""
+    data = client.execute('user', REGISTER_MUTATION, {
+        'name': f'Bench User {user.index}', 'email': user.email, 'phone': user.phone, 'password': user.password
+    })['register']
+    if not data.get('token') and 'already registered' not in (data.get('message') or ''):
+        raise GraphQLError(f"register failed for {user.email}: {data.get('message')}")
+    return login(client, user)
+
+
+def seed(client, user):
+    """Top the user's balance up to SEED_BALANCE"""
+    client.set_token(user.token)
+    balance = client.execute('wallet', MY_WALLET_QUERY).get('my_wallet') or {}
+    missing = SEED_BALANCE - float(balance.get('balance') or 0)
+    if missing > 0:
+        client.execute('transaction', DEPOSIT_MUTATION, {'amount': round(missing, 2), 'key': f'bench-seed-{uuid.uuid4().hex}'})
+
+
+# -- Operations ----------------------------------------------------------------------------------------------
+
+def op_login(client, ctx, user):
+    data = client.execute('user', LOGIN_MUTATION, {'email': user.email, 'password': user.password})['login']
+    if not data.get('token'):
+        raise GraphQLError(data.get('message'))
+
+
+def op_my_wallet(client, ctx, user):
+    if client.execute('wallet', MY_WALLET_QUERY).get('my_wallet') is None:
+        raise GraphQLError('my_wallet returned null')
+
+
+def op_deposit(client, ctx, user):
+    client.execute('transaction', DEPOSIT_MUTATION, {'amount': 1.0, 'key': f'bench-{uuid.uuid4().hex}'})
+
+
+def op_transfer_hot_pair(client, ctx, user):
+    """Transfer between the two hot wallets in a random direction: every worker contends for the same two row locks"""
+    sender, receiver = random.sample(ctx.hot_pair, 2)
+    client.set_token(sender.token)
+    try:
+        client.execute('transaction', TRANSFER_MUTATION, {
+            'receiverId': receiver.user_id, 'amount': 1.0, 'key': f'bench-{uuid.uuid4().hex}'
+        })
+    finally:
+        client.set_token(user.token)
+
+
+def op_history_page(client, ctx, user):
+    """One page of history; users walk back up to HISTORY_MAX_PAGES pages before starting from the top again"""
+    after, pages = ctx.history_position(user.user_id)
+    data = client.execute('transaction', HISTORY_QUERY, {'first': HISTORY_PAGE_SIZE, 'after': after})
+    page_info = data['myTransactionsConnection']['pageInfo']
+    if page_info['hasNextPage'] and pages + 1 < HISTORY_MAX_PAGES:
+        ctx.set_history_position(user.user_id, page_info['endCursor'], pages + 1)
+    else:
+        ctx.set_history_position(user.user_id, None, 0)
+
+
+def op_notification_poll(client, ctx, user):
+    """What the app does on its polling interval: badge count, then the unread list"""
+    client.execute('notification', UNREAD_COUNT_QUERY)
+    client.execute('notification', NOTIFICATIONS_QUERY, {'limit': 20})
+
+
+OPERATIONS = {
+    'login': op_login,
+    'my_wallet': op_my_wallet,
+    'deposit': op_deposit,
+    'transfer_hot_pair': op_transfer_hot_pair,
+    'history_page': op_history_page,
+    'notification_poll': op_notification_poll,
+}
+
+
+def parse_mix(spec):
+    """Parse 'login=5,my_wallet=30,...' into a weight dict; omitted operations are not run"""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' (expected one of {', '.join(OPERATIONS)})")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
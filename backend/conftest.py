@@ -0,0 +1,75 @@
+"""
+Helpers shared by the tests of every service (<service>/tests/test_*.py)
+
+The services are directories of top-level modules rather than packages, and most of them have a models.py and a
+schema.py, so tests load service modules by path under names of their own (tx_models, user_models, ...).
+"""
+import os
+import sys
+import importlib.util
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Service modules import the shared ones by plain name (`from database import ...`)
+sys.path.append(os.path.join(BACKEND_DIR, 'shared'))
+
+
+def require(*modules):
+    """Skip the calling test module unless every one of `modules` can be imported (call it before loading
+    service modules, which import them at module level)"""
+    for module in modules:
+        pytest.importorskip(module, reason=f"{module} not installed, skipping {', '.join(modules)} tests")
+
+
+def service_dir(service):
+    return os.path.join(BACKEND_DIR, service)
+
+
+def load_module_from_path(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def load_service_module(name, service, filename='models.py', models=None):
+    """Load backend/<service>/<filename> as module `name`.
+
+    With `models`, an `import models` while loading resolves to that module instead of whichever models.py
+    comes first on sys.path.
+    """
+    path = os.path.join(service_dir(service), filename)
+    if models is None:
+        return load_module_from_path(name, path)
+    previous = sys.modules.get('models')
+    sys.modules['models'] = models
+    try:
+        return load_module_from_path(name, path)
+    finally:
+        if previous is not None:
+            sys.modules['models'] = previous
+        else:
+            del sys.modules['models']
+
+
+class SteppedConnection:
+    """DB connection whose session steps auto-increment ids by `step`, as on a multi-primary or Galera node.
+    Closing it restores the default before the connection goes back to the pool."""
+
+    def __init__(self, conn, step=2):
+        self._conn = conn
+        self._set_step(step)
+
+    def _set_step(self, step):
+        cursor = self._conn.cursor()
+        cursor.execute("SET SESSION auto_increment_increment = %s", (step,))
+        cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        self._set_step(1)
+        self._conn.close()
@@ -2,15 +2,22 @@
 Notification Service - Microservice for notification management
 Handles creating, reading, and managing notifications
 """
-from flask import Flask
+from flask import Flask, Response, stream_with_context, request, jsonify
 from flask_cors import CORS
-from flask_graphql import GraphQLView
+import json
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from config import SERVICE_PORTS, CORS_ORIGINS
+from config import (SERVICE_PORTS, CORS_ORIGINS, SERVER_THREADS, NOTIFICATION_STREAM_HEARTBEAT,
+                    NOTIFICATION_STREAM_MAX_CONNECTIONS, NOTIFICATION_STREAM_TICKET_TTL)
+from server import serve
+from graphql_view import CachedGraphQLView
+from instrumentation import register_metrics_route
+from auth import get_token_from_request, verify_token, generate_ticket, require_auth
 from schema import schema
+from models import Notification
+from push import hub, StreamLimitError
 
 app = Flask(__name__)
 CORS(app, origins=CORS_ORIGINS)
@@ -18,16 +25,105 @@ CORS(app, origins=CORS_ORIGINS)
 # GraphQL endpoint
 app.add_url_rule(
     '/graphql',
-    view_func=GraphQLView.as_view('graphql', schema=schema, graphiql=True)
+    view_func=CachedGraphQLView.as_view('graphql', schema=schema, graphiql=True)
 )
 
+# GET /metrics: DB pool, per-query stats (DB_TRACE=1), cache counters and push stream counters
+register_metrics_route(app, 'notification-service', extra=lambda: {'push': hub.stats()})
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    from flask import jsonify
     return jsonify({'status': 'healthy', 'service': 'notification-service'}), 200
 
+
+def _sse(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _notification_event(row):
+    # Same field names as NotificationType in the GraphQL schema
+    return _sse('notification', {
+        'notificationId': row['notification_id'],
+        'userId': row['user_id'],
+        'message': row['message'],
+        'date': str(row['date']),
+        'readStatus': bool(row['read_status']),
+    }, event_id=row['notification_id'])
+
+
+@app.route('/notifications/stream-ticket', methods=['POST'])
+@require_auth
+def notification_stream_ticket():
+    """Ticket for GET /notifications/stream?ticket=, for clients (browsers' EventSource) that cannot set headers.
+
+    The ticket only opens notification streams and expires after NOTIFICATION_STREAM_TICKET_TTL seconds, so the
+    bearer token itself never appears in a URL. A client whose stream is refused with 401 fetches a new one.
+    """
+    ticket = generate_ticket(request.user_id, 'notification-stream', NOTIFICATION_STREAM_TICKET_TTL)
+    return jsonify({'ticket': ticket, 'expiresIn': NOTIFICATION_STREAM_TICKET_TTL}), 200
+
+
+@app.route('/notifications/stream', methods=['GET'])
+def notification_stream():
+    """Server-sent events with the current user's new notifications, replacing unreadCount polling.
+
+    Authenticated by the Authorization header, or by ?ticket= from POST /notifications/stream-ticket. On
+    reconnect the Last-Event-ID header (or ?lastEventId=) replays what was missed, up to
+    NOTIFICATION_STREAM_BUFFER notifications. Events: `notification` (one new notification, id =
+    notification_id) and `resync` (the stream fell behind and dropped notifications; refetch with GraphQL).
+    Comment lines are heartbeats.
+    """
+    token = get_token_from_request()
+    if token:
+        payload = verify_token(token)
+    else:
+        payload = verify_token(request.args.get('ticket'), purpose='notification-stream')
+    if not payload:
+        return jsonify({'error': 'Invalid or expired token'}), 401
+    user_id = payload['user_id']
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be a notification id'}), 400
+
+    try:
+        subscription = hub.subscribe(user_id)
+    except StreamLimitError as e:
+        return jsonify({'error': str(e)}), e.status, {'Retry-After': '30'}
+
+    def events():
+        try:
+            yield 'retry: 5000\n\n'
+            if last_event_id is not None and last_event_id < subscription.after_id:
+                missed = Notification.get_by_user_since(user_id, last_event_id, subscription.after_id, hub.buffer_size + 1)
+                if len(missed) > hub.buffer_size:
+                    yield _sse('resync', {'dropped': len(missed) - hub.buffer_size})
+                for row in missed[:hub.buffer_size]:
+                    yield _notification_event(row)
+            while not subscription.closed:
+                notifications, dropped = subscription.get(NOTIFICATION_STREAM_HEARTBEAT)
+                if dropped:
+                    yield _sse('resync', {'dropped': dropped})
+                for row in notifications:
+                    yield _notification_event(row)
+                if not notifications and not dropped:
+                    # Keeps proxies from timing the stream out, and finds disconnected clients
+                    yield ': keepalive\n\n'
+        finally:
+            hub.unsubscribe(subscription)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 if __name__ == '__main__':
     port = SERVICE_PORTS['notification']
-    app.run(host='0.0.0.0', port=port, debug=True)
-
+    # Open streams each hold a thread of their own, on top of the threads serving everything else
+    serve(app, port, threads=SERVER_THREADS + NOTIFICATION_STREAM_MAX_CONNECTIONS)
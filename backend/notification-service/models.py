@@ -3,19 +3,53 @@ Notification Service Models
 """
 import sys
 import os
+import threading
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from database import execute_query
+from database import execute_query, get_db_connection
+import mysql.connector
+from mysql.connector import errorcode
+
+
+def _add_unread(cursor, user_id, delta):
+    """Add delta to a user's unread counter on an open cursor, in the caller's transaction.
+
+    The counter never goes below zero; drift is repaired by Notification.reconcile_unread_counts.
+    """
+    cursor.execute(
+        "INSERT INTO notification_unread_counts (user_id, unread) VALUES (%s, GREATEST(%s, 0)) "
+        "ON DUPLICATE KEY UPDATE unread = GREATEST(unread + %s, 0)",
+        (user_id, delta, delta)
+    )
+
 
 class Notification:
     @staticmethod
     def create(user_id, message):
-        """Create a new notification"""
-        query = """
-            INSERT INTO notifications (user_id, message, read_status)
-            VALUES (%s, %s, FALSE)
-        """
-        notification_id = execute_query(query, (user_id, message))
+        """Create a new notification and count it as unread, in one transaction"""
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            conn.start_transaction()
+            cursor.execute(
+                "INSERT INTO notifications (user_id, message, read_status) VALUES (%s, %s, FALSE)",
+                (user_id, message)
+            )
+            notification_id = cursor.lastrowid
+            _add_unread(cursor, user_id, 1)
+            conn.commit()
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+        _push_wakeup.set()
         return notification_id
     
     @staticmethod
@@ -24,6 +58,37 @@ class Notification:
         query = "SELECT * FROM notifications WHERE notification_id = %s"
         return execute_query(query, (notification_id,), fetch_one=True)
     
+    @staticmethod
+    def latest_id():
+        """Highest notification_id so far (0 if there are none)"""
+        result = execute_query("SELECT COALESCE(MAX(notification_id), 0) AS latest FROM notifications", fetch_one=True)
+        return result['latest'] if result else 0
+    
+    @staticmethod
+    def get_since(after_id, limit, gaps=()):
+        """Notifications of all users newer than after_id, plus any in the (first_id, last_id) ranges of `gaps`,
+        oldest first"""
+        conditions = ['notification_id > %s'] + ['notification_id BETWEEN %s AND %s'] * len(gaps)
+        query = f"""
+            SELECT * FROM notifications
+            WHERE {' OR '.join(conditions)}
+            ORDER BY notification_id
+            LIMIT %s
+        """
+        params = [after_id] + [bound for gap in gaps for bound in gap] + [limit]
+        return execute_query(query, tuple(params), fetch_all=True)
+    
+    @staticmethod
+    def get_by_user_since(user_id, after_id, up_to_id, limit):
+        """A user's notifications with after_id < notification_id <= up_to_id, oldest first"""
+        query = """
+            SELECT * FROM notifications
+            WHERE user_id = %s AND notification_id > %s AND notification_id <= %s
+            ORDER BY notification_id
+            LIMIT %s
+        """
+        return execute_query(query, (user_id, after_id, up_to_id, limit), fetch_all=True)
+    
     @staticmethod
     def get_by_user_id(user_id, limit=50, offset=0, unread_only=False):
         """Get notifications by user ID"""
@@ -45,25 +110,135 @@ class Notification:
     
     @staticmethod
     def mark_as_read(notification_id):
-        """Mark notification as read"""
-        query = "UPDATE notifications SET read_status = TRUE WHERE notification_id = %s"
-        execute_query(query, (notification_id,))
+        """Mark notification as read; the unread counter only changes if it was unread"""
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            conn.start_transaction()
+            cursor.execute(
+                "SELECT user_id FROM notifications WHERE notification_id = %s AND read_status = FALSE FOR UPDATE",
+                (notification_id,)
+            )
+            row = cursor.fetchone()
+            if row:
+                cursor.execute("UPDATE notifications SET read_status = TRUE WHERE notification_id = %s", (notification_id,))
+                _add_unread(cursor, row['user_id'], -1)
+            conn.commit()
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
         return True
     
     @staticmethod
     def mark_all_as_read(user_id):
-        """Mark all notifications as read for a user"""
-        query = "UPDATE notifications SET read_status = TRUE WHERE user_id = %s"
-        execute_query(query, (user_id,))
-        return True
+        """Mark all notifications as read for a user. Only unread rows are written (through the
+        (user_id, read_status, date) index), and the counter drops by exactly that many.
+        Returns the number of notifications marked."""
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            conn.start_transaction()
+            cursor.execute(
+                "UPDATE notifications SET read_status = TRUE WHERE user_id = %s AND read_status = FALSE",
+                (user_id,)
+            )
+            marked = cursor.rowcount
+            if marked:
+                _add_unread(cursor, user_id, -marked)
+            conn.commit()
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+        return marked
     
     @staticmethod
     def get_unread_count(user_id):
-        """Get count of unread notifications"""
-        query = """
-            SELECT COUNT(*) as count FROM notifications 
-            WHERE user_id = %s AND read_status = FALSE
-        """
+        """Get count of unread notifications from the user's counter (one primary key read)"""
+        query = "SELECT unread FROM notification_unread_counts WHERE user_id = %s"
         result = execute_query(query, (user_id,), fetch_one=True)
-        return result['count'] if result else 0
+        return result['unread'] if result else 0
+    
+    @staticmethod
+    def reconcile_unread_counts(batch_users=1000, progress=None):
+        """Recompute every unread counter from the notifications table, one user_id range per DB transaction.
+
+        Safe to run while the service is live: a range's counters are locked before its notifications are
+        counted, so writers in that range wait and apply their change on top of the recomputed value (or hit a
+        deadlock, in which case the range is retried). Returns the number of counters that were wrong.
+        """
+        bounds = execute_query("""
+            SELECT LEAST(COALESCE((SELECT MIN(user_id) FROM notifications), 0),
+                         COALESCE((SELECT MIN(user_id) FROM notification_unread_counts), 0)) AS low,
+                   GREATEST(COALESCE((SELECT MAX(user_id) FROM notifications), 0),
+                            COALESCE((SELECT MAX(user_id) FROM notification_unread_counts), 0)) AS high
+        """, fetch_one=True)
+        low, high = int(bounds['low'] or 0), int(bounds['high'] or 0)
+        corrected = 0
+        for start in range(low, high + 1, batch_users):
+            end = min(start + batch_users - 1, high)
+            corrected += Notification._reconcile_range(start, end)
+            if progress:
+                progress(start, end, high)
+        return corrected
+    
+    @staticmethod
+    def _reconcile_range(start, end, attempts=5):
+        for attempt in range(attempts):
+            conn = None
+            cursor = None
+            try:
+                conn = get_db_connection()
+                cursor = conn.cursor(dictionary=True)
+                conn.start_transaction()
+                # Locks the range's counters and the gaps between them before the count is read
+                cursor.execute(
+                    "SELECT user_id, unread FROM notification_unread_counts WHERE user_id BETWEEN %s AND %s FOR UPDATE",
+                    (start, end)
+                )
+                stored = {row['user_id']: row['unread'] for row in cursor.fetchall()}
+                cursor.execute("""
+                    SELECT user_id, COUNT(*) AS unread FROM notifications
+                    WHERE user_id BETWEEN %s AND %s AND read_status = FALSE
+                    GROUP BY user_id
+                """, (start, end))
+                actual = {row['user_id']: row['unread'] for row in cursor.fetchall()}
+                wrong = sorted((user_id, actual.get(user_id, 0)) for user_id in set(stored) | set(actual)
+                               if stored.get(user_id, 0) != actual.get(user_id, 0))
+                if wrong:
+                    cursor.execute(
+                        "INSERT INTO notification_unread_counts (user_id, unread) VALUES "
+                        + ', '.join(['(%s, %s)'] * len(wrong))
+                        + " ON DUPLICATE KEY UPDATE unread = VALUES(unread)",
+                        tuple(value for pair in wrong for value in pair)
+                    )
+                conn.commit()
+                return len(wrong)
+            except mysql.connector.Error as e:
+                if conn:
+                    conn.rollback()
+                if e.errno not in (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT) or attempt == attempts - 1:
+                    raise
+            finally:
+                if cursor:
+                    cursor.close()
+                if conn:
+                    conn.close()
 
+# Set whenever this process creates a notification so the push hub can skip its poll delay
+_push_wakeup = threading.Event()
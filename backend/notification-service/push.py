@@ -0,0 +1,217 @@
+"""
+Notification push: in-process fan-out of new notifications to open streams (GET /notifications/stream)
+
+One NotificationHub per serving process. While at least one stream is open, a single watcher thread reads the
+notifications newer than the last one it saw and hands each row to the open streams of its user, so the
+database sees one query per NOTIFICATION_PUSH_POLL_INTERVAL per process however many clients are connected,
+instead of one COUNT(*) per client per poll. Notification.create wakes the watcher immediately; rows written by
+other processes (the transaction service's outbox dispatcher) are picked up within one interval.
+
+notification_ids are assigned at insert, not at commit, so two overlapping writers can commit out of id order.
+Ids skipped over by the watcher are kept as gaps and re-read by every poll for NOTIFICATION_PUSH_GAP_TIMEOUT
+seconds, so a row that commits late is still published. It goes to all of its user's streams: a stream opened
+after the gap appeared may also have backfilled it, so clients should ignore an event id they already have.
+"""
+import sys
+import os
+import threading
+import time
+from collections import deque
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+from config import (NOTIFICATION_STREAM_MAX_CONNECTIONS, NOTIFICATION_STREAM_MAX_PER_USER, NOTIFICATION_STREAM_BUFFER,
+                    NOTIFICATION_PUSH_POLL_INTERVAL, NOTIFICATION_PUSH_GAP_TIMEOUT)
+from models import Notification, _push_wakeup
+
+# Rows read per watcher query; a larger backlog is read in several queries
+WATCH_BATCH_SIZE = 500
+# Skipped id ranges re-read per poll; the oldest are given up first
+MAX_WATCH_GAPS = 100
+
+
+class StreamLimitError(Exception):
+    """A stream was refused because of a connection cap; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class Subscription:
+    """One open stream: a bounded buffer of notifications for one user.
+
+    When the client reads too slowly the oldest buffered notifications are dropped and counted, so the stream
+    can tell the client to refetch instead of letting the buffer grow without bound.
+    """
+
+    def __init__(self, user_id, after_id, buffer_size):
+        self.user_id = user_id
+        # Only notifications newer than this are delivered; older ones are the caller's to backfill
+        self.after_id = after_id
+        self.dropped = 0
+        self.closed = False
+        self._buffer = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+
+    def put(self, notification):
+        """Buffer a notification; returns True if the oldest buffered one had to be dropped for it"""
+        with self._cond:
+            overflow = len(self._buffer) == self._buffer.maxlen
+            if overflow:
+                self.dropped += 1
+            self._buffer.append(notification)
+            self._cond.notify()
+            return overflow
+
+    def get(self, timeout):
+        """Wait up to timeout seconds for notifications. Returns (notifications, dropped since the last call)."""
+        with self._cond:
+            if not self._buffer and not self.closed:
+                self._cond.wait(timeout)
+            notifications = list(self._buffer)
+            self._buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+            return notifications, dropped
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class NotificationHub:
+    """Open streams by user, and the watcher thread feeding them"""
+
+    def __init__(self, max_connections=NOTIFICATION_STREAM_MAX_CONNECTIONS,
+                 max_per_user=NOTIFICATION_STREAM_MAX_PER_USER, buffer_size=NOTIFICATION_STREAM_BUFFER,
+                 poll_interval=NOTIFICATION_PUSH_POLL_INTERVAL, gap_timeout=NOTIFICATION_PUSH_GAP_TIMEOUT):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.gap_timeout = gap_timeout
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # user_id -> set of Subscription
+        self._connections = 0
+        # Highest notification_id already handed out; None while no stream is open
+        self._last_id = None
+        # [first_id, last_id, expires_at] ranges below _last_id not seen yet (uncommitted or rolled back)
+        self._gaps = []
+        self._thread = None
+        self._stats = {'opened': 0, 'rejected': 0, 'published': 0, 'published_late': 0, 'dropped': 0,
+                       'watch_queries': 0}
+
+    def subscribe(self, user_id):
+        """Open a stream for user_id. Raises StreamLimitError when a connection cap is reached."""
+        # The first stream's starting point is read before taking the lock, so the watcher and other streams
+        # never wait on a database round trip
+        latest_id = None
+        while True:
+            if self._last_id is None and latest_id is None:
+                latest_id = Notification.latest_id()
+            with self._lock:
+                if self._connections >= self.max_connections:
+                    self._stats['rejected'] += 1
+                    raise StreamLimitError('Too many open notification streams, retry later', 503)
+                if len(self._subscriptions.get(user_id, ())) >= self.max_per_user:
+                    self._stats['rejected'] += 1
+                    raise StreamLimitError(f'At most {self.max_per_user} notification streams per user', 429)
+                if self._last_id is None:
+                    if latest_id is None:
+                        continue  # every stream closed since the check above
+                    self._last_id = latest_id
+                subscription = Subscription(user_id, self._last_id, self.buffer_size)
+                self._subscriptions.setdefault(user_id, set()).add(subscription)
+                self._connections += 1
+                self._stats['opened'] += 1
+                self._start_watcher()
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+                self._connections -= 1
+                if not self._connections:
+                    self._last_id = None
+                    self._gaps = []
+        subscription.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, connections=self._connections, users=len(self._subscriptions),
+                        gaps=len(self._gaps))
+
+    def _start_watcher(self):
+        # Caller holds self._lock. Started on first use, so every gunicorn worker (forked after import) gets its own.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='notification-push', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            _push_wakeup.wait(self.poll_interval)
+            _push_wakeup.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Notification push error: {e}", file=sys.stderr)
+
+    def poll(self):
+        """Publish every notification newer than the last one published, and those that committed late in its
+        gaps. Returns the number published."""
+        published = 0
+        while True:
+            with self._lock:
+                after_id = self._last_id
+                now = time.monotonic()
+                self._gaps = [gap for gap in self._gaps if gap[2] > now]
+                gaps = [(first, last) for first, last, _ in self._gaps]
+            if after_id is None:
+                return published  # no open streams
+            rows = Notification.get_since(after_id, WATCH_BATCH_SIZE, gaps)
+            published += self._publish(after_id, rows)
+            if len(rows) < WATCH_BATCH_SIZE:
+                return published
+
+    def _publish(self, after_id, rows):
+        # Publishing and advancing _last_id happen under the lock that subscribe() takes, so a new stream either
+        # receives a row here or has it below its after_id (and backfills it), never neither
+        published = 0
+        with self._lock:
+            self._stats['watch_queries'] += 1
+            if self._last_id != after_id:
+                return 0  # every stream closed (and maybe reopened) while reading; these rows are not owed to anyone
+            expires_at = time.monotonic() + self.gap_timeout
+            for row in rows:
+                notification_id = row['notification_id']
+                late = notification_id <= self._last_id
+                if late:
+                    self._fill_gap(notification_id)
+                    self._stats['published_late'] += 1
+                else:
+                    if notification_id > self._last_id + 1:
+                        self._gaps.append([self._last_id + 1, notification_id - 1, expires_at])
+                    self._last_id = notification_id
+                for subscription in self._subscriptions.get(row['user_id'], ()):
+                    if late or notification_id > subscription.after_id:
+                        if subscription.put(row):
+                            self._stats['dropped'] += 1
+                        published += 1
+            del self._gaps[:-MAX_WATCH_GAPS]
+            self._stats['published'] += published
+        return published
+
+    def _fill_gap(self, notification_id):
+        # Caller holds self._lock. Split the gap holding this id around it.
+        for i, (first, last, expires_at) in enumerate(self._gaps):
+            if first <= notification_id <= last:
+                self._gaps[i:i + 1] = [gap for gap in ([first, notification_id - 1, expires_at],
+                                                       [notification_id + 1, last, expires_at]) if gap[0] <= gap[1]]
+                return
+
+
+hub = NotificationHub()
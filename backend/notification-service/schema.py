@@ -7,7 +7,7 @@ import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from auth import verify_token, get_token_from_request
+from auth import current_user, require_current_user
 from models import Notification
 
 class NotificationType(ObjectType):
@@ -24,11 +24,7 @@ class Query(ObjectType):
     
     def resolve_my_notifications(self, info, limit=50, offset=0, unread_only=False):
         """Get current user's notifications"""
-        token = get_token_from_request()
-        if not token:
-            return []
-        
-        payload = verify_token(token)
+        payload = current_user()
         if not payload:
             return []
         
@@ -40,11 +36,7 @@ class Query(ObjectType):
     
     def resolve_unread_count(self, info):
         """Get unread notification count"""
-        token = get_token_from_request()
-        if not token:
-            return 0
-        
-        payload = verify_token(token)
+        payload = current_user()
         if not payload:
             return 0
         
@@ -78,13 +70,7 @@ class MarkAllAsRead(graphene.Mutation):
     
     def mutate(self, info):
         """Mark all notifications as read"""
-        token = get_token_from_request()
-        if not token:
-            raise Exception("Authentication required")
-        
-        payload = verify_token(token)
-        if not payload:
-            raise Exception("Invalid token")
+        payload = require_current_user()
         
         Notification.mark_all_as_read(payload['user_id'])
         return True
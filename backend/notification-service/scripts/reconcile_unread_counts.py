@@ -0,0 +1,24 @@
+"""Recompute notification_unread_counts from the notifications table
+Use it once after creating the table on an existing database (backfill), or to repair drift.
+Safe to run while the service is live; see Notification.reconcile_unread_counts.
+
+Usage: python reconcile_unread_counts.py   (tune with BATCH_USERS env var)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models import Notification
+
+BATCH_USERS = int(os.getenv('BATCH_USERS', 1000))
+
+
+def progress(start, end, high):
+    print(f'  users {start}..{end} of {high}')
+
+
+if __name__ == '__main__':
+    started = time.perf_counter()
+    corrected = Notification.reconcile_unread_counts(batch_users=BATCH_USERS, progress=progress)
+    print(f'Reconciled notification_unread_counts: {corrected} counters corrected in {time.perf_counter() - started:.1f}s')
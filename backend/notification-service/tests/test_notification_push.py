@@ -0,0 +1,107 @@
+import pytest
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+notification_models = load_service_module('notification_models', 'notification-service')
+# push.py imports `models`; resolve it to the notification service's models.py while loading
+push = load_service_module('notification_push', 'notification-service', 'push.py', models=notification_models)
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Notification = notification_models.Notification
+execute_query = db_module.execute_query
+
+USER = 99861
+OTHER = 99862
+
+
+def _cleanup():
+    execute_query("DELETE FROM notifications WHERE user_id IN (%s,%s)", (USER, OTHER))
+    execute_query("DELETE FROM notification_unread_counts WHERE user_id IN (%s,%s)", (USER, OTHER))
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def test_created_notification_reaches_every_stream_of_its_user_only():
+    hub = push.NotificationHub(max_connections=10, max_per_user=3, buffer_size=10, poll_interval=0.2)
+    first, second, other = hub.subscribe(USER), hub.subscribe(USER), hub.subscribe(OTHER)
+    try:
+        notification_id = Notification.create(USER, 'push test')
+
+        for subscription in (first, second):
+            notifications, dropped = subscription.get(timeout=5)
+            assert [row['notification_id'] for row in notifications] == [notification_id]
+            assert dropped == 0
+        assert other.get(timeout=0.5) == ([], 0)
+    finally:
+        for subscription in (first, second, other):
+            hub.unsubscribe(subscription)
+    assert hub.stats()['connections'] == 0
+
+
+def test_connection_caps():
+    hub = push.NotificationHub(max_connections=3, max_per_user=2, buffer_size=10, poll_interval=60)
+    subscriptions = [hub.subscribe(USER), hub.subscribe(USER)]
+    with pytest.raises(push.StreamLimitError) as per_user:
+        hub.subscribe(USER)
+    assert per_user.value.status == 429
+
+    subscriptions.append(hub.subscribe(OTHER))
+    with pytest.raises(push.StreamLimitError) as total:
+        hub.subscribe(OTHER)
+    assert total.value.status == 503
+
+    # Closing a stream frees its slot
+    hub.unsubscribe(subscriptions.pop(0))
+    subscriptions.append(hub.subscribe(USER))
+    for subscription in subscriptions:
+        hub.unsubscribe(subscription)
+    assert hub.stats()['rejected'] == 2
+
+
+def test_rows_from_other_processes_are_published_and_buffer_is_bounded():
+    hub = push.NotificationHub(max_connections=10, max_per_user=3, buffer_size=2, poll_interval=60)
+    subscription = hub.subscribe(USER)
+    try:
+        # Written directly, like the transaction service's outbox dispatcher does (no wakeup in this process)
+        for i in range(3):
+            execute_query("INSERT INTO notifications (user_id, message, read_status) VALUES (%s, %s, FALSE)", (USER, f'batch {i}'))
+        hub.poll()
+
+        notifications, dropped = subscription.get(timeout=0)
+        assert [row['message'] for row in notifications] == ['batch 1', 'batch 2']
+        assert dropped == 1
+        assert hub.poll() == 0
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def test_row_committed_after_a_higher_id_is_still_published():
+    hub = push.NotificationHub(max_connections=10, max_per_user=3, buffer_size=10, poll_interval=60)
+    subscription = hub.subscribe(USER)
+    slow = db_module.get_db_connection()
+    cursor = slow.cursor()
+    try:
+        # Two overlapping writers: the first takes the lower id but commits after the second
+        slow.start_transaction()
+        cursor.execute("INSERT INTO notifications (user_id, message, read_status) VALUES (%s, %s, FALSE)", (USER, 'slow'))
+        execute_query("INSERT INTO notifications (user_id, message, read_status) VALUES (%s, %s, FALSE)", (USER, 'fast'))
+        hub.poll()
+        assert [row['message'] for row in subscription.get(timeout=0)[0]] == ['fast']
+
+        slow.commit()
+        assert hub.poll() == 1
+        assert [row['message'] for row in subscription.get(timeout=0)[0]] == ['slow']
+        assert hub.stats()['published_late'] == 1
+        assert hub.poll() == 0
+    finally:
+        cursor.close()
+        slow.close()
+        hub.unsubscribe(subscription)
@@ -0,0 +1,78 @@
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+notification_models = load_service_module('notification_models', 'notification-service')
+# notification_dispatcher.py imports `models`; resolve it to the transaction service's models.py while loading
+tx_models = load_service_module('tx_models', 'transaction-service')
+dispatcher = load_service_module('notification_dispatcher', 'transaction-service', 'notification_dispatcher.py',
+                                 models=tx_models)
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Notification = notification_models.Notification
+execute_query = db_module.execute_query
+
+USER = 99851
+OTHER = 99852
+
+
+def _cleanup():
+    execute_query("DELETE FROM notification_outbox WHERE user_id IN (%s,%s)", (USER, OTHER))
+    execute_query("DELETE FROM notifications WHERE user_id IN (%s,%s)", (USER, OTHER))
+    execute_query("DELETE FROM notification_unread_counts WHERE user_id IN (%s,%s)", (USER, OTHER))
+
+
+def setup_function(function):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def test_counter_follows_create_and_mark_as_read():
+    first = Notification.create(USER, 'counter 1')
+    Notification.create(USER, 'counter 2')
+    Notification.create(OTHER, 'counter other')
+    assert Notification.get_unread_count(USER) == 2
+
+    Notification.mark_as_read(first)
+    Notification.mark_as_read(first)  # already read: no second decrement
+    assert Notification.get_unread_count(USER) == 1
+    assert Notification.get_unread_count(OTHER) == 1
+
+
+def test_mark_all_as_read_writes_only_unread_rows():
+    read = Notification.create(USER, 'already read')
+    Notification.mark_as_read(read)
+    for i in range(3):
+        Notification.create(USER, f'unread {i}')
+
+    assert Notification.mark_all_as_read(USER) == 3
+    assert Notification.get_unread_count(USER) == 0
+    rows = execute_query("SELECT COUNT(*) AS n FROM notifications WHERE user_id = %s AND read_status = FALSE", (USER,), fetch_one=True)
+    assert rows['n'] == 0
+
+
+def test_dispatcher_counts_delivered_notifications():
+    Notification.create(USER, 'direct')
+    for message in ('outbox 1', 'outbox 2'):
+        execute_query("INSERT INTO notification_outbox (user_id, message) VALUES (%s, %s)", (USER, message))
+    execute_query("INSERT INTO notification_outbox (user_id, message) VALUES (%s, %s)", (OTHER, 'outbox other'))
+
+    while dispatcher.dispatch_batch(50):
+        pass
+    assert Notification.get_unread_count(USER) == 3
+    assert Notification.get_unread_count(OTHER) == 1
+
+
+def test_reconcile_repairs_drifted_counters():
+    for i in range(2):
+        Notification.create(USER, f'drift {i}')
+    # Rows written behind the counters' back, and a counter for a user with nothing unread
+    execute_query("INSERT INTO notifications (user_id, message, read_status) VALUES (%s, 'raw', FALSE)", (USER,))
+    execute_query("INSERT INTO notification_unread_counts (user_id, unread) VALUES (%s, 7)", (OTHER,))
+
+    assert Notification.reconcile_unread_counts(batch_users=100) >= 2
+    assert Notification.get_unread_count(USER) == 3
+    assert Notification.get_unread_count(OTHER) == 0
@@ -2,10 +2,17 @@
 JWT authentication utilities
 """
 import jwt
+import hashlib
+import time
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify
-from config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRATION
+from flask import request, jsonify, g, has_request_context
+from config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRATION, JWT_CACHE_SIZE
+from cache import LRUTTLCache
+
+# Process-wide cache of verified tokens: sha256(token) -> payload, each entry expiring at the token's `exp`.
+# Always in-process (never CACHE_BACKEND=redis) so bearer tokens are not copied to another system.
+_token_cache = LRUTTLCache('jwt', ttl=JWT_EXPIRATION, max_entries=JWT_CACHE_SIZE)
 
 def generate_token(user_id, email):
     """Generate JWT token"""
@@ -17,15 +24,39 @@ def generate_token(user_id, email):
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def verify_token(token):
-    """Verify JWT token"""
+def generate_ticket(user_id, purpose, expires_in):
+    """Generate a short-lived JWT that verify_token only accepts for `purpose`, never as a bearer token.
+    For credentials that have to travel in a URL, where they end up in access logs and browser history."""
+    payload = {
+        'user_id': user_id,
+        'purpose': purpose,
+        'exp': datetime.utcnow() + timedelta(seconds=expires_in),
+        'iat': datetime.utcnow()
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def verify_token(token, purpose=None):
+    """Verify JWT token (verified payloads are cached until the token expires).
+    Bearer tokens verify with purpose=None; tickets (generate_ticket) only with their own purpose."""
+    if not token:
+        return None
+    
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        return dict(payload) if payload.get('purpose') == purpose else None
+    
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    
+    ttl = payload.get('exp', 0) - time.time()
+    if ttl > 0:
+        _token_cache.set(key, dict(payload), ttl=ttl)
+    return payload if payload.get('purpose') == purpose else None
 
 def get_token_from_request():
     """Extract token from request header"""
@@ -37,6 +68,27 @@ def get_token_from_request():
             return None
     return None
 
+def current_user():
+    """Verified token payload for the current request, or None.
+
+    The Authorization header is parsed and verified once per request and memoized on flask.g, so resolvers
+    can call this as often as they like.
+    """
+    if not has_request_context():
+        return None
+    if '_current_user' not in g:
+        g._current_user = verify_token(get_token_from_request())
+    return g._current_user
+
+def require_current_user():
+    """Like current_user(), but raises the standard GraphQL auth errors instead of returning None"""
+    payload = current_user()
+    if not payload:
+        if not get_token_from_request():
+            raise Exception("Authentication required")
+        raise Exception("Invalid token")
+    return payload
+
 def require_auth(f):
     """Decorator to require authentication"""
     @wraps(f)
@@ -45,7 +97,7 @@ def require_auth(f):
         if not token:
             return jsonify({'error': 'No token provided'}), 401
         
-        payload = verify_token(token)
+        payload = current_user()
         if not payload:
             return jsonify({'error': 'Invalid or expired token'}), 401
         
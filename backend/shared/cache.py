@@ -0,0 +1,233 @@
+"""
+Shared read-through cache utilities
+
+Backends:
+- 'none':   caching disabled (default).
+- 'redis':  shared across processes and services (needs the optional `redis` package and REDIS_URL).
+- 'memory': per-process LRU with TTL. Each process has its own copy and only sees its own invalidations, so
+  a write made in another process (e.g. the transaction service) is missed for up to CACHE_TTL seconds.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from config import CACHE_BACKEND, CACHE_TTL, CACHE_MAX_ENTRIES, REDIS_URL
+
+# Marker stored in place of an invalidated entry (see LRUTTLCache.delete)
+_TOMBSTONE = object()
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters shared by all backends"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'sets': self.sets,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+class LRUTTLCache:
+    """In-process LRU cache whose entries also expire after `ttl` seconds.
+
+    Read-through callers take a `snapshot()` before reading the database and pass it to `set()`. If the key
+    was invalidated after the snapshot, the (possibly stale) value is dropped instead of cached, so a reader
+    racing with a writer can never re-populate the cache with the pre-write row.
+    """
+
+    def __init__(self, name, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at, version of last invalidation)
+        self._version = 0
+
+    def snapshot(self):
+        """Return a token describing the cache state before a database read"""
+        with self._lock:
+            return (self._version, time.monotonic())
+
+    def get(self, key):
+        """Return the cached value or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is _TOMBSTONE or entry[1] <= now:
+                if entry is not None and entry[1] <= now:
+                    del self._entries[key]
+                self.stats.incr('misses')
+                return None
+            self._entries.move_to_end(key)
+        self.stats.incr('hits')
+        return entry[0]
+
+    def set(self, key, value, snapshot=None, ttl=None):
+        """Cache `value` for `ttl` seconds (default: the cache TTL); skipped if `key` was invalidated since `snapshot` was taken"""
+        now = time.monotonic()
+        version, started_at = snapshot if snapshot else (None, now)
+        # Expire relative to when the value was read, not when it is stored
+        expires_at = started_at + (self.ttl if ttl is None else ttl)
+        if expires_at <= now:
+            return False
+        with self._lock:
+            entry = self._entries.get(key)
+            # Version of the latest invalidation of this key, carried over by every later set()
+            invalidated_at = entry[2] if entry is not None else 0
+            if version is not None and invalidated_at > version:
+                return False
+            self._entries[key] = (value, expires_at, invalidated_at)
+            self._entries.move_to_end(key)
+            self._evict()
+        self.stats.incr('sets')
+        return True
+
+    def delete(self, *keys):
+        """Invalidate keys. A tombstone is kept for one TTL to reject in-flight stale `set()` calls."""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key in keys:
+                self._version += 1
+                self._entries[key] = (_TOMBSTONE, expires_at, self._version)
+                self._entries.move_to_end(key)
+            self._evict()
+        self.stats.incr('invalidations', len(keys))
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def _evict(self):
+        # Caller holds self._lock
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.incr('evictions')
+
+
+class RedisCache:
+    """Cache backed by Redis, shared by every process and service pointing at the same REDIS_URL"""
+
+    def __init__(self, name, ttl=CACHE_TTL, url=REDIS_URL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)")
+        self.name = name
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, key):
+        return f"doswallet:{self.name}:{key}"
+
+    def snapshot(self):
+        return None
+
+    def get(self, key):
+        try:
+            raw = self._client.get(self._key(key))
+        except Exception as e:
+            print(f"Cache error ({self.name}): {e}")
+            raw = None
+        if raw is None:
+            self.stats.incr('misses')
+            return None
+        self.stats.incr('hits')
+        return pickle.loads(raw)
+
+    def set(self, key, value, snapshot=None):
+        try:
+            # No snapshot check here: a reader racing with an invalidation can cache a stale row for at most one TTL
+            self._client.set(self._key(key), pickle.dumps(value), px=int(self.ttl * 1000))
+        except Exception as e:
+            print(f"Cache error ({self.name}): {e}")
+            return False
+        self.stats.incr('sets')
+        return True
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            self._client.delete(*[self._key(k) for k in keys])
+        except Exception as e:
+            print(f"Cache error ({self.name}): {e}")
+        self.stats.incr('invalidations', len(keys))
+
+    def clear(self):
+        try:
+            for k in self._client.scan_iter(self._key('*')):
+                self._client.delete(k)
+        except Exception as e:
+            print(f"Cache error ({self.name}): {e}")
+
+
+class NullCache:
+    """Cache that never stores anything (CACHE_BACKEND=none)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.stats = CacheStats()
+
+    def snapshot(self):
+        return None
+
+    def get(self, key):
+        self.stats.incr('misses')
+        return None
+
+    def set(self, key, value, snapshot=None):
+        return False
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+# One cache per name per process, so every module copy (services load each other's models via importlib)
+# invalidates the same instance
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name):
+    """Get or create the process-wide cache called `name` using the configured backend"""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            if CACHE_BACKEND == 'redis':
+                cache = RedisCache(name)
+            elif CACHE_BACKEND == 'none':
+                cache = NullCache(name)
+            else:
+                cache = LRUTTLCache(name)
+            _caches[name] = cache
+        return cache
+
+
+def get_all_stats():
+    """Hit/miss counters for every cache created in this process"""
+    with _caches_lock:
+        return {name: cache.stats.as_dict() for name, cache in _caches.items()}
@@ -15,13 +15,43 @@ DB_CONFIG = {
     'database': os.getenv('DB_NAME', 'doswallet'),
     'charset': 'utf8mb4',
     # Connection pool size can be tuned per service via DB_POOL_SIZE env var
-    'pool_size': int(os.getenv('DB_POOL_SIZE', 5))
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+    # Extra connections opened under bursts beyond pool_size; closed again when returned
+    'pool_max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),
+    # Seconds a checkout waits for a free connection before raising PoolError
+    'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+    # Seconds after which a connection is closed and replaced (stay below MySQL wait_timeout)
+    'pool_recycle': float(os.getenv('DB_POOL_RECYCLE', 3600)),
+    # Only ping a connection on checkout if it has been idle this many seconds
+    'pool_ping_after': float(os.getenv('DB_POOL_PING_AFTER', 30))
 }
 
+# Query instrumentation (see shared/instrumentation.py): 0 = off, 1 = per-query stats + slow-query log,
+# 2 = also log every statement
+DB_TRACE = int(os.getenv('DB_TRACE', 0))
+DB_TRACE_LOG_FILE = os.getenv('DB_TRACE_LOG_FILE')  # slow-query / statement log; stderr if unset
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+
+# Read-through cache (wallet balances). Backend: 'none' (default), 'redis' or 'memory' (per-process LRU+TTL).
+# Wallets are written by the transaction service, which cannot invalidate another process's memory cache, so
+# only use 'memory' when every writer runs in the reading process (single-process dev, tests).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'none')
+CACHE_TTL = float(os.getenv('CACHE_TTL', 5))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
 # JWT Configuration
 JWT_SECRET = os.getenv('JWT_SECRET', 'doswallet-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION = 86400  # 24 hours
+# Max number of verified tokens kept in each process's verification cache
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 10000))
+
+# GraphQL views (shared/graphql_view.py): parsed + validated documents and Automatic Persisted Queries
+# (sha256 -> query text) kept per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.getenv('GRAPHQL_DOCUMENT_CACHE_SIZE', 500))
+PERSISTED_QUERY_CACHE_SIZE = int(os.getenv('PERSISTED_QUERY_CACHE_SIZE', 1000))
+PERSISTED_QUERY_TTL = float(os.getenv('PERSISTED_QUERY_TTL', 86400))
 
 # Service Ports
 SERVICE_PORTS = {
@@ -31,9 +61,83 @@ SERVICE_PORTS = {
     'notification': int(os.getenv('NOTIFICATION_SERVICE_PORT', 5004))
 }
 
+# Serving mode (see shared/server.py): 'dev' runs the Flask dev server, 'production' a multi-worker server
+SERVER_MODE = os.getenv('SERVER_MODE', 'dev')
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 2))
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))  # keep <= DB_POOL_SIZE: each thread may hold a connection
+SERVER_KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', 5))  # seconds an idle keep-alive connection is held
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))  # seconds to drain on shutdown
+SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 60))  # seconds before a stuck worker is restarted
+
+# Password hashing (user-service/passwords.py). bcrypt cost factor for new hashes; stored hashes with another
+# cost are rehashed on the next successful login.
+PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', 12))
+# bcrypt processes per serving process (0 = hash on the request thread); by default the cores split over workers
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', max((os.cpu_count() or 1) // SERVER_WORKERS, 1)))
+# Hash jobs allowed to wait for a free process; further logins / registrations are refused with HTTP 429
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 16))
+
 # CORS Configuration
 CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
 
+# Sampled GraphQL request log (shared/request_log.py). DEBUG_GRAPHQL=1 logs every request; otherwise set a
+# sampling rate between 0 and 1. Entries are redacted, truncated and written by a background thread to
+# GRAPHQL_LOG_FILE (stderr if unset).
+GRAPHQL_LOG_SAMPLE_RATE = float(os.getenv('GRAPHQL_LOG_SAMPLE_RATE', 1.0 if os.getenv('DEBUG_GRAPHQL') == '1' else 0.0))
+GRAPHQL_LOG_MAX_CHARS = int(os.getenv('GRAPHQL_LOG_MAX_CHARS', 2000))
+GRAPHQL_LOG_QUEUE_SIZE = int(os.getenv('GRAPHQL_LOG_QUEUE_SIZE', 10000))
+GRAPHQL_LOG_FILE = os.getenv('GRAPHQL_LOG_FILE')
+
+# Notification outbox dispatcher (transaction-service/notification_dispatcher.py).
+# 'thread' runs it inside the transaction service; 'off' when it runs as a separate process.
+NOTIFICATION_DISPATCHER = os.getenv('NOTIFICATION_DISPATCHER', 'thread')
+NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 200))
+NOTIFICATION_POLL_INTERVAL = float(os.getenv('NOTIFICATION_POLL_INTERVAL', 1.0))
+# Table the dispatcher writes to; may be schema-qualified (e.g. doswallet_notification_db.notifications)
+NOTIFICATIONS_TABLE = os.getenv('NOTIFICATIONS_TABLE', 'notifications')
+# ... and the per-user unread counters it keeps in step (see notification-service/models.py)
+NOTIFICATION_COUNTS_TABLE = os.getenv('NOTIFICATION_COUNTS_TABLE', 'notification_unread_counts')
+
+# Table the user service creates each new user's wallet in, in the registration's own transaction;
+# may be schema-qualified (e.g. doswallet_wallet_db.wallets)
+WALLETS_TABLE = os.getenv('WALLETS_TABLE', 'wallets')
+
+# NIM -> user_id table the transaction service's Pay mutation resolves students with. Owned by the transaction
+# service and kept in sync by the user service; may be schema-qualified (e.g. doswallet_transaction_db.user_nims)
+USER_NIMS_TABLE = os.getenv('USER_NIMS_TABLE', 'user_nims')
+# Per-process NIM -> user_id cache in the transaction service. A cached owner is re-checked by the payment's own
+# debit, so a NIM moved to another user by a profile update is never charged to its previous owner. Unknown NIMs
+# are not cached.
+NIM_CACHE_SIZE = int(os.getenv('NIM_CACHE_SIZE', 50000))
+NIM_CACHE_TTL = float(os.getenv('NIM_CACHE_TTL', 300))
+
+# Notification push streams (notification-service/push.py, GET /notifications/stream).
+# Each open stream holds a server thread, so the notification service runs SERVER_THREADS +
+# NOTIFICATION_STREAM_MAX_CONNECTIONS threads per worker: streams never take the threads other requests need.
+# Threads are only started as streams open, and an idle stream's thread costs its stack (8 MB of address space,
+# well under 100 KB resident) and a wakeup per heartbeat. By default 2 workers serve 200 streams; for more, add
+# SERVER_WORKERS before raising this, keeping each worker to a few hundred threads.
+NOTIFICATION_STREAM_MAX_CONNECTIONS = int(os.getenv('NOTIFICATION_STREAM_MAX_CONNECTIONS', 100))  # per worker
+NOTIFICATION_STREAM_MAX_PER_USER = int(os.getenv('NOTIFICATION_STREAM_MAX_PER_USER', 5))
+NOTIFICATION_STREAM_BUFFER = int(os.getenv('NOTIFICATION_STREAM_BUFFER', 100))  # undelivered events per stream
+NOTIFICATION_STREAM_HEARTBEAT = float(os.getenv('NOTIFICATION_STREAM_HEARTBEAT', 15))
+# Lifetime in seconds of the stream tickets browsers put in the stream URL instead of their JWT
+NOTIFICATION_STREAM_TICKET_TTL = int(os.getenv('NOTIFICATION_STREAM_TICKET_TTL', 60))
+# Seconds between the hub's checks for notifications written by other processes (the outbox dispatcher)
+NOTIFICATION_PUSH_POLL_INTERVAL = float(os.getenv('NOTIFICATION_PUSH_POLL_INTERVAL', 1.0))
+# Seconds the hub keeps re-reading notification_ids it skipped, in case their transaction commits late (ids are
+# assigned at insert, so a lower id can commit after a higher one has been published)
+NOTIFICATION_PUSH_GAP_TIMEOUT = float(os.getenv('NOTIFICATION_PUSH_GAP_TIMEOUT', 60))
+
+# Ledger partitioning and archival (transaction-service/archive.py, scripts/manage_partitions.py).
+# Monthly partitions are created this many months ahead; months older than the retention window (in whole
+# months before the current one) are written to gzip files in TRANSACTION_ARCHIVE_DIR and dropped from the table.
+TRANSACTION_PARTITIONS_AHEAD = int(os.getenv('TRANSACTION_PARTITIONS_AHEAD', 3))
+TRANSACTION_RETENTION_MONTHS = int(os.getenv('TRANSACTION_RETENTION_MONTHS', 12))
+TRANSACTION_ARCHIVE_DIR = os.getenv('TRANSACTION_ARCHIVE_DIR')  # default: transaction-service/archive
+# Archived (month, user) histories kept decoded in memory by each transaction-service process
+TRANSACTION_ARCHIVE_CACHE_SIZE = int(os.getenv('TRANSACTION_ARCHIVE_CACHE_SIZE', 256))
+
 # Optional API keys for external integrations (set in .env for production)
 TRANSACTION_API_KEY = os.getenv('TRANSACTION_API_KEY', None)
 
@@ -2,42 +2,229 @@
 Shared database connection utility
 """
 import mysql.connector
-from mysql.connector import pooling
+from mysql.connector.errors import PoolError
 from config import DB_CONFIG
+import instrumentation
+from collections import deque
+import bisect
+import threading
 import time
 
+# Upper bounds (ms) of the checkout wait-time histogram buckets; the last bucket is unbounded
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+
+class PooledConnection:
+    """Connection checked out from ConnectionPool. close() returns it to the pool instead of closing it."""
+
+    def __init__(self, pool, conn, created_at, wait_time):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        # Seconds this checkout spent waiting for a free connection
+        self.wait_time = wait_time
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._conn.cursor(*args, **kwargs)
+        if instrumentation.enabled():
+            return instrumentation.InstrumentedCursor(cursor, self)
+        return cursor
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._release(conn, self._created_at)
+
+
+class ConnectionPool:
+    """Thread-safe MySQL connection pool.
+
+    Compared to mysql.connector's MySQLConnectionPool:
+    - checkout blocks up to `timeout` seconds for a free connection instead of failing immediately
+    - up to `max_overflow` extra connections are opened under bursts and closed again when returned
+    - no session reset round-trip per checkout; a connection is only pinged if it sat idle for `ping_after`
+      seconds, and is replaced once it is older than `recycle` seconds
+    - in-use / waiters / wait-time histogram metrics via metrics()
+    """
+
+    def __init__(self, size, max_overflow, timeout, recycle, ping_after, **connect_args):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._connect_args = connect_args
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, created_at, last_used); most recently returned on the right
+        self._total = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def _connect(self):
+        return mysql.connector.connect(autocommit=False, **self._connect_args)
+
+    def get_connection(self):
+        """Check out a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        entry = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    # LIFO: reuse the warmest connection, let surplus ones age out
+                    entry = self._idle.pop()
+                    break
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolError(f"Timed out after {self.timeout}s waiting for a database connection")
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            self._in_use += 1
+
+        wait_time = time.monotonic() - start
+        self._record_wait(wait_time)
+
+        try:
+            if entry is None:
+                conn, created_at = self._connect(), time.monotonic()
+            else:
+                conn, created_at = self._prepare(*entry)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, conn, created_at, wait_time)
+
+    def _prepare(self, conn, created_at, last_used):
+        """Recycle or health-check an idle connection before handing it out"""
+        now = time.monotonic()
+        if now - created_at > self.recycle:
+            self._close_quietly(conn)
+            return self._connect(), time.monotonic()
+        if now - last_used > self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._close_quietly(conn)
+                return self._connect(), time.monotonic()
+        return conn, created_at
+
+    def _release(self, conn, created_at):
+        """Return a connection; roll back anything the caller left open since sessions are not reset"""
+        healthy = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.size:
+                self._idle.append((conn, created_at, time.monotonic()))
+                conn = None
+            else:
+                # Overflow (or broken) connection: close it
+                self._total -= 1
+            self._cond.notify()
+        if conn is not None:
+            self._close_quietly(conn)
+
+    def prime(self):
+        """Open one connection up front so configuration errors surface at startup"""
+        self.get_connection().close()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _record_wait(self, seconds):
+        index = bisect.bisect_left(WAIT_BUCKETS_MS, seconds * 1000)
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += seconds
+            self._wait_buckets[index] += 1
+
+    def metrics(self):
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            buckets = {f"le_{ms}ms": count for ms, count in zip(WAIT_BUCKETS_MS, self._wait_buckets)}
+            buckets['le_inf'] = self._wait_buckets[-1]
+            return {
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._total,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiters': self._waiters,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'wait_seconds_total': round(self._wait_total, 6),
+                'wait_histogram': buckets
+            }
+
+
 # Lazy initialization of connection pool
 db_pool = None
+_pool_lock = threading.Lock()
 
 def get_pool():
     """Get or create connection pool"""
     global db_pool
     if db_pool is None:
-        # Retry connection with delay for Docker
-        max_retries = 5
-        for attempt in range(max_retries):
-            try:
-                db_pool = pooling.MySQLConnectionPool(
-                    pool_name="doswallet_pool",
-                    pool_size=DB_CONFIG.get('pool_size', 5),
-                    pool_reset_session=True,
+        with _pool_lock:
+            if db_pool is None:
+                pool = ConnectionPool(
+                    size=DB_CONFIG.get('pool_size', 5),
+                    max_overflow=DB_CONFIG.get('pool_max_overflow', 10),
+                    timeout=DB_CONFIG.get('pool_timeout', 30),
+                    recycle=DB_CONFIG.get('pool_recycle', 3600),
+                    ping_after=DB_CONFIG.get('pool_ping_after', 30),
                     host=DB_CONFIG['host'],
                     port=DB_CONFIG['port'],
                     user=DB_CONFIG['user'],
                     password=DB_CONFIG['password'],
                     database=DB_CONFIG['database'],
-                    charset=DB_CONFIG['charset'],
-                    autocommit=False
+                    charset=DB_CONFIG['charset']
                 )
-                break
-            except mysql.connector.Error as e:
-                if attempt < max_retries - 1:
-                    print(f"Database connection attempt {attempt + 1} failed, retrying...")
-                    time.sleep(2)
-                else:
-                    raise
+                # Retry connection with delay for Docker
+                max_retries = 5
+                for attempt in range(max_retries):
+                    try:
+                        pool.prime()
+                        break
+                    except mysql.connector.Error as e:
+                        if attempt < max_retries - 1:
+                            print(f"Database connection attempt {attempt + 1} failed, retrying...")
+                            time.sleep(2)
+                        else:
+                            raise
+                db_pool = pool
     return db_pool
 
+def get_pool_metrics():
+    """Pool usage metrics, or None if the pool has not been created yet"""
+    return db_pool.metrics() if db_pool is not None else None
+
 def get_db_connection():
     """Get database connection from pool"""
     try:
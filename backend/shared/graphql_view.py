@@ -0,0 +1,144 @@
+"""
+GraphQL view shared by the microservices
+
+flask_graphql's GraphQLView re-parses and re-validates the full query text on every request, although the
+frontends only ever send a handful of distinct operations. CachedGraphQLView adds:
+- an LRU of parsed and validated documents keyed by the query's sha256, so a repeated operation goes
+  straight to execution
+- Automatic Persisted Queries (the Apollo protocol): a client may send only
+  `extensions.persistedQuery.sha256Hash`. Unknown hashes are answered with a `PersistedQueryNotFound` error,
+  after which the client resends the full query together with its hash and the server remembers it.
+
+Both caches are per process; each worker learns a persisted query on its first miss.
+
+A resolver that sheds load can call set_http_status(429, ...) so the response carries that status instead of 200.
+"""
+import hashlib
+import json
+from functools import partial
+
+from flask import Response, g, request
+from flask_graphql import GraphQLView
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult, execute
+from graphql.validation import validate
+from graphql_server import HttpQueryError
+
+from cache import LRUTTLCache
+from config import GRAPHQL_DOCUMENT_CACHE_SIZE, PERSISTED_QUERY_CACHE_SIZE, PERSISTED_QUERY_TTL
+
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+
+
+def query_hash(query):
+    """sha256 hex digest of a query string, as used by Automatic Persisted Queries"""
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    """GraphQL backend that parses and validates each distinct query once.
+
+    Documents that fail validation are not cached, so malformed queries cannot push real ones out.
+    """
+
+    def __init__(self, max_entries=GRAPHQL_DOCUMENT_CACHE_SIZE):
+        super().__init__()
+        # Documents never go stale, so only the LRU bound matters
+        self.documents = LRUTTLCache('graphql_documents', ttl=float('inf'), max_entries=max_entries)
+
+    def document_from_string(self, schema, document_string):
+        if not isinstance(document_string, str):
+            return super().document_from_string(schema, document_string)
+
+        key = (id(schema), query_hash(document_string))
+        document = self.documents.get(key)
+        if document is not None:
+            return document
+
+        document = super().document_from_string(schema, document_string)
+        errors = validate(schema, document.document_ast)
+        if errors:
+            document.execute = lambda *args, **kwargs: ExecutionResult(errors=errors, invalid=True)
+            return document
+
+        # Validated once here; execution skips straight to the resolvers
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document.document_ast,
+            execute=partial(execute, schema, document.document_ast, **self.execute_params)
+        )
+        self.documents.set(key, document)
+        return document
+
+
+_document_backend = CachedDocumentBackend()
+_persisted_queries = LRUTTLCache('persisted_queries', ttl=PERSISTED_QUERY_TTL, max_entries=PERSISTED_QUERY_CACHE_SIZE)
+
+
+def set_http_status(status, headers=None):
+    """Answer the current GraphQL request with `status` (and extra headers) instead of 200; the body is unchanged"""
+    g.graphql_http_status = (status, headers or {})
+
+
+def _resolve_persisted_query(data):
+    """Fill in `query` for an Automatic Persisted Query request, or remember a newly registered one"""
+    if not isinstance(data, dict):
+        return data
+    extensions = data.get('extensions')
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise HttpQueryError(400, 'Extensions are invalid JSON.')
+    persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+    if not persisted:
+        return data
+
+    if persisted.get('version') != 1:
+        raise HttpQueryError(400, 'Unsupported persisted query version.')
+    sha256_hash = persisted.get('sha256Hash')
+    if not isinstance(sha256_hash, str):
+        raise HttpQueryError(400, 'persistedQuery.sha256Hash is required.')
+
+    data = dict(data)
+    query = data.get('query')
+    if query:
+        if query_hash(query) != sha256_hash:
+            raise HttpQueryError(400, 'provided sha does not match query')
+        _persisted_queries.set(sha256_hash, query)
+    else:
+        query = _persisted_queries.get(sha256_hash)
+        if query is None:
+            # Apollo clients expect this exact message and retry with the full query
+            raise HttpQueryError(200, PERSISTED_QUERY_NOT_FOUND)
+        data['query'] = query
+    return data
+
+
+class CachedGraphQLView(GraphQLView):
+    """GraphQLView with the parsed-document cache and Automatic Persisted Queries"""
+
+    def get_backend(self):
+        return self.backend or _document_backend
+
+    def dispatch_request(self):
+        response = super().dispatch_request()
+        override = g.pop('graphql_http_status', None)
+        # GraphiQL pages come back as plain strings
+        if override and isinstance(response, Response) and response.status_code == 200:
+            response.status_code = override[0]
+            response.headers.update(override[1])
+        return response
+
+    def parse_body(self):
+        data = super().parse_body()
+        if not data and request.method == 'GET' and 'extensions' in request.args:
+            # GET form of a persisted query: ?extensions={...}&variables=...&operationName=...
+            data = {'extensions': request.args['extensions']}
+        if isinstance(data, list):
+            return [_resolve_persisted_query(entry) for entry in data]
+        if hasattr(data, 'to_dict'):
+            data = data.to_dict()
+        return _resolve_persisted_query(data)
@@ -0,0 +1,292 @@
+"""
+Per-query database instrumentation
+
+Every statement run through a pooled connection (execute_query and the raw cursors in Transaction.*_atomic)
+is timed by InstrumentedCursor and reported to the registered hooks as a QueryEvent. The built-in hooks:
+- aggregate per normalized SQL fingerprint (count, total/max time, rows, connection wait, latency histogram)
+- log statements slower than SLOW_QUERY_MS to the 'doswallet.db' logger
+- with DB_TRACE=2, log every statement
+
+DB_TRACE=0 (default) disables all of it; DB_TRACE=1 enables aggregation and the slow-query log. When enabled,
+the 'doswallet.db' records are written to DB_TRACE_LOG_FILE (stderr if unset) by a background writer thread,
+as for the GraphQL request log, so logging a statement never waits on I/O.
+"""
+import atexit
+import bisect
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from config import DB_TRACE, DB_TRACE_LOG_FILE, SLOW_QUERY_MS
+from request_log import DroppingQueueHandler
+
+logger = logging.getLogger('doswallet.db')
+
+# Log records waiting for the writer thread; further records are dropped (and counted) rather than blocking
+LOG_QUEUE_SIZE = 10000
+
+# Upper bounds (ms) of the per-fingerprint latency histogram; the last bucket is unbounded
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST_RE = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normalize SQL so statements differing only in literals / list lengths aggregate together"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    sql = _VALUES_LIST_RE.sub(r'\1, ...', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryEvent:
+    """One executed statement"""
+    __slots__ = ('sql', 'fingerprint', 'duration', 'rows', 'wait_time')
+
+    def __init__(self, sql, duration, rows, wait_time):
+        self.sql = sql
+        self.fingerprint = fingerprint(sql)
+        self.duration = duration
+        self.rows = rows
+        self.wait_time = wait_time
+
+
+_hooks = []
+
+
+def add_hook(hook):
+    """Register a callable taking a QueryEvent. Hooks must be fast and must not raise."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def enabled():
+    return bool(_hooks)
+
+
+def record(sql, duration, rows, wait_time=0.0):
+    """Report one executed statement to every hook"""
+    if not _hooks:
+        return
+    event = QueryEvent(sql, duration, rows, wait_time)
+    for hook in list(_hooks):
+        try:
+            hook(event)
+        except Exception as e:
+            logger.warning('Query hook %r failed: %s', hook, e)
+
+
+class QueryStats:
+    """Per-fingerprint aggregate of QueryEvents"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __call__(self, event):
+        with self._lock:
+            s = self._stats.get(event.fingerprint)
+            if s is None:
+                s = self._stats[event.fingerprint] = {
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'wait_ms': 0.0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)
+                }
+            ms = event.duration * 1000
+            s['count'] += 1
+            s['total_ms'] += ms
+            s['max_ms'] = max(s['max_ms'], ms)
+            s['rows'] += max(event.rows or 0, 0)
+            s['wait_ms'] += event.wait_time * 1000
+            s['buckets'][bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    def snapshot(self):
+        """Aggregates sorted by total time, with an approximate p99 (histogram bucket upper bound)"""
+        with self._lock:
+            items = [(fp, dict(s, buckets=list(s['buckets']))) for fp, s in self._stats.items()]
+        result = []
+        for fp, s in sorted(items, key=lambda item: item[1]['total_ms'], reverse=True):
+            result.append({
+                'fingerprint': fp,
+                'count': s['count'],
+                'total_ms': round(s['total_ms'], 3),
+                'avg_ms': round(s['total_ms'] / s['count'], 3),
+                'max_ms': round(s['max_ms'], 3),
+                'p99_ms_le': _percentile_bound(s['buckets'], 0.99),
+                'rows': s['rows'],
+                'wait_ms': round(s['wait_ms'], 3)
+            })
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def _percentile_bound(buckets, q):
+    target = q * sum(buckets)
+    running = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS + [None], buckets):
+        running += count
+        if running >= target:
+            return bound
+    return None
+
+
+def _slow_query_hook(event):
+    ms = event.duration * 1000
+    if ms >= SLOW_QUERY_MS:
+        logger.warning('Slow query (%.1f ms, %s rows, waited %.1f ms for connection): %s',
+                       ms, event.rows, event.wait_time * 1000, event.fingerprint)
+
+
+def _trace_hook(event):
+    logger.info('Query %.2f ms, %s rows: %s', event.duration * 1000, event.rows, event.fingerprint)
+
+
+class BackgroundLogHandler(DroppingQueueHandler):
+    """Queues records for `writer`, which a QueueListener thread runs. The thread is started by the first
+    record each process emits (threads do not survive a gunicorn fork)."""
+
+    def __init__(self, writer, queue_size=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.writer = writer
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._listener is None or self._listener_pid != os.getpid():
+                self._listener = logging.handlers.QueueListener(self.queue, self.writer)
+                self._listener.start()
+                self._listener_pid = os.getpid()
+                atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the writer thread"""
+        with self._start_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+
+    def emit(self, record):
+        self.start()
+        super().emit(record)
+
+
+def configure_logging(level, filename=DB_TRACE_LOG_FILE, stream=None):
+    """Write 'doswallet.db' records at `level` and above through a BackgroundLogHandler; returns the handler"""
+    writer = logging.FileHandler(filename) if filename else logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler = BackgroundLogHandler(writer)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    # Already written here; do not repeat through whatever the application configured on the root logger
+    logger.propagate = False
+    return handler
+
+
+query_stats = QueryStats()
+
+if DB_TRACE >= 1:
+    configure_logging(logging.INFO if DB_TRACE >= 2 else logging.WARNING)
+    add_hook(query_stats)
+    add_hook(_slow_query_hook)
+if DB_TRACE >= 2:
+    add_hook(_trace_hook)
+
+
+class InstrumentedCursor:
+    """Cursor wrapper that times each statement from execute() until the next execute() or close().
+
+    Rows for SELECTs are only known once fetched, so the event is emitted lazily. The connection's checkout
+    wait time is attributed to the first statement run on it.
+    """
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+        self._sql = None
+        self._elapsed = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def _flush(self):
+        if self._sql is not None:
+            wait_time, self._connection.wait_time = self._connection.wait_time, 0.0
+            record(self._sql, self._elapsed, self._cursor.rowcount, wait_time)
+            self._sql = None
+            self._elapsed = 0.0
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._flush()
+        self._sql = operation
+        return self._timed(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._flush()
+        self._sql = operation
+        return self._timed(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(self._cursor.fetchmany, *args, **kwargs)
+
+    def close(self):
+        self._flush()
+        return self._cursor.close()
+
+
+def register_metrics_route(app, service, extra=None):
+    """Add GET /metrics to a service: DB pool usage, per-fingerprint query stats and cache counters.
+    `extra` is an optional callable returning more service-specific sections to include."""
+    from flask import jsonify
+    from database import get_pool_metrics
+    from cache import get_all_stats
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Performance metrics for this process"""
+        body = {
+            'service': service,
+            'db_trace': DB_TRACE,
+            'db_pool': get_pool_metrics(),
+            'queries': query_stats.snapshot(),
+            'caches': get_all_stats()
+        }
+        if extra:
+            body.update(extra())
+        return jsonify(body), 200
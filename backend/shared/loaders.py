@@ -0,0 +1,44 @@
+"""
+Request-scoped DataLoaders for GraphQL resolvers
+
+A resolver that needs a related row returns `get_loader(SomeLoader).load(key)` instead of fetching the row
+itself. Every key requested while one level of the query is being resolved is collected and fetched with a
+single `fetch_many(keys)` call (one `WHERE key IN (...)` query), so a list of N objects costs one query
+instead of N. Loader instances live on flask.g: a row is fetched at most once per request and never
+outlives it.
+"""
+from promise import Promise
+from promise.dataloader import DataLoader
+
+# Upper bound on keys per fetch_many() call; larger batches are split
+MAX_LOADER_BATCH = 500
+
+
+class RowLoader(DataLoader):
+    """DataLoader over dict rows. Subclasses set `key_field` and implement `fetch_many(keys)`."""
+    key_field = None
+
+    def __init__(self):
+        super().__init__(max_batch_size=MAX_LOADER_BATCH)
+
+    def fetch_many(self, keys):
+        """Return the rows for `keys` in any order; missing keys are simply absent"""
+        raise NotImplementedError
+
+    def batch_load_fn(self, keys):
+        rows = self.fetch_many(list(keys))
+        by_key = {row[self.key_field]: row for row in rows}
+        return Promise.resolve([by_key.get(key) for key in keys])
+
+
+def get_loader(loader_cls):
+    """Instance of loader_cls for the current request (a fresh one outside a Flask app context)"""
+    from flask import g, has_app_context
+
+    if not has_app_context():
+        return loader_cls()
+    loaders = g.setdefault('_loaders', {})
+    loader = loaders.get(loader_cls)
+    if loader is None:
+        loader = loaders[loader_cls] = loader_cls()
+    return loader
@@ -0,0 +1,178 @@
+"""
+Sampled, non-blocking GraphQL request log
+
+A sampled request costs the request thread one random() call and a queue put; unsampled requests only the
+random() call. Redaction, truncation, JSON encoding and the write itself happen on a background writer
+thread (logging's QueueHandler / QueueListener). When the queue is full entries are dropped and counted
+rather than blocking the request.
+
+Each entry is one JSON line: operation name, query text with literals masked, variables with sensitive keys
+(tokens, passwords, amounts, contact details) redacted, status and duration.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from config import GRAPHQL_LOG_SAMPLE_RATE, GRAPHQL_LOG_MAX_CHARS, GRAPHQL_LOG_QUEUE_SIZE, GRAPHQL_LOG_FILE
+
+REDACTED = '[redacted]'
+
+# Variable / field names whose values are never logged (matched case-insensitively as substrings)
+SENSITIVE_KEYS = ('token', 'password', 'secret', 'authorization', 'amount', 'balance', 'email', 'phone', 'nim')
+
+_STRING_LITERAL_RE = re.compile(r'"(?:[^"\\]|\\.)*"')
+_NUMBER_LITERAL_RE = re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_JWT_RE = re.compile(r'eyJ[\w-]+\.[\w-]+\.[\w-]*')
+
+
+def _is_sensitive(key):
+    key = str(key).lower()
+    return any(word in key for word in SENSITIVE_KEYS)
+
+
+def redact(value, max_chars=GRAPHQL_LOG_MAX_CHARS):
+    """Copy of `value` with sensitive keys redacted, JWTs masked and long strings truncated"""
+    if isinstance(value, dict):
+        return {k: REDACTED if _is_sensitive(k) else redact(v, max_chars) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v, max_chars) for v in value]
+    if isinstance(value, str):
+        return truncate(_JWT_RE.sub(REDACTED, value), max_chars)
+    return value
+
+
+def redact_query(query):
+    """Mask inline literals: `deposit(amount: 50000)` is logged as `deposit(amount: ?)`"""
+    query = _STRING_LITERAL_RE.sub('"?"', query)
+    return _NUMBER_LITERAL_RE.sub('?', query)
+
+
+def truncate(text, max_chars):
+    if max_chars and len(text) > max_chars:
+        return f"{text[:max_chars]}...[{len(text) - max_chars} more chars]"
+    return text
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full instead of raising"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the writer thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestLogFormatter(logging.Formatter):
+    """Renders a request entry (the record's msg dict, holding the raw body) as one redacted JSON line"""
+
+    def __init__(self, max_chars=GRAPHQL_LOG_MAX_CHARS):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record):
+        entry = dict(record.msg)
+        entry['ts'] = round(record.created, 3)
+        raw = entry.pop('body', b'')
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            # application/graphql: the body is the query itself
+            body = {'query': raw.decode('utf-8', 'replace') if isinstance(raw, bytes) else str(raw)}
+        if isinstance(body, dict):
+            if body.get('query'):
+                entry['query'] = truncate(redact_query(body['query']), self.max_chars)
+            entry['operation'] = body.get('operationName')
+            if body.get('variables'):
+                entry['variables'] = redact(body['variables'], self.max_chars)
+            persisted = (body.get('extensions') or {}).get('persistedQuery') if isinstance(body.get('extensions'), dict) else None
+            if persisted:
+                entry['persisted_query'] = persisted.get('sha256Hash')
+        elif isinstance(body, list):
+            entry['batch'] = len(body)
+        return json.dumps(entry, default=str)
+
+
+class GraphQLRequestLog:
+    """Per-process sampled request log; register(app) hooks it into a Flask app"""
+
+    def __init__(self, sample_rate=GRAPHQL_LOG_SAMPLE_RATE, max_chars=GRAPHQL_LOG_MAX_CHARS,
+                 queue_size=GRAPHQL_LOG_QUEUE_SIZE, filename=GRAPHQL_LOG_FILE, stream=None):
+        self.sample_rate = sample_rate
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+
+        if filename:
+            writer = logging.FileHandler(filename)
+        else:
+            writer = logging.StreamHandler(stream or sys.stderr)
+        writer.setFormatter(RequestLogFormatter(max_chars))
+        self.writer = writer
+        self._listener = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the writer thread once per process (threads do not survive a gunicorn fork)"""
+        if self._listener is not None and self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener is None or self._listener_pid != os.getpid():
+                self._listener = logging.handlers.QueueListener(self.queue, self.writer)
+                self._listener.start()
+                self._listener_pid = os.getpid()
+                atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued entries and stop the writer thread"""
+        with self._lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+
+    def sampled(self):
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def log(self, body, status, duration):
+        """Queue one entry; `body` is the raw request body (bytes)"""
+        self.start()
+        entry = {'path': '/graphql', 'status': status, 'ms': round(duration * 1000, 2), 'body': body}
+        self.handler.handle(logging.LogRecord('doswallet.graphql', logging.INFO, __file__, 0, entry, None, None))
+
+    def register(self, app, path='/graphql'):
+        from flask import g, request
+
+        if self.sample_rate <= 0:
+            # Disabled: no per-request hooks at all
+            return
+
+        @app.before_request
+        def _sample_graphql_request():
+            if request.path == path and request.method == 'POST' and self.sampled():
+                g._graphql_log_started = time.perf_counter()
+
+        @app.after_request
+        def _log_graphql_request(response):
+            started = g.pop('_graphql_log_started', None)
+            if started is not None:
+                # The view already read and cached the body; parsing and redaction happen on the writer thread
+                self.log(request.get_data(), response.status_code, time.perf_counter() - started)
+            return response
+
+    def stats(self):
+        return {'sample_rate': self.sample_rate, 'queued': self.queue.qsize(), 'dropped': self.handler.dropped}
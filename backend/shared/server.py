@@ -0,0 +1,76 @@
+"""
+Shared launcher for the microservices
+
+SERVER_MODE=dev        Flask development server with the reloader (previous behaviour)
+SERVER_MODE=production multi-worker, multi-threaded server:
+                       - gunicorn with gthread workers (Linux/macOS, used by Docker)
+                       - waitress, threads only (Windows, where gunicorn is unavailable)
+"""
+import sys
+from config import SERVER_MODE, SERVER_WORKERS, SERVER_THREADS, SERVER_KEEPALIVE, SERVER_GRACEFUL_TIMEOUT, SERVER_TIMEOUT
+
+
+def serve(app, port, host='0.0.0.0', threads=SERVER_THREADS):
+    """Run `app` on host:port using the configured SERVER_MODE, with `threads` request threads per worker"""
+    if SERVER_MODE != 'production':
+        app.run(host=host, port=port, debug=True)
+        return
+
+    try:
+        _serve_gunicorn(app, host, port, threads)
+        return
+    except ImportError:
+        pass
+
+    try:
+        _serve_waitress(app, host, port, threads)
+        return
+    except ImportError:
+        pass
+
+    print("SERVER_MODE=production but neither gunicorn nor waitress is installed; "
+          "falling back to the Flask development server", file=sys.stderr)
+    app.run(host=host, port=port, debug=False, threaded=True)
+
+
+def _serve_gunicorn(app, host, port, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class StandaloneApplication(BaseApplication):
+        """Run an already-imported WSGI app under gunicorn without a separate config file"""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': SERVER_WORKERS,
+        'worker_class': 'gthread',
+        'threads': threads,
+        'keepalive': SERVER_KEEPALIVE,
+        # On SIGTERM workers stop accepting and get this long to finish in-flight requests
+        'graceful_timeout': SERVER_GRACEFUL_TIMEOUT,
+        'timeout': SERVER_TIMEOUT,
+        'accesslog': None,
+        'errorlog': '-',
+    }
+    print(f"Starting gunicorn on {host}:{port} ({SERVER_WORKERS} workers x {threads} threads)")
+    StandaloneApplication(app, options).run()
+
+
+def _serve_waitress(app, host, port, threads):
+    from waitress import serve as waitress_serve
+
+    # waitress is single-process, so give it the total thread budget of all would-be workers
+    threads = SERVER_WORKERS * threads
+    print(f"Starting waitress on {host}:{port} ({threads} threads)")
+    waitress_serve(app, host=host, port=port, threads=threads, channel_timeout=SERVER_TIMEOUT)
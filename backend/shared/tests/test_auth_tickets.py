@@ -0,0 +1,22 @@
+from conftest import require
+
+require('flask', 'jwt')
+
+from auth import generate_token, generate_ticket, verify_token
+
+
+def test_tickets_only_verify_for_their_purpose():
+    ticket = generate_ticket(7, 'notification-stream', 60)
+    token = generate_token(7, 'ticket@test.local')
+
+    # Twice each: the second answer comes from the verification cache
+    for _ in range(2):
+        assert verify_token(ticket, purpose='notification-stream')['user_id'] == 7
+        assert verify_token(ticket) is None
+        assert verify_token(ticket, purpose='something-else') is None
+        assert verify_token(token)['user_id'] == 7
+        assert verify_token(token, purpose='notification-stream') is None
+
+
+def test_expired_tickets_are_refused():
+    assert verify_token(generate_ticket(7, 'notification-stream', -1), purpose='notification-stream') is None
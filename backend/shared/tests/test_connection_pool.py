@@ -0,0 +1,74 @@
+import pytest
+import sys
+import threading
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+execute_query = db_module.execute_query
+
+BURST_USER = 99951
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id = %s", (BURST_USER,))
+    execute_query("DELETE FROM wallets WHERE user_id = %s", (BURST_USER,))
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def test_burst_of_deposits_queues_instead_of_failing():
+    """50 concurrent deposits on a pool of DB_POOL_SIZE connections must wait for a connection, not raise PoolError"""
+    errors = []
+
+    def deposit():
+        try:
+            Transaction.deposit_atomic(BURST_USER, 1.0, payment_method='test')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=deposit) for _ in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    row = execute_query("SELECT COUNT(*) AS n FROM transactions WHERE user_id = %s", (BURST_USER,), fetch_one=True)
+    assert row['n'] == 50
+    wallet = execute_query("SELECT balance FROM wallets WHERE user_id = %s", (BURST_USER,), fetch_one=True)
+    assert float(wallet['balance']) == pytest.approx(50.0)
+
+    # tx_models uses the `database` module found on sys.path, not the copy loaded above
+    metrics = sys.modules['database'].get_pool_metrics()
+    assert metrics['in_use'] == 0
+    assert metrics['open'] <= metrics['size'] + metrics['max_overflow']
+    assert metrics['idle'] <= metrics['size']
+    assert metrics['timeouts'] == 0
+    assert metrics['checkouts'] >= 50
+
+
+def test_pool_times_out_when_exhausted():
+    database = sys.modules['database']
+    pool = database.ConnectionPool(size=1, max_overflow=0, timeout=0.2, recycle=3600, ping_after=30,
+                                   **database.get_pool()._connect_args)
+    held = pool.get_connection()
+    try:
+        with pytest.raises(database.PoolError):
+            pool.get_connection()
+        assert pool.metrics()['timeouts'] == 1
+    finally:
+        held.close()
+    # Released connection is reusable
+    pool.get_connection().close()
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR, require
+
+require('dotenv')
+
+# Reports a fast and a slow statement from a fresh process, where DB_TRACE takes effect at import
+RECORD_SCRIPT = """
+import conftest
+import instrumentation
+instrumentation.record('SELECT balance FROM wallets WHERE user_id = 7', 0.0012, 1)
+instrumentation.record("SELECT * FROM transactions WHERE type = 'transfer'", 1.5, 900)
+"""
+
+
+def _db_log(tmp_path, db_trace):
+    log_file = tmp_path / 'db.log'
+    env = dict(os.environ, DB_TRACE=str(db_trace), DB_TRACE_LOG_FILE=str(log_file), SLOW_QUERY_MS='200')
+    subprocess.run([sys.executable, '-c', RECORD_SCRIPT], cwd=BACKEND_DIR, env=env, check=True)
+    return log_file.read_text().splitlines() if log_file.exists() else []
+
+
+def test_db_trace_2_logs_every_statement(tmp_path):
+    lines = _db_log(tmp_path, 2)
+    assert len(lines) == 3
+    assert 'INFO doswallet.db: Query 1.20 ms, 1 rows: SELECT balance FROM wallets WHERE user_id = ?' in lines[0]
+    assert any('WARNING doswallet.db: Slow query (1500.0 ms, 900 rows' in line for line in lines)
+
+
+def test_db_trace_1_logs_slow_queries_only(tmp_path):
+    lines = _db_log(tmp_path, 1)
+    assert len(lines) == 1 and 'Slow query' in lines[0] and "WHERE type = ?" in lines[0]
+
+
+def test_db_trace_0_logs_nothing(tmp_path):
+    assert _db_log(tmp_path, 0) == []
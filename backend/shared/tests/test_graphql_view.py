@@ -0,0 +1,74 @@
+from conftest import require
+
+require('graphene', 'flask_graphql')
+
+import graphene
+from flask import Flask
+
+import graphql_view
+from graphql_view import CachedGraphQLView, query_hash, PERSISTED_QUERY_NOT_FOUND
+
+QUERY = '{ hello(name: "apq") }'
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String(name=graphene.String())
+
+    def resolve_hello(self, info, name):
+        return f"hello {name}"
+
+
+schema = graphene.Schema(query=Query)
+app = Flask(__name__)
+app.add_url_rule('/graphql', view_func=CachedGraphQLView.as_view('graphql', schema=schema))
+client = app.test_client()
+
+
+def _persisted(query=QUERY):
+    return {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(query)}}
+
+
+def test_repeated_query_is_parsed_once():
+    documents = graphql_view._document_backend.documents
+    documents.clear()
+    sets_before = documents.stats.sets
+
+    for _ in range(3):
+        response = client.post('/graphql', json={'query': QUERY})
+        assert response.get_json() == {'data': {'hello': 'hello apq'}}
+
+    assert documents.stats.sets == sets_before + 1
+
+
+def test_invalid_query_is_reported_and_not_cached():
+    documents = graphql_view._document_backend.documents
+    sets_before = documents.stats.sets
+
+    response = client.post('/graphql', json={'query': '{ nope }'})
+    assert response.status_code == 400
+    assert 'nope' in response.get_json()['errors'][0]['message']
+    assert documents.stats.sets == sets_before
+
+
+def test_automatic_persisted_query_round_trip():
+    query = '{ hello(name: "round trip") }'
+
+    # Unknown hash: client is told to resend the full query
+    response = client.post('/graphql', json={'extensions': _persisted(query)})
+    assert response.get_json()['errors'][0]['message'] == PERSISTED_QUERY_NOT_FOUND
+
+    # Full query + hash registers it
+    response = client.post('/graphql', json={'query': query, 'extensions': _persisted(query)})
+    assert response.get_json() == {'data': {'hello': 'hello round trip'}}
+
+    # From now on the hash alone is enough, over POST and GET
+    response = client.post('/graphql', json={'extensions': _persisted(query)})
+    assert response.get_json() == {'data': {'hello': 'hello round trip'}}
+    response = client.get('/graphql', query_string={'extensions': '{"persistedQuery": {"version": 1, "sha256Hash": "%s"}}' % query_hash(query)})
+    assert response.get_json() == {'data': {'hello': 'hello round trip'}}
+
+
+def test_persisted_query_hash_mismatch_is_rejected():
+    response = client.post('/graphql', json={'query': QUERY, 'extensions': _persisted('{ other }')})
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['message'] == 'provided sha does not match query'
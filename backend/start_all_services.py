@@ -37,12 +37,15 @@ services = [
 def start_service(service):
     """Start a single service"""
     print(f"Starting {service['name']} on port {service['port']}...")
+    # Run under the multi-worker server from shared/server.py unless SERVER_MODE is set explicitly
+    env = os.environ.copy()
+    env.setdefault('SERVER_MODE', 'production')
     try:
+        # Output is inherited rather than piped: nobody reads the pipes, and a full pipe would block the service
         process = subprocess.Popen(
             [sys.executable, service['script']],
             cwd=service['path'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            env=env
         )
         return process
     except Exception as e:
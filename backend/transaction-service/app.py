@@ -2,38 +2,49 @@
 Transaction Service - Microservice for transaction management
 Handles deposits, withdrawals, transfers, and transaction history
 """
-from flask import Flask
+from flask import Flask, Response, stream_with_context
 from flask_cors import CORS
-from flask_graphql import GraphQLView
+import json
 import sys
 import os
+import time
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from config import SERVICE_PORTS, CORS_ORIGINS, TRANSACTION_API_KEY
+from config import SERVICE_PORTS, CORS_ORIGINS, TRANSACTION_API_KEY, NOTIFICATION_DISPATCHER
+from server import serve
+from graphql_view import CachedGraphQLView
+from instrumentation import register_metrics_route
+from request_log import GraphQLRequestLog
 from schema import schema
 from flask import request, jsonify, abort
 from models import Transaction
+from notification_dispatcher import start_dispatcher
+from bulk_import import run_import
 
 app = Flask(__name__)
 CORS(app, origins=CORS_ORIGINS)
 
-# Optional debug logging for GraphQL requests. Set DEBUG_GRAPHQL=1 to enable.
-@app.before_request
-def _log_graphql_request_body():
-    try:
-        if request.path == '/graphql' and request.method == 'POST':
-            data = request.get_data(as_text=True)
-            # Log at INFO to ensure visibility in container logs
-            app.logger.info('GraphQL request body: %s', data)
-    except Exception:
-        pass
+# Sampled, redacted GraphQL request log written off the request thread.
+# Off by default; DEBUG_GRAPHQL=1 logs every request, GRAPHQL_LOG_SAMPLE_RATE a fraction of them.
+graphql_request_log = GraphQLRequestLog()
+graphql_request_log.register(app)
+
+# Notification outbox dispatcher: one thread per serving process, started on the first request so that
+# every gunicorn worker (forked after import) gets its own and is woken directly by its own payments
+if NOTIFICATION_DISPATCHER == 'thread':
+    @app.before_request
+    def _ensure_notification_dispatcher():
+        start_dispatcher()
 
 # GraphQL endpoint
 app.add_url_rule(
     '/graphql',
-    view_func=GraphQLView.as_view('graphql', schema=schema, graphiql=True)
+    view_func=CachedGraphQLView.as_view('graphql', schema=schema, graphiql=True)
 )
 
+# GET /metrics: DB pool, per-query stats (DB_TRACE=1) and cache counters
+register_metrics_route(app, 'transaction-service')
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -100,6 +111,39 @@ def get_payment(transaction_id):
     return jsonify(tx), 200
 
 
+@app.route('/imports/transactions', methods=['POST'])
+def import_transactions():
+    """Bulk import deposits / payouts from a streamed CSV or JSON Lines upload.
+    Requires X-API-KEY header if TRANSACTION_API_KEY is set.
+    Format: ?format=csv|jsonl, or from Content-Type (text/csv, application/x-ndjson, application/jsonl).
+    Responds with a JSON Lines report streamed as chunks commit: one line per input row, then a summary line.
+    """
+    # API key protection
+    if TRANSACTION_API_KEY:
+        api_key = request.headers.get('X-API-KEY')
+        if not api_key or api_key != TRANSACTION_API_KEY:
+            abort(401, 'Invalid API key')
+
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'csv' if request.mimetype == 'text/csv' else 'jsonl' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else None
+    if fmt not in ('csv', 'jsonl'):
+        abort(400, 'format must be csv or jsonl')
+
+    stream = request.stream
+
+    def report():
+        counts = {'created': 0, 'duplicate': 0, 'invalid': 0, 'failed': 0}
+        started = time.perf_counter()
+        for result in run_import(stream, fmt):
+            counts[result['status']] += 1
+            yield json.dumps(result) + '\n'
+        summary = dict(counts, rows=sum(counts.values()), seconds=round(time.perf_counter() - started, 3))
+        yield json.dumps({'summary': summary}) + '\n'
+
+    return Response(stream_with_context(report()), mimetype='application/x-ndjson')
+
+
 @app.route('/integrations/food_delivery/charge', methods=['POST'])
 def food_delivery_charge():
     """Endpoint for Food Delivery system to charge a user's wallet (transfer to merchant or withdraw).
@@ -132,16 +176,13 @@ def food_delivery_charge():
     try:
         if merchant_id:
             tx = Transaction.transfer_atomic(user_id, merchant_id, amount, description=description or f'Charge to merchant {merchant_id}', idempotency_key=idempotency_key)
-            if isinstance(tx, dict):
-                return jsonify(tx), 201
-            return jsonify(Transaction.get_by_id(tx)), 201
         else:
             tx = Transaction.withdraw_atomic(user_id, amount, payment_method='food_delivery', description=description, idempotency_key=idempotency_key)
-            return jsonify(Transaction.get_by_id(tx)), 201
+        return jsonify(tx), 201
     except Exception as e:
         abort(400, str(e))
 
 if __name__ == '__main__':
     port = SERVICE_PORTS['transaction']
-    app.run(host='0.0.0.0', port=port, debug=True)
+    serve(app, port)
 
@@ -0,0 +1,407 @@
+"""
+Ledger partitioning and archival
+
+transactions is RANGE-partitioned by month on date (database/init/04_schema_transaction.sql): partition pYYYYMM
+holds month YYYY-MM, pold everything before the first monthly partition and pmax everything after the last one.
+
+- create_partitions() splits the coming months off pmax, TRANSACTION_PARTITIONS_AHEAD months ahead. Run it
+  daily (scripts/manage_partitions.py create); if it lags, new rows wait in pmax and are moved on the next run.
+- archive_partitions() writes every monthly partition older than TRANSACTION_RETENTION_MONTHS to a gzip
+  JSON-lines file in the archive directory (transactions-YYYY-MM.jsonl.gz, one row per line) and drops the
+  partition, which unlike a DELETE costs the same however many rows it holds. Files are never modified
+  once written.
+  Next to it, transactions-YYYY-MM.by-user holds the same rows grouped by user (sender and receiver), one gzip
+  member per user, followed by an index of (user_id, offset, length) sorted by user_id, so one user's month is
+  found by a binary search and read without decompressing anyone else's rows.
+  Rows still in pold are first split into monthly partitions (split_pold), so every archived row is older
+  than every row left in the table.
+  A month that still holds a pending payment request is not archived (nor is any later one): the request can
+  still be confirmed by its idempotency key, which only works while the row is in the table.
+- read_history() pages a user's archived rows with the same (date, transaction_id) keyset as the live history,
+  so a cursor can run from the table into the archive.
+
+Balances and transaction_daily_summary are not affected by archival; TransactionSummary.rebuild only recomputes
+the months still in the table.
+"""
+import sys
+import os
+import re
+import gzip
+import itertools
+import json
+import struct
+from datetime import date, datetime
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+from config import (TRANSACTION_PARTITIONS_AHEAD, TRANSACTION_RETENTION_MONTHS, TRANSACTION_ARCHIVE_DIR,
+                    TRANSACTION_ARCHIVE_CACHE_SIZE)
+from database import execute_query, get_db_connection
+from cache import LRUTTLCache
+
+ARCHIVE_DIR = TRANSACTION_ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive')
+
+_PARTITION_RE = re.compile(r'^p(\d{4})(\d{2})$')
+_ARCHIVE_RE = re.compile(r'^transactions-(\d{4})-(\d{2})\.jsonl\.gz$')
+# Archived rows are written as they come from MySQL; these columns are turned back into the driver's types
+_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# by-user file layout: gzip members, then one _INDEX_ENTRY per user (user_id, offset, length) ordered by
+# user_id, then _INDEX_FOOTER (offset of the first entry, number of entries)
+_INDEX_ENTRY = struct.Struct('<QQQ')
+_INDEX_FOOTER = struct.Struct('<QQ')
+
+# (archive path, user_id) -> that user's rows of the month, newest first. Archive files never change, so
+# entries only leave by LRU eviction.
+_history_cache = LRUTTLCache('transaction_archive', ttl=float('inf'), max_entries=TRANSACTION_ARCHIVE_CACHE_SIZE)
+
+
+def _add_months(month, n):
+    """First day of the month n months after `month` (a date on the first of a month)"""
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def archive_path(month, archive_dir=None):
+    return os.path.join(archive_dir or ARCHIVE_DIR, f"transactions-{month.year:04d}-{month.month:02d}.jsonl.gz")
+
+
+def user_index_path(path):
+    """by-user file of the archive file at `path`"""
+    return path[:-len('.jsonl.gz')] + '.by-user'
+
+
+def list_partitions():
+    """Partitions of transactions in order: name, month (None for pold / pmax), rows (InnoDB's estimate).
+    Empty if the table is not partitioned."""
+    rows = execute_query("""
+        SELECT PARTITION_NAME AS name, TABLE_ROWS AS row_estimate
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, fetch_all=True) or []
+    partitions = []
+    for row in rows:
+        match = _PARTITION_RE.match(row['name'])
+        month = date(int(match.group(1)), int(match.group(2)), 1) if match else None
+        partitions.append({'name': row['name'], 'month': month, 'rows': int(row['row_estimate'] or 0)})
+    return partitions
+
+
+def months_to_create(partitions, today, ahead):
+    """Months still missing a partition up to `ahead` months after today's, oldest first.
+
+    New months continue from the last monthly partition, or from the upper bound of pold (passed as
+    partitions' `pold_end`) when there is none yet.
+    """
+    monthly = [p['month'] for p in partitions if p['month']]
+    if monthly:
+        first = _add_months(max(monthly), 1)
+    else:
+        first = next((p.get('pold_end') for p in partitions if p['name'] == 'pold'), None)
+        if first is None:
+            raise RuntimeError("transactions has neither monthly partitions nor pold to continue from")
+    last = _add_months(today.replace(day=1), ahead)
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+def months_to_archive(partitions, today, retention_months):
+    """Monthly partitions that ended more than `retention_months` whole months before today's month"""
+    cutoff = _add_months(today.replace(day=1), -retention_months)
+    return [p for p in partitions if p['month'] and p['month'] < cutoff]
+
+
+def split_archivable(partitions, pending):
+    """Split partitions due for archival (oldest first) at the first one holding pending rows.
+    `pending` returns a partition's pending row count. Returns (to archive, held back with its count or None)."""
+    for i, partition in enumerate(partitions):
+        count = pending(partition)
+        if count:
+            return partitions[:i], (partition, count)
+    return partitions, None
+
+
+def _pending_rows(partition):
+    row = execute_query(
+        f"SELECT COUNT(*) AS pending FROM transactions PARTITION ({partition['name']}) WHERE status = 'pending'",
+        fetch_one=True
+    )
+    return row['pending'] if row else 0
+
+
+def _pold_end():
+    """First day of the month where pold ends, read back in the server's time zone"""
+    row = execute_query("""
+        SELECT DATE(FROM_UNIXTIME(PARTITION_DESCRIPTION)) AS pold_end
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions' AND PARTITION_NAME = 'pold'
+    """, fetch_one=True)
+    return row['pold_end'] if row else None
+
+
+def create_partitions(ahead=TRANSACTION_PARTITIONS_AHEAD, today=None):
+    """Split the missing months up to `ahead` months from now off pmax. Returns the new partition names."""
+    partitions = list_partitions()
+    if not any(p['name'] == 'pmax' for p in partitions):
+        raise RuntimeError("transactions is not partitioned by month (see database/migration/partition_transactions.sql)")
+    for p in partitions:
+        if p['name'] == 'pold':
+            p['pold_end'] = _pold_end()
+    months = months_to_create(partitions, today or date.today(), ahead)
+    if not months:
+        return []
+    definitions = ', '.join(
+        f"PARTITION {partition_name(month)} VALUES LESS THAN "
+        f"(UNIX_TIMESTAMP('{_add_months(month, 1).isoformat()} 00:00:00'))"
+        for month in months
+    )
+    # Rows already in pmax for these months are moved into them; with the job running ahead pmax is empty
+    execute_query(
+        f"ALTER TABLE transactions REORGANIZE PARTITION pmax INTO ({definitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
+    return [partition_name(month) for month in months]
+
+
+def split_pold():
+    """Give each month that still has rows in pold its own partition, leaving pold empty.
+    Returns the new partition names."""
+    row = execute_query("SELECT MIN(date) AS first FROM transactions PARTITION (pold)", fetch_one=True)
+    if not row or row['first'] is None:
+        return []
+    pold_end = _pold_end()
+    first = row['first'].date().replace(day=1)
+    months = []
+    month = first
+    while month < pold_end:
+        months.append(month)
+        month = _add_months(month, 1)
+    definitions = ', '.join(
+        f"PARTITION {partition_name(month)} VALUES LESS THAN "
+        f"(UNIX_TIMESTAMP('{_add_months(month, 1).isoformat()} 00:00:00'))"
+        for month in months
+    )
+    execute_query(
+        f"ALTER TABLE transactions REORGANIZE PARTITION pold INTO "
+        f"(PARTITION pold VALUES LESS THAN (UNIX_TIMESTAMP('{first.isoformat()} 00:00:00')), {definitions})"
+    )
+    return [partition_name(month) for month in months]
+
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.strftime(_DATE_FORMAT)
+    raise TypeError(f"Cannot archive {type(value).__name__}")
+
+
+def _decode(row):
+    row['amount'] = Decimal(row['amount'])
+    row['date'] = datetime.strptime(row['date'], _DATE_FORMAT)
+    return row
+
+
+def _stream(cursor, size=1000):
+    """Rows of an unbuffered cursor, fetched from the server `size` at a time"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def _line(row):
+    return json.dumps(row, default=_encode, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def write_archive(path, rows):
+    """Write rows to a new gzip JSON-lines file at path + '.tmp', flushed to disk. Returns the row count."""
+    count = 0
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            for row in rows:
+                f.write(_line(row))
+                count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    return count
+
+
+def write_user_index(path, rows):
+    """Write the by-user file of the archive at `path` to user_index_path(path) + '.tmp', flushed to disk.
+
+    `rows` carry the user they are filed under as `owner` (a transfer comes once for its sender and once for its
+    receiver), ordered by owner and then newest first. Rows without an owner belong to no user's history and are
+    skipped. Returns the number of users.
+    """
+    entries = []
+    tmp = user_index_path(path) + '.tmp'
+    with open(tmp, 'wb') as f:
+        owned = (row for row in rows if row['owner'] is not None)
+        for owner, group in itertools.groupby(owned, key=lambda row: row['owner']):
+            member = gzip.compress(b''.join(_line({k: v for k, v in row.items() if k != 'owner'}) for row in group))
+            entries.append((owner, f.tell(), len(member)))
+            f.write(member)
+        index_offset = f.tell()
+        for entry in entries:
+            f.write(_INDEX_ENTRY.pack(*entry))
+        f.write(_INDEX_FOOTER.pack(index_offset, len(entries)))
+        f.flush()
+        os.fsync(f.fileno())
+    return len(entries)
+
+
+def _publish(path):
+    """Move a finished archive (the .tmp files of path and its by-user file) into place, read-only. The
+    by-user file goes first: history only lists months whose main file exists."""
+    for final in (user_index_path(path), path):
+        # Already moved if an earlier run stopped between the two
+        if os.path.exists(final + '.tmp'):
+            os.replace(final + '.tmp', final)
+            os.chmod(final, 0o444)
+    dir_fd = os.open(os.path.dirname(path), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def archive_partition(partition, archive_dir=None):
+    """Archive one monthly partition: write its rows to a file and its by-user file, drop it, then publish both.
+
+    The file only appears after the drop, so history never returns a row from both the table and the archive.
+    A run interrupted before the drop leaves a .tmp file that the next run overwrites; one interrupted after
+    the drop leaves a .tmp file for a partition that no longer exists, which the next run publishes.
+    Returns the number of rows archived.
+    """
+    path = archive_path(partition['month'], archive_dir)
+    if os.path.exists(path):
+        raise RuntimeError(f"{path} already exists but partition {partition['name']} is still in the table")
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        # Streamed from the server; a month can hold millions of rows. Nothing inserts into a month past the
+        # retention window (dates are the insert time), and with no pending rows left (split_archivable) nothing
+        # updates it either, so the partition cannot change before the drop.
+        cursor.execute(f"SELECT * FROM transactions PARTITION ({partition['name']}) ORDER BY transaction_id")
+        count = write_archive(path, _stream(cursor))
+        # External payment requests have no user_id; a row is filed under each user it has
+        cursor.execute(f"""
+            SELECT user_id AS owner, t.* FROM transactions PARTITION ({partition['name']}) t
+            WHERE user_id IS NOT NULL
+            UNION ALL
+            SELECT receiver_id, t.* FROM transactions PARTITION ({partition['name']}) t
+            WHERE receiver_id IS NOT NULL AND NOT (receiver_id <=> user_id)
+            ORDER BY owner, date DESC, transaction_id DESC
+        """)
+        write_user_index(path, _stream(cursor))
+        cursor.execute(f"ALTER TABLE transactions DROP PARTITION {partition['name']}")
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+    _publish(path)
+    return count
+
+
+def archive_partitions(retention_months=TRANSACTION_RETENTION_MONTHS, archive_dir=None, today=None):
+    """Archive every monthly partition past the retention window, oldest first, up to the first one that still
+    holds pending payment requests.
+    Returns (one dict per archived month: partition, month, rows, path;
+    the month held back as a dict with partition, month and pending rows, or None)."""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    partitions = list_partitions()
+    if any(p['name'] == 'pold' for p in partitions) and split_pold():
+        partitions = list_partitions()
+    existing = {p['name'] for p in partitions}
+    # Finish runs interrupted between dropping a partition and publishing its file
+    for name in os.listdir(archive_dir):
+        if name.endswith('.tmp') and _ARCHIVE_RE.match(name[:-4]):
+            year, month = _ARCHIVE_RE.match(name[:-4]).groups()
+            if partition_name(date(int(year), int(month), 1)) not in existing:
+                _publish(os.path.join(archive_dir, name[:-4]))
+
+    due, held = split_archivable(months_to_archive(partitions, today or date.today(), retention_months), _pending_rows)
+    archived = []
+    for partition in due:
+        count = archive_partition(partition, archive_dir)
+        archived.append({'partition': partition['name'], 'month': partition['month'].strftime('%Y-%m'),
+                         'rows': count, 'path': archive_path(partition['month'], archive_dir)})
+    if held:
+        partition, pending = held
+        held = {'partition': partition['name'], 'month': partition['month'].strftime('%Y-%m'), 'pending': pending}
+    return archived, held
+
+
+def archived_months(archive_dir=None):
+    """Months with a published archive file, newest first"""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if not os.path.isdir(archive_dir):
+        return []
+    months = []
+    for name in os.listdir(archive_dir):
+        match = _ARCHIVE_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months, reverse=True)
+
+
+def _user_month(path, user_id):
+    """A user's rows (sent or received) in one archive file, newest first, read from its by-user file"""
+    rows = _history_cache.get((path, user_id))
+    if rows is None:
+        rows = []
+        with open(user_index_path(path), 'rb') as f:
+            f.seek(-_INDEX_FOOTER.size, os.SEEK_END)
+            index_offset, count = _INDEX_FOOTER.unpack(f.read(_INDEX_FOOTER.size))
+
+            def entry(i):
+                f.seek(index_offset + i * _INDEX_ENTRY.size)
+                return _INDEX_ENTRY.unpack(f.read(_INDEX_ENTRY.size))
+
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                if entry(middle)[0] < user_id:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low < count:
+                owner, offset, length = entry(low)
+                if owner == user_id:
+                    f.seek(offset)
+                    rows = [_decode(json.loads(line)) for line in gzip.decompress(f.read(length)).splitlines()]
+        _history_cache.set((path, user_id), rows)
+    return rows
+
+
+def read_history(user_id, limit, after=None, archive_dir=None):
+    """Up to `limit` archived rows sent or received by the user, newest first, older than the keyset position
+    `after` ((date, transaction_id), date as datetime or 'YYYY-MM-DD HH:MM:SS'). Each month costs a lookup in
+    its by-user index plus the user's own rows, once per user; then it is served from memory."""
+    if after and isinstance(after[0], str):
+        after = (datetime.fromisoformat(after[0]), after[1])
+    rows = []
+    for month in archived_months(archive_dir):
+        if after and month > after[0].date():
+            continue
+        for row in _user_month(archive_path(month, archive_dir), user_id):
+            if after and (row['date'], row['transaction_id']) >= after:
+                continue
+            rows.append(dict(row))
+            if len(rows) == limit:
+                return rows
+    return rows
@@ -0,0 +1,133 @@
+"""
+Streaming bulk import of deposits and payouts
+
+The upload (CSV with a header row, or JSON Lines) is read line by line and never held in memory as a whole.
+Rows are validated as they arrive and grouped into chunks of IMPORT_CHUNK_SIZE, each committed by
+Transaction.import_chunk in one DB transaction. One result per input row is yielded as soon as its chunk
+commits, so the HTTP response can be streamed back while the upload is still being read.
+
+Columns / keys: user_id, amount, type (deposit or withdraw, default deposit), payment_method, description,
+idempotency_key.
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from models import Transaction, IMPORT_CHUNK_SIZE
+
+IMPORT_TYPES = ('deposit', 'withdraw')
+# DECIMAL(10,2)
+MAX_AMOUNT = Decimal('99999999.99')
+DEFAULT_PAYMENT_METHOD = 'bulk_import'
+
+
+def _decoded_lines(stream):
+    """Text lines of a binary stream, decoded incrementally (a UTF-8 character may span read chunks)"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for raw in stream:
+        yield decoder.decode(raw)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_records(stream, fmt):
+    """Yield (line_number, record dict or None, error message or None) for each data line of the upload"""
+    lines = _decoded_lines(stream)
+    if fmt == 'csv':
+        # csv needs the trailing newline kept to handle quoted fields spanning lines
+        reader = csv.DictReader(lines)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, None, 'Too many columns'
+            else:
+                yield reader.line_num, record, None
+    else:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line, parse_float=Decimal)
+            except ValueError:
+                yield line_number, None, 'Invalid JSON'
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, 'Each line must be a JSON object'
+                continue
+            yield line_number, record, None
+
+
+def parse_row(record):
+    """Validate one record into an import_chunk row; raises ValueError with a per-row message"""
+    try:
+        user_id = int(str(record.get('user_id')).strip())
+    except (TypeError, ValueError):
+        raise ValueError('user_id must be an integer')
+    if user_id <= 0:
+        raise ValueError('user_id must be positive')
+
+    try:
+        amount = Decimal(str(record.get('amount')).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError('amount must be a number')
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError('amount must be greater than zero')
+    if amount > MAX_AMOUNT:
+        raise ValueError(f'amount must not exceed {MAX_AMOUNT}')
+    if amount.as_tuple().exponent < -2:
+        raise ValueError('amount must have at most 2 decimal places')
+
+    tx_type = str(record.get('type') or 'deposit').strip().lower()
+    if tx_type not in IMPORT_TYPES:
+        raise ValueError(f"type must be one of: {', '.join(IMPORT_TYPES)}")
+
+    idempotency_key = str(record.get('idempotency_key') or '').strip() or None
+    if idempotency_key and len(idempotency_key) > 100:
+        raise ValueError('idempotency_key must be at most 100 characters')
+    payment_method = str(record.get('payment_method') or '').strip() or DEFAULT_PAYMENT_METHOD
+    if len(payment_method) > 50:
+        raise ValueError('payment_method must be at most 50 characters')
+
+    return {
+        'user_id': user_id,
+        'amount': amount,
+        'type': tx_type,
+        'payment_method': payment_method,
+        'description': str(record['description']) if record.get('description') else None,
+        'idempotency_key': idempotency_key
+    }
+
+
+def run_import(stream, fmt, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import an upload, yielding one result dict per data line in input order.
+
+    Result keys: line, status ('created', 'duplicate', 'invalid' or 'failed'), transaction_id, message.
+    A chunk that fails as a whole (e.g. a database error) marks its rows failed and the import continues.
+    """
+    buffered = []  # results waiting for their chunk to commit, in input order
+    chunk = []     # (result, row) pairs of the valid rows in `buffered`
+
+    def flush():
+        if chunk:
+            try:
+                outcomes = Transaction.import_chunk([row for _, row in chunk])
+            except Exception as e:
+                outcomes = [{'status': 'failed', 'transaction_id': None, 'message': f'Chunk failed: {e}'}] * len(chunk)
+            for (result, _), outcome in zip(chunk, outcomes):
+                result.update(outcome)
+        yield from buffered
+        buffered.clear()
+        chunk.clear()
+
+    for line_number, record, error in iter_records(stream, fmt):
+        result = {'line': line_number, 'status': 'invalid', 'transaction_id': None, 'message': error}
+        buffered.append(result)
+        if record is not None:
+            try:
+                chunk.append((result, parse_row(record)))
+            except ValueError as e:
+                result['message'] = str(e)
+        if len(chunk) >= chunk_size:
+            yield from flush()
+    yield from flush()
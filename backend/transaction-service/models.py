@@ -3,9 +3,233 @@ Transaction Service Models
 """
 import sys
 import os
+import random
+import threading
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
 from database import execute_query, get_db_connection
+from cache import get_cache, LRUTTLCache
+from config import NIM_CACHE_SIZE, NIM_CACHE_TTL
+from decimal import Decimal, ROUND_HALF_UP
+import mysql.connector
+from mysql.connector import IntegrityError, errorcode
+
+# Wallet rows cached by the wallet model (see wallet-service/models.py); invalidated after every commit that
+# changes a balance
+wallet_cache = get_cache('wallet')
+
+# NIM -> user_id for the Pay mutation (see UserNim). Always in-process: a lookup is one indexed read, so a
+# shared backend would save little.
+nim_cache = LRUTTLCache('nim', ttl=NIM_CACHE_TTL, max_entries=NIM_CACHE_SIZE)
+
+# Upper bound on the number of transfers accepted by Transaction.transfer_batch in one call
+MAX_BATCH_TRANSFERS = int(os.getenv('MAX_BATCH_TRANSFERS', 500))
+
+# Rows committed per DB transaction by the bulk import (Transaction.import_chunk)
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 1000))
+
+def _parse_sharded_wallets(spec):
+    """Parse SHARDED_WALLETS ("user_id:shards,user_id:shards") into {user_id: shard count}"""
+    wallets = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        user_id, _, shards = part.partition(':')
+        shards = int(shards or 16)
+        if shards < 1:
+            raise ValueError(f"SHARDED_WALLETS: shard count for {user_id} must be at least 1")
+        wallets[int(user_id)] = shards
+    return wallets
+
+# Hot wallets (e.g. Food Delivery merchants) whose incoming transfers are credited to one of N sub-balance rows
+# in wallet_balance_shards instead of the wallets row, so concurrent charges do not serialize on one row lock
+SHARDED_WALLETS = _parse_sharded_wallets(os.getenv('SHARDED_WALLETS', ''))
+
+# Notification texts for Food Delivery payments (delivered asynchronously through notification_outbox)
+PAY_SUCCESS_MESSAGE = "Pembayaran berhasil: Rp {amount:,.2f} untuk pesanan Food Delivery{points_msg} Saldo tersisa: Rp {balance:,.2f}"
+PAY_FAILED_MESSAGE = "Pembayaran gagal: {message}"
+
+def _reserve_idempotency_keys(cursor, keys):
+    """Claim idempotency keys for ledger rows about to be inserted, in the caller's transaction.
+
+    transactions is partitioned by date, so it cannot have a unique index on idempotency_key; the primary key of
+    transaction_idempotency_keys arbitrates instead. A key that is already taken (or held by a concurrent
+    transaction, once that one commits) raises IntegrityError ER_DUP_ENTRY.
+    """
+    if keys:
+        cursor.execute(
+            "INSERT INTO transaction_idempotency_keys (idempotency_key) VALUES " + ', '.join(['(%s)'] * len(keys)),
+            tuple(keys)
+        )
+
+def _insert_idempotent(cursor, row):
+    """INSERT one ledger row and let the idempotency key arbitrate concurrent requests with the same key.
+
+    A new key costs one extra statement (_reserve_idempotency_keys). If the key already exists the reservation
+    fails with ER_DUP_ENTRY (after waiting for the competing transaction to commit or roll back) and the winning
+    row is read back.
+    Returns (transaction_id, None) when inserted, or (None, existing_row) when the key was already used.
+    """
+    key = row.get('idempotency_key')
+    try:
+        if key:
+            _reserve_idempotency_keys(cursor, [key])
+    except IntegrityError as e:
+        if e.errno != errorcode.ER_DUP_ENTRY:
+            raise
+        # Locking read so we see the committed winner rather than this transaction's snapshot
+        cursor.execute("SELECT * FROM transactions WHERE idempotency_key = %s LOCK IN SHARE MODE", (key,))
+        existing = cursor.fetchone()
+        if existing is None:
+            raise ValueError("Idempotency key already used by an archived transaction")
+        return None, existing
+    columns = ', '.join(row)
+    placeholders = ', '.join(['%s'] * len(row))
+    cursor.execute(f"INSERT INTO transactions ({columns}) VALUES ({placeholders})", tuple(row.values()))
+    return cursor.lastrowid, None
+
+def _read_back(cursor, transaction_id):
+    """Read a ledger row this transaction just inserted (with its server-side date and defaults) on the same
+    connection, before commit, so callers get the full row without a second checkout"""
+    cursor.execute("SELECT * FROM transactions WHERE transaction_id = %s", (transaction_id,))
+    return cursor.fetchone()
+
+def _multi_row_ids(cursor, first_id, rows):
+    """transaction_ids of the ledger rows one multi-row INSERT just wrote (lastrowid = first_id), in insert order.
+
+    InnoDB allocates the ids of a multi-row INSERT as one block starting at first_id and spaced by the session's
+    auto_increment_increment, which is more than 1 under multi-primary / Galera setups. The rows found at those
+    ids are checked against the inserted ones, so another session's row is never reported as one of ours.
+    """
+    cursor.execute("SELECT @@SESSION.auto_increment_increment AS step")
+    step = cursor.fetchone()['step']
+    ids = [first_id + n * step for n in range(len(rows))]
+    cursor.execute(
+        "SELECT transaction_id, user_id, type, idempotency_key FROM transactions "
+        f"WHERE transaction_id IN ({', '.join(['%s'] * len(ids))})",
+        tuple(ids)
+    )
+    found = {row['transaction_id']: row for row in cursor.fetchall()}
+    for transaction_id, row in zip(ids, rows):
+        written = found.get(transaction_id)
+        expected = (row['user_id'], row['type'], row.get('idempotency_key'))
+        if written is None or (written['user_id'], written['type'], written['idempotency_key']) != expected:
+            raise RuntimeError("Inserted ledger rows do not match their expected ids")
+    return ids
+
+def _pay_success_message(amount, points_earned, balance):
+    points_msg = f" dan mendapatkan {points_earned} poin reward!" if points_earned > 0 else "!"
+    return PAY_SUCCESS_MESSAGE.format(amount=amount, points_msg=points_msg, balance=balance)
+
+def _money(amount):
+    """Amount as a Decimal with the 2 decimal places of the DECIMAL(10,2) columns (rounded like MySQL does)"""
+    return Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+def _debit(cursor, user_id, amount, points=0, nim=None):
+    """Debit `amount` from a wallet and add `points` in one conditional UPDATE, inside the caller's transaction.
+
+    The UPDATE only matches while balance >= amount, so checking and debiting is a single statement that takes the
+    row lock, instead of SELECT ... FOR UPDATE, a comparison in Python and a second write. With `nim`, it also only
+    matches while that NIM still belongs to the user (see _owns_nim).
+    Returns True if debited; on False nothing changed and the wallet is missing or short of funds (see _balance).
+    A sharded wallet (SHARDED_WALLETS) is locked and its shards folded into the row first.
+    """
+    if user_id in SHARDED_WALLETS:
+        cursor.execute("SELECT wallet_id FROM wallets WHERE user_id = %s FOR UPDATE", (user_id,))
+        cursor.fetchone()
+        WalletShards.fold(cursor, [user_id])
+    if nim is None:
+        cursor.execute(
+            "UPDATE wallets SET balance = balance - %s, points = points + %s WHERE user_id = %s AND balance >= %s",
+            (amount, points, user_id, amount)
+        )
+    else:
+        cursor.execute(
+            "UPDATE wallets SET balance = balance - %s, points = points + %s WHERE user_id = %s AND balance >= %s "
+            "AND EXISTS (SELECT 1 FROM user_nims WHERE nim = %s AND user_id = %s)",
+            (amount, points, user_id, amount, nim, user_id)
+        )
+    return cursor.rowcount == 1
+
+def _owns_nim(cursor, user_id, nim):
+    """Whether `nim` belongs to the user, as seen by the caller's transaction"""
+    cursor.execute("SELECT 1 FROM user_nims WHERE nim = %s AND user_id = %s", (nim, user_id))
+    return cursor.fetchone() is not None
+
+def _balance(cursor, user_id):
+    """Current balance of a wallet as seen by the caller's transaction, or None if it does not exist"""
+    cursor.execute("SELECT balance FROM wallets WHERE user_id = %s", (user_id,))
+    row = cursor.fetchone()
+    return Decimal(row['balance']) if row else None
+
+def _summary_entries(user_id, tx_type, amount, receiver_id=None):
+    """(user_id, summary type, amount) entries a completed ledger row contributes to transaction_daily_summary.
+    A transfer counts as transfer_out for the sender and transfer_in for the receiver."""
+    if tx_type == 'transfer':
+        return [(user_id, 'transfer_out', amount), (receiver_id, 'transfer_in', amount)]
+    return [(user_id, tx_type, amount)]
+
+def _add_to_summary(cursor, entries, shards=None, day=None):
+    """Add completed ledger rows to the per-user summary of `day` with one upsert, inside the caller's transaction.
+
+    `entries` are (user_id, summary type, amount) tuples; rows are aggregated per (user_id, type) and upserted in
+    sorted order so concurrent writers lock summary rows in the same order. `shards` maps a user_id to the summary
+    shard its entries go to (default 0), so credits to a sharded wallet do not all update one summary row.
+    `day` is the date of the ledger rows (default today, for rows written now): rebuild() buckets by DATE(date).
+    """
+    shards = shards or {}
+    totals = {}
+    for user_id, summary_type, amount in entries:
+        if user_id is None:
+            continue
+        key = (user_id, summary_type, shards.get(user_id, 0))
+        count, total = totals.get(key, (0, Decimal('0')))
+        totals[key] = (count + 1, total + Decimal(str(amount)))
+    if not totals:
+        return
+    params = []
+    for (user_id, summary_type, shard), (count, total) in sorted(totals.items()):
+        params.extend([user_id] + ([] if day is None else [day]) + [summary_type, shard, count, total])
+    row = '(%s, CURRENT_DATE, %s, %s, %s, %s)' if day is None else '(%s, %s, %s, %s, %s, %s)'
+    cursor.execute(
+        "INSERT INTO transaction_daily_summary (user_id, day, type, shard, tx_count, total_amount) VALUES "
+        + ', '.join([row] * len(totals))
+        + " ON DUPLICATE KEY UPDATE tx_count = tx_count + VALUES(tx_count), total_amount = total_amount + VALUES(total_amount)",
+        tuple(params)
+    )
+
+def _history_query(user_id, limit, offset=0, after=None):
+    """Build the SQL for a user's history (rows sent by or received by the user), newest first.
+
+    `WHERE user_id = ? OR receiver_id = ?` cannot use a single index, so MySQL falls back to a scan or an
+    index merge followed by a filesort on date. Instead each side is read separately from its own
+    (user_id, date, transaction_id) / (receiver_id, date, transaction_id) index, already in order and capped
+    at the rows the page can need, and the two short lists are merged top-N. Received rows that the user also
+    sent are excluded from the second branch so UNION ALL never returns a row twice.
+    Returns (query, params); kept separate so tests can EXPLAIN the exact statement.
+    """
+    if after:
+        keyset = "AND (date < %s OR (date = %s AND transaction_id < %s))"
+        keyset_params = (after[0], after[0], after[1])
+    else:
+        keyset = ""
+        keyset_params = ()
+    branch_limit = offset + limit
+    query = f"""
+        SELECT * FROM (
+            (SELECT * FROM transactions
+             WHERE user_id = %s {keyset}
+             ORDER BY date DESC, transaction_id DESC
+             LIMIT %s)
+            UNION ALL
+            (SELECT * FROM transactions
+             WHERE receiver_id = %s AND (user_id IS NULL OR user_id <> %s) {keyset}
+             ORDER BY date DESC, transaction_id DESC
+             LIMIT %s)
+        ) AS history
+        ORDER BY date DESC, transaction_id DESC
+        LIMIT %s OFFSET %s
+    """
+    params = (user_id,) + keyset_params + (branch_limit,) + (user_id, user_id) + keyset_params + (branch_limit, limit, offset)
+    return query, params
 
 class Transaction:
     @staticmethod
@@ -24,28 +248,48 @@ class Transaction:
     @staticmethod
     def create_with_idempotency(user_id, amount, transaction_type, payment_method=None, receiver_id=None, description=None, idempotency_key=None, status='completed', qr_payload=None):
         """Create a new transaction with optional idempotency key and status. If idempotency_key exists, return existing transaction id."""
-        if idempotency_key:
-            # Check existing
-            existing = execute_query("SELECT transaction_id FROM transactions WHERE idempotency_key = %s", (idempotency_key,), fetch_one=True)
-            if existing:
-                return existing['transaction_id']
-
-        query = """
-            INSERT INTO transactions (user_id, amount, type, payment_method, receiver_id, description, idempotency_key, status, qr_payload)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        transaction_id = execute_query(
-            query,
-            (user_id, amount, transaction_type, payment_method, receiver_id, description, idempotency_key, status, qr_payload)
-        )
-        return transaction_id
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            transaction_id, existing = _insert_idempotent(cursor, {
+                'user_id': user_id,
+                'amount': amount,
+                'type': transaction_type,
+                'payment_method': payment_method,
+                'receiver_id': receiver_id,
+                'description': description,
+                'idempotency_key': idempotency_key,
+                'status': status,
+                'qr_payload': qr_payload
+            })
+            conn.commit()
+            return existing['transaction_id'] if existing else transaction_id
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
 
     @staticmethod
     def transfer_atomic(sender_id, receiver_id, amount, description=None, idempotency_key=None):
-        """Perform a transfer in a single DB transaction with row locking to ensure atomicity."""
+        """Perform a transfer in a single DB transaction with row locking to ensure atomicity.
+        Returns the transfer's ledger row (the original one for a replayed idempotency key).
+
+        A receiver listed in SHARDED_WALLETS is not locked: the amount is added to one of its balance shards
+        (WalletShards.credit) as the last statement before commit, so charges to a hot merchant only contend
+        on one of N shard rows, each held for the shortest possible time.
+        """
+        amount = _money(amount)
         if amount <= 0:
             raise ValueError("Amount must be greater than zero")
 
+        receiver_sharded = receiver_id in SHARDED_WALLETS and receiver_id != sender_id
         conn = None
         cursor = None
         try:
@@ -53,41 +297,203 @@ class Transaction:
             cursor = conn.cursor(dictionary=True)
             conn.start_transaction()
 
-            # Lock sender wallet row
-            cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (sender_id,))
-            sender_wallet = cursor.fetchone()
-            if not sender_wallet:
-                # Create wallet for sender if not exists
-                cursor.execute("INSERT INTO wallets (user_id, balance, points) VALUES (%s, 0.00, 0)", (sender_id,))
-                cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (sender_id,))
-                sender_wallet = cursor.fetchone()
-
-            # Lock receiver wallet row
-            cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (receiver_id,))
-            receiver_wallet = cursor.fetchone()
-            if not receiver_wallet:
-                cursor.execute("INSERT INTO wallets (user_id, balance, points) VALUES (%s, 0.00, 0)", (receiver_id,))
-                cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (receiver_id,))
-                receiver_wallet = cursor.fetchone()
+            # Ledger row (for sender) first: a replayed key returns the original transfer before any wallet is
+            # locked or the sender's current balance is checked
+            transaction_id, existing = _insert_idempotent(cursor, {
+                'user_id': sender_id, 'amount': amount, 'type': 'transfer', 'receiver_id': receiver_id,
+                'description': description, 'idempotency_key': idempotency_key, 'status': 'completed'
+            })
+            if existing:
+                conn.rollback()
+                return existing
+            transaction = _read_back(cursor, transaction_id)
+
+            # Lock both wallet rows in ascending user_id order (same order as transfer_batch) so that
+            # opposite transfers between the same pair cannot deadlock
+            wallets = {}
+            for uid in ((sender_id,) if receiver_sharded else sorted((sender_id, receiver_id))):
+                cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (uid,))
+                wallet = cursor.fetchone()
+                if not wallet:
+                    # Create wallet if not exists
+                    cursor.execute("INSERT INTO wallets (user_id, balance, points) VALUES (%s, 0.00, 0)", (uid,))
+                    cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (uid,))
+                    wallet = cursor.fetchone()
+                wallets[uid] = wallet
+            # A sharded sender needs its whole balance in the locked row before the check
+            balance = Decimal(wallets[sender_id]['balance']) + WalletShards.fold(cursor, [sender_id]).get(sender_id, 0)
 
             # Check balance
-            if float(sender_wallet['balance']) < float(amount):
+            if balance < amount:
                 conn.rollback()
                 raise Exception("Insufficient balance")
 
             # Update balances
             cursor.execute("UPDATE wallets SET balance = balance - %s WHERE user_id = %s", (amount, sender_id))
-            cursor.execute("UPDATE wallets SET balance = balance + %s WHERE user_id = %s", (amount, receiver_id))
+            if not receiver_sharded:
+                cursor.execute("UPDATE wallets SET balance = balance + %s WHERE user_id = %s", (amount, receiver_id))
 
-            # Create transaction record (for sender)
-            cursor.execute("INSERT INTO transactions (user_id, amount, type, receiver_id, description, idempotency_key, status) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                           (sender_id, amount, 'transfer', receiver_id, description, idempotency_key, 'completed'))
-            transaction_id = cursor.lastrowid
+            summary_shards = None
+            if receiver_sharded:
+                shard = WalletShards.credit(cursor, receiver_id, amount)
+                summary_shards = {receiver_id: shard}
+            _add_to_summary(cursor, _summary_entries(sender_id, 'transfer', amount, receiver_id), summary_shards)
 
             conn.commit()
+            wallet_cache.delete(sender_id, receiver_id)
+            return transaction
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    @staticmethod
+    def transfer_batch(transfers):
+        """Apply many transfers in a single DB transaction.
+
+        Each item is a dict with sender_id, receiver_id, amount and optional description / idempotency_key.
+        Every affected wallet is locked up front in ascending user_id order, so two batches (or a batch and a
+        single transfer) touching the same wallets can no longer deadlock on lock order.
+        Returns one result dict per item, in input order: index, success, transaction (row or None), message.
+        """
+        if not transfers:
+            return []
+        if len(transfers) > MAX_BATCH_TRANSFERS:
+            raise ValueError(f"Batch too large (max {MAX_BATCH_TRANSFERS} transfers)")
+
+        results = [{'index': i, 'success': False, 'transaction': None, 'message': None} for i in range(len(transfers))]
+
+        # Validate items before touching the database
+        valid = []
+        for i, item in enumerate(transfers):
+            try:
+                amount = Decimal(str(item.get('amount')))
+            except Exception:
+                results[i]['message'] = 'Amount must be a number'
+                continue
+            if amount <= 0:
+                results[i]['message'] = 'Amount must be greater than zero'
+            elif item.get('sender_id') == item.get('receiver_id'):
+                results[i]['message'] = 'Cannot transfer to yourself'
+            else:
+                valid.append((i, item, amount))
+
+        if not valid:
+            return results
+
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            conn.start_transaction()
+
+            # Idempotency: resolve keys that already exist with a single lookup
+            keys = [item.get('idempotency_key') for _, item, _ in valid if item.get('idempotency_key')]
+            existing = {}
+            if keys:
+                placeholders = ', '.join(['%s'] * len(keys))
+                cursor.execute(f"SELECT * FROM transactions WHERE idempotency_key IN ({placeholders})", tuple(keys))
+                existing = {row['idempotency_key']: row for row in cursor.fetchall()}
+
+            # Lock every affected wallet in ascending user_id order with one statement
+            user_ids = sorted({item['sender_id'] for _, item, _ in valid} | {item['receiver_id'] for _, item, _ in valid})
+            placeholders = ', '.join(['%s'] * len(user_ids))
+            cursor.execute(
+                f"SELECT user_id, balance FROM wallets WHERE user_id IN ({placeholders}) ORDER BY user_id FOR UPDATE",
+                tuple(user_ids)
+            )
+            balances = {row['user_id']: Decimal(row['balance']) for row in cursor.fetchall()}
+            for uid, folded in WalletShards.fold(cursor, balances).items():
+                balances[uid] += folded
+
+            # Create missing wallets in one multi-row insert (the new rows stay locked until commit)
+            missing = [uid for uid in user_ids if uid not in balances]
+            if missing:
+                cursor.execute(
+                    "INSERT INTO wallets (user_id, balance, points) VALUES " + ', '.join(['(%s, 0.00, 0)'] * len(missing)),
+                    tuple(missing)
+                )
+                for uid in missing:
+                    balances[uid] = Decimal('0.00')
+
+            # Apply items in order against the locked balances
+            deltas = {}
+            pending = []
+            seen_keys = set()
+            for i, item, amount in valid:
+                key = item.get('idempotency_key')
+                if key and key in existing:
+                    results[i]['success'] = True
+                    results[i]['transaction'] = existing[key]
+                    results[i]['message'] = 'Duplicate idempotency key, existing transaction returned'
+                    continue
+                if key and key in seen_keys:
+                    results[i]['message'] = 'Duplicate idempotency key within batch'
+                    continue
+
+                sender_id = item['sender_id']
+                receiver_id = item['receiver_id']
+                if balances[sender_id] < amount:
+                    results[i]['message'] = 'Insufficient balance'
+                    continue
+
+                balances[sender_id] -= amount
+                balances[receiver_id] += amount
+                deltas[sender_id] = deltas.get(sender_id, Decimal('0')) - amount
+                deltas[receiver_id] = deltas.get(receiver_id, Decimal('0')) + amount
+                if key:
+                    seen_keys.add(key)
+                pending.append((i, (sender_id, amount, 'transfer', receiver_id,
+                                    item.get('description') or f"Transfer to user {receiver_id}", key, 'completed')))
+
+            if pending:
+                # Net balance change per wallet in one UPDATE
+                changed = [uid for uid in sorted(deltas) if deltas[uid] != 0]
+                if changed:
+                    case_sql = ' '.join(['WHEN %s THEN %s'] * len(changed))
+                    params = []
+                    for uid in changed:
+                        params.extend([uid, deltas[uid]])
+                    params.extend(changed)
+                    cursor.execute(
+                        f"UPDATE wallets SET balance = balance + CASE user_id {case_sql} END "
+                        f"WHERE user_id IN ({', '.join(['%s'] * len(changed))})",
+                        tuple(params)
+                    )
+
+                # A concurrent batch may have claimed one of our keys since the lookup; the whole batch then fails
+                _reserve_idempotency_keys(cursor, [row[5] for _, row in pending if row[5]])
+
+                # One multi-row INSERT for the whole ledger; the ids of its rows come from _multi_row_ids, which
+                # also holds when the session steps auto-increment ids (multi-primary / Galera)
+                cursor.execute(
+                    "INSERT INTO transactions (user_id, amount, type, receiver_id, description, idempotency_key, status) "
+                    "VALUES " + ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(pending)),
+                    tuple(value for _, row in pending for value in row)
+                )
+                ids = _multi_row_ids(cursor, cursor.lastrowid,
+                                     [{'user_id': row[0], 'type': row[2], 'idempotency_key': row[5]} for _, row in pending])
+                cursor.execute(
+                    f"SELECT * FROM transactions WHERE transaction_id IN ({', '.join(['%s'] * len(ids))})",
+                    tuple(ids)
+                )
+                rows = {row['transaction_id']: row for row in cursor.fetchall()}
+                for (i, _), transaction_id in zip(pending, ids):
+                    results[i]['success'] = True
+                    results[i]['transaction'] = rows[transaction_id]
+
+                _add_to_summary(cursor, [entry for _, row in pending for entry in _summary_entries(row[0], row[2], row[1], row[3])])
 
-            # Return the inserted transaction
-            return Transaction.get_by_id(transaction_id)
+            conn.commit()
+            if pending:
+                wallet_cache.delete(*deltas.keys())
+            return results
         except Exception:
             if conn:
                 conn.rollback()
@@ -98,6 +504,152 @@ class Transaction:
             if conn:
                 conn.close()
 
+    @staticmethod
+    def import_chunk(rows):
+        """Apply a chunk of validated bulk-import rows (deposits and payouts) in a single DB transaction.
+
+        Each row is a dict with user_id, amount (Decimal), type ('deposit' or 'withdraw') and optional
+        payment_method / description / idempotency_key. The chunk costs a constant number of statements: one
+        idempotency lookup, one locking read of the affected wallets, one multi-row INSERT each for missing
+        wallets and for the ledger (plus reading back the ledger ids, see _multi_row_ids), and one aggregated
+        UPDATE of the balances.
+        Returns one result dict per row, in input order: status ('created', 'duplicate' or 'failed'),
+        transaction_id and message.
+        """
+        results = [{'status': 'failed', 'transaction_id': None, 'message': None} for _ in rows]
+        if not rows:
+            return results
+
+        # A concurrent request may claim one of our idempotency keys between the lookup and our reservation; the
+        # reservation then fails with ER_DUP_ENTRY and the retry finds the key in the lookup instead
+        for attempt in range(3):
+            conn = None
+            cursor = None
+            try:
+                conn = get_db_connection()
+                cursor = conn.cursor(dictionary=True)
+                conn.start_transaction()
+
+                keys = [row['idempotency_key'] for row in rows if row.get('idempotency_key')]
+                existing = {}
+                if keys:
+                    placeholders = ', '.join(['%s'] * len(keys))
+                    cursor.execute(
+                        f"SELECT transaction_id, idempotency_key, status FROM transactions WHERE idempotency_key IN ({placeholders})",
+                        tuple(keys)
+                    )
+                    existing = {row['idempotency_key']: row for row in cursor.fetchall()}
+
+                # Lock every affected wallet in ascending user_id order (same order as transfer_batch)
+                user_ids = sorted({row['user_id'] for row in rows})
+                placeholders = ', '.join(['%s'] * len(user_ids))
+                cursor.execute(
+                    f"SELECT user_id, balance FROM wallets WHERE user_id IN ({placeholders}) ORDER BY user_id FOR UPDATE",
+                    tuple(user_ids)
+                )
+                balances = {row['user_id']: Decimal(row['balance']) for row in cursor.fetchall()}
+                for uid, folded in WalletShards.fold(cursor, balances).items():
+                    balances[uid] += folded
+
+                deltas = {}
+                new_wallets = []
+                pending = []
+                seen_keys = set()
+                for i, row in enumerate(rows):
+                    key = row.get('idempotency_key')
+                    if key and key in existing:
+                        if existing[key]['status'] == 'completed':
+                            results[i] = {'status': 'duplicate', 'transaction_id': existing[key]['transaction_id'],
+                                          'message': 'Duplicate idempotency key, existing transaction returned'}
+                        else:
+                            results[i] = {'status': 'failed', 'transaction_id': existing[key]['transaction_id'],
+                                          'message': 'Idempotency key already used by a transaction that is not completed'}
+                        continue
+                    if key and key in seen_keys:
+                        results[i] = {'status': 'failed', 'transaction_id': None, 'message': 'Duplicate idempotency key within import'}
+                        continue
+
+                    user_id = row['user_id']
+                    amount = row['amount']
+                    if row['type'] == 'withdraw':
+                        if user_id not in balances:
+                            results[i] = {'status': 'failed', 'transaction_id': None, 'message': 'Wallet not found'}
+                            continue
+                        if balances[user_id] < amount:
+                            results[i] = {'status': 'failed', 'transaction_id': None, 'message': 'Insufficient balance'}
+                            continue
+                        amount = -amount
+                    elif user_id not in balances:
+                        balances[user_id] = Decimal('0.00')
+                        new_wallets.append(user_id)
+
+                    balances[user_id] += amount
+                    deltas[user_id] = deltas.get(user_id, Decimal('0')) + amount
+                    if key:
+                        seen_keys.add(key)
+                    pending.append(i)
+
+                if pending:
+                    _reserve_idempotency_keys(cursor, [rows[i]['idempotency_key'] for i in pending if rows[i].get('idempotency_key')])
+
+                    # Ledger rows in one multi-row insert
+                    params = []
+                    for i in pending:
+                        row = rows[i]
+                        params.extend([row['user_id'], row['amount'], row['type'], row.get('payment_method'),
+                                       row.get('description'), row.get('idempotency_key'), 'completed'])
+                    cursor.execute(
+                        "INSERT INTO transactions (user_id, amount, type, payment_method, description, idempotency_key, status) VALUES "
+                        + ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(pending)),
+                        tuple(params)
+                    )
+                    ids = _multi_row_ids(cursor, cursor.lastrowid, [rows[i] for i in pending])
+
+                    if new_wallets:
+                        cursor.execute(
+                            "INSERT INTO wallets (user_id, balance, points) VALUES " + ', '.join(['(%s, 0.00, 0)'] * len(new_wallets)),
+                            tuple(new_wallets)
+                        )
+
+                    # Net balance change per wallet in one UPDATE
+                    changed = [uid for uid in sorted(deltas) if deltas[uid] != 0]
+                    if changed:
+                        case_sql = ' '.join(['WHEN %s THEN %s'] * len(changed))
+                        params = []
+                        for uid in changed:
+                            params.extend([uid, deltas[uid]])
+                        params.extend(changed)
+                        cursor.execute(
+                            f"UPDATE wallets SET balance = balance + CASE user_id {case_sql} END "
+                            f"WHERE user_id IN ({', '.join(['%s'] * len(changed))})",
+                            tuple(params)
+                        )
+
+                    _add_to_summary(cursor, [(rows[i]['user_id'], rows[i]['type'], rows[i]['amount']) for i in pending])
+
+                    for i, transaction_id in zip(pending, ids):
+                        results[i] = {'status': 'created', 'transaction_id': transaction_id, 'message': None}
+
+                conn.commit()
+                if pending:
+                    wallet_cache.delete(*deltas.keys())
+                return results
+            except IntegrityError as e:
+                if conn:
+                    conn.rollback()
+                if e.errno != errorcode.ER_DUP_ENTRY or attempt == 2:
+                    raise
+                # A concurrent first deposit may also have created one of new_wallets; both cases retry
+            except Exception:
+                if conn:
+                    conn.rollback()
+                raise
+            finally:
+                if cursor:
+                    cursor.close()
+                if conn:
+                    conn.close()
+
     @staticmethod
     def create_payment_request(amount, external_id=None, description=None, idempotency_key=None, qr_payload=None):
         """Create a pending payment request that can be confirmed later via webhook/callback."""
@@ -127,8 +679,13 @@ class Transaction:
             cursor = conn.cursor(dictionary=True)
             conn.start_transaction()
 
-            # Update transaction status
-            cursor.execute("UPDATE transactions SET status = 'completed' WHERE transaction_id = %s", (tx['transaction_id'],))
+            # Update transaction status. Only one confirmation flips it, so concurrent confirmations of the same
+            # payment credit the wallet once.
+            cursor.execute("UPDATE transactions SET status = 'completed' WHERE transaction_id = %s AND status = 'pending'",
+                           (tx['transaction_id'],))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                return tx['transaction_id']
 
             # If transaction has user_id, add amount to that wallet
             if tx.get('user_id'):
@@ -137,8 +694,13 @@ class Transaction:
                 if not wallet:
                     cursor.execute("INSERT INTO wallets (user_id, balance, points) VALUES (%s, 0.00, 0)", (tx['user_id'],))
                 cursor.execute("UPDATE wallets SET balance = balance + %s WHERE user_id = %s", (tx['amount'], tx['user_id']))
+                # Counted on the day the payment was created, like rebuild() counts it
+                _add_to_summary(cursor, _summary_entries(tx['user_id'], tx['type'], tx['amount'], tx.get('receiver_id')),
+                                day=tx['date'].date())
 
             conn.commit()
+            if tx.get('user_id'):
+                wallet_cache.delete(tx['user_id'])
             return tx['transaction_id']
         except Exception:
             if conn:
@@ -152,7 +714,8 @@ class Transaction:
 
     @staticmethod
     def deposit_atomic(user_id, amount, payment_method=None, description=None, idempotency_key=None):
-        """Perform deposit in a single DB transaction (create transaction + update wallet)."""
+        """Perform deposit in a single DB transaction (create transaction + update wallet).
+        Returns the deposit's ledger row (the original one for a replayed idempotency key)."""
         if amount <= 0:
             raise ValueError("Amount must be greater than zero")
 
@@ -163,32 +726,35 @@ class Transaction:
             cursor = conn.cursor(dictionary=True)
             conn.start_transaction()
 
-            # Idempotency check
-            if idempotency_key:
-                cursor.execute("SELECT transaction_id, status FROM transactions WHERE idempotency_key = %s", (idempotency_key,))
-                existing = cursor.fetchone()
-                if existing:
-                    # If exists and completed, return existing
-                    if existing.get('status') == 'completed':
-                        conn.commit()
-                        return existing['transaction_id']
-
-            # Ensure wallet exists
-            cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (user_id,))
-            wallet = cursor.fetchone()
-            if not wallet:
-                cursor.execute("INSERT INTO wallets (user_id, balance, points) VALUES (%s, 0.00, 0)", (user_id,))
-
-            # Insert transaction (as completed)
-            cursor.execute("INSERT INTO transactions (user_id, amount, type, payment_method, description, idempotency_key, status) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                           (user_id, amount, 'deposit', payment_method, description, idempotency_key, 'completed'))
-            transaction_id = cursor.lastrowid
-
-            # Update wallet balance
+            # Insert transaction (as completed); the unique idempotency key rejects replays atomically
+            transaction_id, existing = _insert_idempotent(cursor, {
+                'user_id': user_id, 'amount': amount, 'type': 'deposit', 'payment_method': payment_method,
+                'description': description, 'idempotency_key': idempotency_key, 'status': 'completed'
+            })
+            if existing:
+                conn.rollback()
+                # If exists and completed, return existing
+                if existing.get('status') == 'completed':
+                    return existing
+                raise Exception("Idempotency key already used by a transaction that is not completed")
+            transaction = _read_back(cursor, transaction_id)
+
+            # Update wallet balance; only a first deposit needs a second statement to create the wallet
             cursor.execute("UPDATE wallets SET balance = balance + %s WHERE user_id = %s", (amount, user_id))
+            if cursor.rowcount == 0:
+                try:
+                    cursor.execute("INSERT INTO wallets (user_id, balance, points) VALUES (%s, %s, 0)", (user_id, amount))
+                except IntegrityError as e:
+                    # A concurrent first deposit created the wallet in the meantime
+                    if e.errno != errorcode.ER_DUP_ENTRY:
+                        raise
+                    cursor.execute("UPDATE wallets SET balance = balance + %s WHERE user_id = %s", (amount, user_id))
+            # After the wallet row lock, like every other writer, so summary rows are always locked second
+            _add_to_summary(cursor, [(user_id, 'deposit', amount)])
 
             conn.commit()
-            return transaction_id
+            wallet_cache.delete(user_id)
+            return transaction
         except Exception:
             if conn:
                 conn.rollback()
@@ -201,7 +767,9 @@ class Transaction:
 
     @staticmethod
     def withdraw_atomic(user_id, amount, payment_method=None, description=None, idempotency_key=None):
-        """Perform withdraw in a single DB transaction (create transaction + update wallet)."""
+        """Perform withdraw in a single DB transaction (create transaction + conditional debit).
+        Returns the withdrawal's ledger row (the original one for a replayed idempotency key)."""
+        amount = _money(amount)
         if amount <= 0:
             raise ValueError("Amount must be greater than zero")
 
@@ -212,27 +780,25 @@ class Transaction:
             cursor = conn.cursor(dictionary=True)
             conn.start_transaction()
 
-            # Ensure wallet exists and lock
-            cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (user_id,))
-            wallet = cursor.fetchone()
-            if not wallet:
+            # Ledger row first, so the wallet row lock taken by the debit is held only until commit
+            transaction_id, existing = _insert_idempotent(cursor, {
+                'user_id': user_id, 'amount': amount, 'type': 'withdraw', 'payment_method': payment_method,
+                'description': description, 'idempotency_key': idempotency_key, 'status': 'completed'
+            })
+            if existing:
                 conn.rollback()
-                raise Exception("Wallet not found")
+                return existing
+            transaction = _read_back(cursor, transaction_id)
 
-            if float(wallet['balance']) < float(amount):
+            if not _debit(cursor, user_id, amount):
+                balance = _balance(cursor, user_id)
                 conn.rollback()
-                raise Exception("Insufficient balance")
-
-            # Insert transaction
-            cursor.execute("INSERT INTO transactions (user_id, amount, type, payment_method, description, idempotency_key, status) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                           (user_id, amount, 'withdraw', payment_method, description, idempotency_key, 'completed'))
-            transaction_id = cursor.lastrowid
-
-            # Update wallet balance
-            cursor.execute("UPDATE wallets SET balance = balance - %s WHERE user_id = %s", (amount, user_id))
+                raise Exception("Wallet not found" if balance is None else "Insufficient balance")
+            _add_to_summary(cursor, [(user_id, 'withdraw', amount)])
 
             conn.commit()
-            return transaction_id
+            wallet_cache.delete(user_id)
+            return transaction
         except Exception:
             if conn:
                 conn.rollback()
@@ -251,16 +817,20 @@ class Transaction:
         """
         return execute_query(query, (transaction_id,), fetch_one=True)
     
+    @staticmethod
+    def get_by_ids(transaction_ids):
+        """Get several transactions by ID in one query (order not preserved, missing IDs skipped)"""
+        if not transaction_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(transaction_ids))
+        query = f"SELECT * FROM transactions WHERE transaction_id IN ({placeholders})"
+        return execute_query(query, tuple(transaction_ids), fetch_all=True)
+    
     @staticmethod
     def get_by_user_id(user_id, limit=50, offset=0):
-        """Get transactions by user ID"""
-        query = """
-            SELECT * FROM transactions 
-            WHERE user_id = %s OR receiver_id = %s
-            ORDER BY date DESC
-            LIMIT %s OFFSET %s
-        """
-        return execute_query(query, (user_id, user_id, limit, offset), fetch_all=True)
+        """Get transactions by user ID (sent or received)"""
+        query, params = _history_query(user_id, limit, offset=offset)
+        return execute_query(query, params, fetch_all=True)
     
     @staticmethod
     def get_by_type(user_id, transaction_type, limit=50, offset=0):
@@ -273,6 +843,38 @@ class Transaction:
         """
         return execute_query(query, (user_id, transaction_type, limit, offset), fetch_all=True)
     
+    @staticmethod
+    def get_by_user_id_after(user_id, limit=50, after=None):
+        """Get a page of a user's transactions using keyset pagination.
+
+        `after` is the (date, transaction_id) of the last row of the previous page, or None for the first page.
+        Cost is independent of page depth, unlike OFFSET which scans and discards every earlier row.
+        """
+        query, params = _history_query(user_id, limit, after=after)
+        return execute_query(query, params, fetch_all=True)
+    
+    @staticmethod
+    def get_by_type_after(user_id, transaction_type, limit=50, after=None):
+        """Get a page of a user's transactions of one type using keyset pagination (see get_by_user_id_after)."""
+        if after:
+            query = """
+                SELECT * FROM transactions
+                WHERE user_id = %s AND type = %s
+                  AND (date < %s OR (date = %s AND transaction_id < %s))
+                ORDER BY date DESC, transaction_id DESC
+                LIMIT %s
+            """
+            params = (user_id, transaction_type, after[0], after[0], after[1], limit)
+        else:
+            query = """
+                SELECT * FROM transactions
+                WHERE user_id = %s AND type = %s
+                ORDER BY date DESC, transaction_id DESC
+                LIMIT %s
+            """
+            params = (user_id, transaction_type, limit)
+        return execute_query(query, params, fetch_all=True)
+    
     @staticmethod
     def get_all(limit=50, offset=0):
         """Get all transactions"""
@@ -284,12 +886,18 @@ class Transaction:
         return execute_query(query, (limit, offset), fetch_all=True)
     
     @staticmethod
-    def pay_atomic(user_id, amount, description=None, payment_method='food_delivery', idempotency_key=None):
+    def pay_atomic(user_id, amount, description=None, payment_method='food_delivery', idempotency_key=None, notify=False,
+                   nim=None):
         """
         Perform payment from external system (Food Delivery) in a single DB transaction.
-        Checks balance atomically and debits if sufficient.
-        Returns dict with: success (bool), transaction_id (int or None), balance_remaining (float or None), message (str)
+        Checks balance and debits in one conditional UPDATE (_debit), which also adds the reward points.
+        With notify=True the success/failure notification is appended to notification_outbox on the same
+        connection (in the payment's own transaction on success), to be delivered by the notification dispatcher.
+        With `nim` (a user_id resolved from a cached NIM) the debit only happens while the NIM still belongs to the
+        user; otherwise nothing is written and the result has nim_moved=True (see UserNim.pay).
+        Returns dict with: success (bool), transaction_id (int or None), balance_remaining (Decimal or None), message (str)
         """
+        amount = _money(amount)
         if amount <= 0:
             return {
                 'success': False,
@@ -305,48 +913,57 @@ class Transaction:
             cursor = conn.cursor(dictionary=True)
             conn.start_transaction()
             
-            # Lock wallet row for atomic balance check
-            cursor.execute("SELECT * FROM wallets WHERE user_id = %s FOR UPDATE", (user_id,))
-            wallet = cursor.fetchone()
-            
-            if not wallet:
+            # Create transaction record with status 'completed' before touching the wallet, so the wallet row
+            # lock taken by the debit is held for as few statements as possible. A replayed idempotency key
+            # returns the original payment without charging again.
+            transaction_id, existing = _insert_idempotent(cursor, {
+                'user_id': user_id, 'amount': amount, 'type': 'withdraw', 'payment_method': payment_method,
+                'description': description, 'idempotency_key': idempotency_key, 'status': 'completed'
+            })
+            if existing:
+                current_balance = _balance(cursor, existing['user_id'])
                 conn.rollback()
                 return {
-                    'success': False,
-                    'transaction_id': None,
-                    'balance_remaining': None,
-                    'message': 'Wallet not found'
+                    'success': True,
+                    'transaction_id': existing['transaction_id'],
+                    'balance_remaining': current_balance,
+                    'message': 'Duplicate idempotency key, existing transaction returned'
                 }
             
-            current_balance = float(wallet['balance'])
-            
-            # Check if balance is sufficient
-            if current_balance < float(amount):
+            # Debit and add reward points (1 point per Rp 10,000 spent) in one statement
+            points_earned = int(amount // 10000)
+            if not _debit(cursor, user_id, amount, points_earned, nim):
+                if nim is not None and not _owns_nim(cursor, user_id, nim):
+                    conn.rollback()
+                    return {
+                        'success': False,
+                        'transaction_id': None,
+                        'balance_remaining': None,
+                        'message': 'User not found',
+                        'nim_moved': True
+                    }
+                current_balance = _balance(cursor, user_id)
                 conn.rollback()
+                message = 'Wallet not found' if current_balance is None else 'Insufficient Balance'
+                if notify:
+                    NotificationOutbox.append(cursor, user_id, PAY_FAILED_MESSAGE.format(message=message))
+                    conn.commit()
                 return {
                     'success': False,
                     'transaction_id': None,
                     'balance_remaining': current_balance,
-                    'message': 'Insufficient Balance'
+                    'message': message
                 }
             
-            # Debit amount from wallet
-            new_balance = current_balance - float(amount)
-            cursor.execute("UPDATE wallets SET balance = %s WHERE user_id = %s", (new_balance, user_id))
+            new_balance = _balance(cursor, user_id)
+            _add_to_summary(cursor, [(user_id, 'withdraw', amount)])
             
-            # Calculate and add reward points (1 point per Rp 10,000 spent)
-            points_earned = int(float(amount) / 10000)
-            if points_earned > 0:
-                cursor.execute("UPDATE wallets SET points = points + %s WHERE user_id = %s", (points_earned, user_id))
-            
-            # Create transaction record with status 'completed'
-            cursor.execute("""
-                INSERT INTO transactions (user_id, amount, type, payment_method, description, idempotency_key, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (user_id, amount, 'withdraw', payment_method, description, idempotency_key, 'completed'))
-            transaction_id = cursor.lastrowid
+            # Notification commits (or rolls back) together with the payment
+            if notify:
+                NotificationOutbox.append(cursor, user_id, _pay_success_message(amount, points_earned, new_balance))
             
             conn.commit()
+            wallet_cache.delete(user_id)
             
             return {
                 'success': True,
@@ -357,11 +974,17 @@ class Transaction:
         except Exception as e:
             if conn:
                 conn.rollback()
+            message = f'Payment processing error: {str(e)}'
+            if notify:
+                try:
+                    NotificationOutbox.append_now(user_id, PAY_FAILED_MESSAGE.format(message=message))
+                except Exception:
+                    pass  # Notification failure shouldn't change the payment result
             return {
                 'success': False,
                 'transaction_id': None,
                 'balance_remaining': None,
-                'message': f'Payment processing error: {str(e)}'
+                'message': message
             }
         finally:
             if cursor:
@@ -369,3 +992,260 @@ class Transaction:
             if conn:
                 conn.close()
 
+
+class TransactionSummary:
+    """Per-user, per-day, per-type totals of completed transactions (transaction_daily_summary).
+
+    Maintained incrementally by every ledger write path through _add_to_summary, in the same DB transaction as
+    the ledger row. Types: deposit, withdraw, transfer_out, transfer_in.
+    """
+
+    GRANULARITIES = ('day', 'month', 'total')
+
+    @staticmethod
+    def get(user_id, date_from, date_to, granularity='day'):
+        """Totals per period and type between two dates (inclusive), oldest period first"""
+        if granularity not in TransactionSummary.GRANULARITIES:
+            raise ValueError(f"granularity must be one of: {', '.join(TransactionSummary.GRANULARITIES)}")
+        period = {
+            'day': "DATE_FORMAT(day, '%%Y-%%m-%%d')",
+            'month': "DATE_FORMAT(day, '%%Y-%%m')",
+            'total': "'total'"
+        }[granularity]
+        query = f"""
+            SELECT {period} AS period, type, SUM(tx_count) AS tx_count, SUM(total_amount) AS total_amount
+            FROM transaction_daily_summary
+            WHERE user_id = %s AND day BETWEEN %s AND %s
+            GROUP BY period, type
+            ORDER BY period, type
+        """
+        return execute_query(query, (user_id, date_from, date_to), fetch_all=True)
+
+    @staticmethod
+    def rebuild(batch_users=1000, progress=None):
+        """Recompute the summary table from transaction history, one user_id range per DB transaction.
+
+        Only days from the month of the oldest row still in transactions on are recomputed: whole months before
+        it may have been archived (archive.py), and their summary rows are the only totals left of them.
+        Safe to run while the service is live: each range is deleted and re-aggregated atomically, and writers
+        touching that range wait for it (or hit a deadlock, in which case the range is retried).
+        Returns the number of summary rows written.
+        """
+        bounds = execute_query("""
+            SELECT LEAST(COALESCE(MIN(user_id), 0), COALESCE(MIN(receiver_id), 0)) AS low,
+                   GREATEST(COALESCE(MAX(user_id), 0), COALESCE(MAX(receiver_id), 0)) AS high,
+                   MIN(date) AS first_date
+            FROM transactions
+        """, fetch_one=True)
+        if bounds['first_date'] is None:
+            return 0  # nothing left to recompute from
+        low, high = int(bounds['low'] or 0), int(bounds['high'] or 0)
+        since = bounds['first_date'].date().replace(day=1)
+        written = 0
+        # Summary rows of users with no history left since then are removed too
+        execute_query("DELETE FROM transaction_daily_summary WHERE (user_id < %s OR user_id > %s) AND day >= %s",
+                      (low, high, since))
+        for start in range(low, high + 1, batch_users):
+            end = min(start + batch_users - 1, high)
+            written += TransactionSummary._rebuild_range(start, end, since)
+            if progress:
+                progress(start, end, high)
+        return written
+
+    @staticmethod
+    def _rebuild_range(start, end, since, attempts=5):
+        for attempt in range(attempts):
+            conn = None
+            cursor = None
+            try:
+                conn = get_db_connection()
+                cursor = conn.cursor(dictionary=True)
+                conn.start_transaction()
+                cursor.execute("DELETE FROM transaction_daily_summary WHERE user_id BETWEEN %s AND %s AND day >= %s",
+                               (start, end, since))
+                cursor.execute("""
+                    INSERT INTO transaction_daily_summary (user_id, day, type, tx_count, total_amount)
+                    SELECT user_id, day, type, COUNT(*), SUM(amount) FROM (
+                        SELECT user_id, DATE(date) AS day,
+                               CASE type WHEN 'transfer' THEN 'transfer_out' ELSE type END AS type, amount
+                        FROM transactions
+                        WHERE user_id BETWEEN %s AND %s AND date >= %s AND status = 'completed'
+                        UNION ALL
+                        SELECT receiver_id, DATE(date), 'transfer_in', amount
+                        FROM transactions
+                        WHERE receiver_id BETWEEN %s AND %s AND date >= %s AND type = 'transfer' AND status = 'completed'
+                    ) ledger
+                    GROUP BY user_id, day, type
+                """, (start, end, since, start, end, since))
+                written = cursor.rowcount
+                conn.commit()
+                return written
+            except mysql.connector.Error as e:
+                if conn:
+                    conn.rollback()
+                if e.errno not in (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT) or attempt == attempts - 1:
+                    raise
+            finally:
+                if cursor:
+                    cursor.close()
+                if conn:
+                    conn.close()
+
+class WalletShards:
+    """Sub-balances of the hot wallets listed in SHARDED_WALLETS (wallet_balance_shards).
+
+    A sharded wallet's balance is wallets.balance plus the sum of its shard rows; readers (wallet-service
+    Wallet.get_by_user_id) add them up in the same statement. Credits only touch one random shard row and never
+    lock the wallets row. Debits need the exact total, so after locking the wallets row they fold every shard
+    into it (fold), which also serializes them against each other as before.
+    """
+
+    @staticmethod
+    def credit(cursor, user_id, amount):
+        """Add `amount` to a random shard of `user_id` inside the caller's transaction; returns the shard id"""
+        if user_id not in _sharded_wallet_rows:
+            # Readers start from the wallets row, so it must exist; only checked once per process
+            cursor.execute("SELECT wallet_id FROM wallets WHERE user_id = %s", (user_id,))
+            if cursor.fetchone() is None:
+                cursor.execute("INSERT IGNORE INTO wallets (user_id, balance, points) VALUES (%s, 0.00, 0)", (user_id,))
+            else:
+                _sharded_wallet_rows.add(user_id)
+        shard = random.randrange(SHARDED_WALLETS.get(user_id, 1))
+        cursor.execute(
+            "INSERT INTO wallet_balance_shards (user_id, shard_id, balance) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE balance = balance + VALUES(balance)",
+            (user_id, shard, amount)
+        )
+        return shard
+
+    @staticmethod
+    def fold(cursor, user_ids):
+        """Move the shard balances of the sharded wallets among `user_ids` into their wallets rows.
+
+        The caller must already hold the wallets row locks (wallets first, then shards, like every writer).
+        Returns {user_id: amount folded} for the wallets that had a non-zero shard balance.
+        """
+        sharded = sorted(uid for uid in user_ids if uid in SHARDED_WALLETS)
+        if not sharded:
+            return {}
+        return WalletShards._fold(cursor, sharded)
+
+    @staticmethod
+    def _fold(cursor, user_ids):
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        cursor.execute(
+            f"SELECT user_id, balance FROM wallet_balance_shards WHERE user_id IN ({placeholders}) "
+            f"ORDER BY user_id, shard_id FOR UPDATE",
+            tuple(user_ids)
+        )
+        folded = {}
+        for row in cursor.fetchall():
+            folded[row['user_id']] = folded.get(row['user_id'], Decimal('0')) + Decimal(row['balance'])
+        folded = {uid: amount for uid, amount in folded.items() if amount != 0}
+        for uid, amount in folded.items():
+            cursor.execute("UPDATE wallets SET balance = balance + %s WHERE user_id = %s", (amount, uid))
+            cursor.execute("UPDATE wallet_balance_shards SET balance = 0 WHERE user_id = %s", (uid,))
+        return folded
+
+    @staticmethod
+    def fold_all():
+        """Fold every wallet that still has shard balances, e.g. before removing it from SHARDED_WALLETS.
+        Returns the number of wallets folded."""
+        rows = execute_query(
+            "SELECT DISTINCT user_id FROM wallet_balance_shards WHERE balance <> 0 ORDER BY user_id", fetch_all=True
+        )
+        for row in rows:
+            conn = None
+            cursor = None
+            try:
+                conn = get_db_connection()
+                cursor = conn.cursor(dictionary=True)
+                conn.start_transaction()
+                cursor.execute("SELECT wallet_id FROM wallets WHERE user_id = %s FOR UPDATE", (row['user_id'],))
+                cursor.fetchone()
+                WalletShards._fold(cursor, [row['user_id']])
+                conn.commit()
+                wallet_cache.delete(row['user_id'])
+            except Exception:
+                if conn:
+                    conn.rollback()
+                raise
+            finally:
+                if cursor:
+                    cursor.close()
+                if conn:
+                    conn.close()
+        return len(rows)
+
+# Sharded wallets whose wallets row is known to exist (see WalletShards.credit)
+_sharded_wallet_rows = set()
+
+class UserNim:
+    """NIM -> user_id lookups for the Food Delivery Pay mutation.
+
+    Reads the user_nims table, which the user service keeps in sync on registration and profile updates, by
+    its unique index, and caches the owners found in nim_cache, so a checkout costs the same however many users
+    there are. The user service cannot invalidate this process's cache when a profile update moves a NIM, so pay()
+    has the payment's debit re-check the cached owner, and resolves again when it has changed.
+    Unknown NIMs are not cached, so a student can pay as soon as they are registered.
+    """
+
+    @staticmethod
+    def resolve(nim):
+        """user_id of the student with this NIM, or None"""
+        user_id = nim_cache.get(nim)
+        if user_id is not None:
+            return user_id
+        snapshot = nim_cache.snapshot()
+        row = execute_query("SELECT user_id FROM user_nims WHERE nim = %s", (nim,), fetch_one=True)
+        if row:
+            nim_cache.set(nim, row['user_id'], snapshot)
+            return row['user_id']
+        return None
+
+    @staticmethod
+    def pay(nim, amount, **kwargs):
+        """Transaction.pay_atomic for the student with this NIM (keyword arguments are passed on). Returns the
+        pay_atomic result, or None if no student has the NIM."""
+        for attempt in range(2):
+            user_id = UserNim.resolve(nim)
+            if user_id is None:
+                return None
+            result = Transaction.pay_atomic(user_id, amount, nim=nim, **kwargs)
+            if not result.get('nim_moved'):
+                return result
+            # The NIM changed owner since it was cached
+            nim_cache.delete(nim)
+        return result
+
+
+class NotificationOutbox:
+    """Transactional outbox for user notifications.
+
+    Writers append rows on their own connection, inside the DB transaction that produced the event, so a
+    notification exists if and only if the event committed. The notification dispatcher
+    (notification_dispatcher.py) later moves pending rows into the notifications table in batches and deletes
+    them from the outbox, so every row still in the outbox is pending.
+    """
+
+    @staticmethod
+    def append(cursor, user_id, message):
+        """Append a notification on an open cursor; it commits with the caller's transaction"""
+        cursor.execute("INSERT INTO notification_outbox (user_id, message) VALUES (%s, %s)", (user_id, message))
+        _dispatch_wakeup.set()
+
+    @staticmethod
+    def append_now(user_id, message):
+        """Append a notification in its own transaction"""
+        outbox_id = execute_query("INSERT INTO notification_outbox (user_id, message) VALUES (%s, %s)", (user_id, message))
+        _dispatch_wakeup.set()
+        return outbox_id
+
+    @staticmethod
+    def pending_count():
+        """Number of notifications not yet delivered"""
+        result = execute_query("SELECT COUNT(*) AS count FROM notification_outbox", fetch_one=True)
+        return result['count'] if result else 0
+
+# Set whenever this process appends to the outbox so an in-process dispatcher can skip its poll delay
+_dispatch_wakeup = threading.Event()
@@ -0,0 +1,126 @@
+"""
+Notification dispatcher
+Moves notifications from notification_outbox into the notifications table in batches.
+
+Runs as a background thread inside the transaction service (NOTIFICATION_DISPATCHER=thread, default), or as a
+separate process: `python notification_dispatcher.py` (then set NOTIFICATION_DISPATCHER=off for the service).
+Several dispatchers may run at once; SKIP LOCKED gives each a disjoint batch.
+"""
+import sys
+import os
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+from config import NOTIFICATION_BATCH_SIZE, NOTIFICATION_POLL_INTERVAL, NOTIFICATIONS_TABLE, NOTIFICATION_COUNTS_TABLE
+from database import get_db_connection
+from models import _dispatch_wakeup
+
+
+def dispatch_batch(batch_size=NOTIFICATION_BATCH_SIZE):
+    """Deliver up to batch_size pending notifications. Returns the number delivered.
+
+    The notifications INSERT, the unread counter increments and the outbox DELETE share one transaction, so a
+    crash at any point either delivers the whole batch or leaves it in the outbox for the next run.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
+
+        cursor.execute(
+            "SELECT outbox_id, user_id, message, created_at FROM notification_outbox "
+            "ORDER BY outbox_id LIMIT %s FOR UPDATE SKIP LOCKED",
+            (batch_size,)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            conn.commit()
+            return 0
+
+        params = []
+        for row in rows:
+            params.extend([row['user_id'], row['message'], row['created_at']])
+        cursor.execute(
+            f"INSERT INTO {NOTIFICATIONS_TABLE} (user_id, message, read_status, date) VALUES "
+            + ', '.join(['(%s, %s, FALSE, %s)'] * len(rows)),
+            tuple(params)
+        )
+
+        unread = {}
+        for row in rows:
+            unread[row['user_id']] = unread.get(row['user_id'], 0) + 1
+        # In user_id order, so concurrent dispatchers lock counters in the same order
+        counts = sorted(unread.items())
+        cursor.execute(
+            f"INSERT INTO {NOTIFICATION_COUNTS_TABLE} (user_id, unread) VALUES "
+            + ', '.join(['(%s, %s)'] * len(counts))
+            + " ON DUPLICATE KEY UPDATE unread = unread + VALUES(unread)",
+            tuple(value for pair in counts for value in pair)
+        )
+
+        ids = [row['outbox_id'] for row in rows]
+        cursor.execute(
+            f"DELETE FROM notification_outbox WHERE outbox_id IN ({', '.join(['%s'] * len(ids))})",
+            tuple(ids)
+        )
+
+        conn.commit()
+        return len(rows)
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+def run(stop_event, batch_size=NOTIFICATION_BATCH_SIZE, poll_interval=NOTIFICATION_POLL_INTERVAL):
+    """Drain the outbox until stop_event is set"""
+    while not stop_event.is_set():
+        try:
+            delivered = dispatch_batch(batch_size)
+        except Exception as e:
+            print(f"Notification dispatch error: {e}", file=sys.stderr)
+            # Back off a full interval: new notifications are no reason to retry a failing database sooner
+            stop_event.wait(poll_interval)
+            continue
+        if delivered < batch_size:
+            # Outbox drained: sleep until the next poll, or until this process appends a notification
+            _dispatch_wakeup.wait(poll_interval)
+            _dispatch_wakeup.clear()
+
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_dispatcher():
+    """Start the background dispatcher thread once per process"""
+    global _dispatcher, _dispatcher_pid
+    dispatcher = _dispatcher
+    if dispatcher is not None and _dispatcher_pid == os.getpid() and dispatcher.is_alive():
+        return dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None and _dispatcher_pid == os.getpid() and _dispatcher.is_alive():
+            return _dispatcher
+        stop_event = threading.Event()
+        _dispatcher = threading.Thread(target=run, args=(stop_event,), name='notification-dispatcher', daemon=True)
+        _dispatcher.stop_event = stop_event
+        _dispatcher_pid = os.getpid()
+        _dispatcher.start()
+        return _dispatcher
+
+
+if __name__ == '__main__':
+    print("Notification dispatcher running (Ctrl+C to stop)")
+    stop = threading.Event()
+    try:
+        run(stop)
+    except KeyboardInterrupt:
+        stop.set()
@@ -3,16 +3,18 @@ Transaction Service GraphQL Schema
 """
 import graphene
 from graphene import ObjectType, String, Decimal, Int, Field, List, Float
-from datetime import datetime
+from datetime import datetime, date
+import base64
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'wallet-service'))
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'user-service'))
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'notification-service'))
-from auth import verify_token, get_token_from_request
-from models import Transaction
+from auth import current_user, require_current_user
+from loaders import RowLoader, get_loader
+from models import Transaction, TransactionSummary, UserNim
+import archive
 
 # Import User model
 import importlib.util
@@ -22,13 +24,6 @@ user_models = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(user_models)
 User = user_models.User
 
-# Import Notification model
-notification_models_path = os.path.join(os.path.dirname(__file__), '..', 'notification-service', 'models.py')
-spec = importlib.util.spec_from_file_location("notification_models", notification_models_path)
-notification_models = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(notification_models)
-Notification = notification_models.Notification
-
 # Import Wallet - since both services share the same database
 # Load wallet-service models explicitly to avoid module name collisions with this service's own models.py
 import importlib.util
@@ -38,6 +33,33 @@ wallet_models = importlib.util.module_from_spec(spec)
 spec.loader.exec_module(wallet_models)
 Wallet = wallet_models.Wallet
 
+class UserLoader(RowLoader):
+    key_field = 'user_id'
+
+    def fetch_many(self, user_ids):
+        return User.get_by_ids(user_ids)
+
+class TransactionLoader(RowLoader):
+    key_field = 'transaction_id'
+
+    def fetch_many(self, transaction_ids):
+        return Transaction.get_by_ids(transaction_ids)
+
+class TransactionUserType(ObjectType):
+    """
+    Public profile of a transaction's sender or receiver.
+    """
+    user_id = Int(name='user_id')
+    name = String()
+    email = String()
+
+def _load_user(row, field):
+    """Resolve a user-id column of a transaction row through the request's UserLoader"""
+    user_id = row.get(field) if isinstance(row, dict) else getattr(row, field, None)
+    if user_id is None:
+        return None
+    return get_loader(UserLoader).load(user_id)
+
 class TransactionType(ObjectType):
     # Force snake_case field names to match frontend queries
     transaction_id = Int(name='transaction_id')
@@ -51,6 +73,9 @@ class TransactionType(ObjectType):
     receiver_id = Int(name='receiver_id')
     description = String()
     status = String()
+    # Related users, batched across all rows of the response (one users query per request level)
+    sender = Field(TransactionUserType)
+    receiver = Field(TransactionUserType)
 
     # Backwards-compatible snake_case field for clients requesting `transaction_id`
     transaction_id_snake = Int(name='transaction_id')
@@ -60,6 +85,12 @@ class TransactionType(ObjectType):
             return self.get('transaction_id')
         return getattr(self, 'transaction_id', None)
 
+    def resolve_sender(self, info):
+        return _load_user(self, 'user_id')
+
+    def resolve_receiver(self, info):
+        return _load_user(self, 'receiver_id')
+
     def resolve_transaction_type(self, info):
         # Support both dict (DB row) and object instances
         if isinstance(self, dict):
@@ -149,19 +180,106 @@ class PaymentResponse(ObjectType):
     balanceRemaining = Float()
     message = String()
 
+class TransactionConnection(graphene.relay.Connection):
+    """
+    Relay-style connection over transaction history, keyed on (date, transaction_id).
+    """
+    class Meta:
+        node = TransactionType
+
+def _encode_cursor(row):
+    """Encode the (date, transaction_id) keyset position of a row as an opaque cursor"""
+    date_val = row['date']
+    if hasattr(date_val, 'isoformat'):
+        date_val = date_val.isoformat(sep=' ')
+    return base64.urlsafe_b64encode(f"{date_val}|{row['transaction_id']}".encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor):
+    """Decode a cursor produced by _encode_cursor back into (date, transaction_id)"""
+    try:
+        date_val, transaction_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return date_val, int(transaction_id)
+    except Exception:
+        raise Exception("Invalid cursor")
+
+def _build_connection(rows, first):
+    """Build a TransactionConnection from a page fetched with limit first + 1"""
+    has_next_page = len(rows) > first
+    rows = rows[:first]
+    edges = [TransactionConnection.Edge(node=row, cursor=_encode_cursor(row)) for row in rows]
+    return TransactionConnection(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            has_next_page=has_next_page,
+            has_previous_page=False,
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None
+        )
+    )
+
+# Default and upper bound of `first` for the cursor-paginated history fields
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+class BatchTransferItemInput(graphene.InputObjectType):
+    receiver_id = Int(required=True, name='receiverId')
+    amount = Float(required=True)
+    description = String()
+    idempotency_key = String(name='idempotencyKey')
+
+class BatchTransferResultType(ObjectType):
+    index = Int()
+    success = graphene.Boolean()
+    message = String()
+    transaction = Field(TransactionType)
+
+class BatchTransferResponse(ObjectType):
+    """
+    Response type for batchTransfer: one result per input item, in input order.
+    """
+    results = List(BatchTransferResultType)
+    succeeded = Int()
+    failed = Int()
+
+class TransactionSummaryType(ObjectType):
+    """
+    Totals of one transaction type over one period (a day, a month, or the whole range for granularity total).
+    """
+    period = String()
+    transaction_type = String(name='type')
+    count = Int()
+    total = Float()
+
+    def resolve_transaction_type(self, info):
+        return self['type']
+
+    def resolve_count(self, info):
+        return int(self['tx_count'])
+
+    def resolve_total(self, info):
+        return float(self['total_amount'])
+
+def _parse_date(value, field):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise Exception(f"{field} must be a date (YYYY-MM-DD)")
+
 class Query(ObjectType):
     # Support both snake_case and camelCase for query name
     myTransactions = List(TransactionType, limit=Int(), offset=Int())
     transaction = Field(TransactionType, transaction_id=Int(required=True))
     transactions_by_type = List(TransactionType, transaction_type=String(required=True, name='type'), limit=Int(), offset=Int())
+    # Cursor-paginated variants of the history fields above: cost stays flat regardless of page depth
+    # includeArchived: once the table runs out, continue into the months archived by archive.py
+    myTransactionsConnection = Field(TransactionConnection, first=Int(), after=String(), include_archived=graphene.Boolean())
+    transactions_by_type_connection = Field(TransactionConnection, transaction_type=String(required=True, name='type'), first=Int(), after=String())
+    # Totals per period and type from the incrementally maintained summary table (defaults: this month, by day)
+    transaction_summary = List(TransactionSummaryType, date_from=String(name='from'), date_to=String(name='to'), granularity=String())
     
     def resolve_myTransactions(self, info, limit=50, offset=0):
         """Get current user's transactions"""
-        token = get_token_from_request()
-        if not token:
-            return []
-        
-        payload = verify_token(token)
+        payload = current_user()
         if not payload:
             return []
         
@@ -169,19 +287,56 @@ class Query(ObjectType):
     
     def resolve_transaction(self, info, transaction_id):
         """Get transaction by ID"""
-        return Transaction.get_by_id(transaction_id)
+        return get_loader(TransactionLoader).load(transaction_id)
     
     def resolve_transactions_by_type(self, info, transaction_type, limit=50, offset=0):
         """Get transactions by type"""
-        token = get_token_from_request()
-        if not token:
+        payload = current_user()
+        if not payload:
             return []
         
-        payload = verify_token(token)
+        return Transaction.get_by_type(payload['user_id'], transaction_type, limit, offset)
+    
+    def resolve_myTransactionsConnection(self, info, first=DEFAULT_PAGE_SIZE, after=None, include_archived=False):
+        """Get current user's transactions, cursor-paginated"""
+        payload = current_user()
+        if not payload:
+            return None
+        
+        # `first: null` reaches the resolver as None, not as the default
+        first = max(1, min(DEFAULT_PAGE_SIZE if first is None else first, MAX_PAGE_SIZE))
+        position = _decode_cursor(after) if after else None
+        rows = Transaction.get_by_user_id_after(payload['user_id'], first + 1, position)
+        if include_archived and len(rows) <= first:
+            # Every archived row is older than every row still in the table, so the page simply continues there
+            if rows:
+                position = (rows[-1]['date'], rows[-1]['transaction_id'])
+            rows += archive.read_history(payload['user_id'], first + 1 - len(rows), position)
+        return _build_connection(rows, first)
+    
+    def resolve_transactions_by_type_connection(self, info, transaction_type, first=DEFAULT_PAGE_SIZE, after=None):
+        """Get transactions by type, cursor-paginated"""
+        payload = current_user()
+        if not payload:
+            return None
+        
+        # `first: null` reaches the resolver as None, not as the default
+        first = max(1, min(DEFAULT_PAGE_SIZE if first is None else first, MAX_PAGE_SIZE))
+        rows = Transaction.get_by_type_after(payload['user_id'], transaction_type, first + 1, _decode_cursor(after) if after else None)
+        return _build_connection(rows, first)
+
+    def resolve_transaction_summary(self, info, date_from=None, date_to=None, granularity='day'):
+        """Get current user's totals per period and type"""
+        payload = current_user()
         if not payload:
             return []
         
-        return Transaction.get_by_type(payload['user_id'], transaction_type, limit, offset)
+        today = date.today()
+        date_to = _parse_date(date_to, 'to') if date_to else today
+        date_from = _parse_date(date_from, 'from') if date_from else today.replace(day=1)
+        if date_from > date_to:
+            raise Exception("from must not be after to")
+        return TransactionSummary.get(payload['user_id'], date_from, date_to, granularity)
 
 class Deposit(graphene.Mutation):
     class Arguments:
@@ -198,29 +353,18 @@ class Deposit(graphene.Mutation):
     def mutate(self, info, amount, payment_method=None, description=None, idempotency_key=None):
         """Create deposit transaction (atomic, idempotent)"""
         try:
-            token = get_token_from_request()
-            if not token:
-                raise Exception("Authentication required")
-            
-            payload = verify_token(token)
-            if not payload:
-                raise Exception("Invalid token")
+            payload = require_current_user()
             
             user_id = payload['user_id']
             # Validation
             if float(amount) <= 0:
                 raise Exception('Amount must be greater than zero')
             
-            transaction_id = Transaction.deposit_atomic(user_id, float(amount), payment_method=payment_method, description=description, idempotency_key=idempotency_key)
-            result = Transaction.get_by_id(transaction_id)
-            if not result:
-                raise Exception(f'Transaction {transaction_id} not found after creation')
-            return result
+            # The ledger row is read back on the deposit's own connection, so there is nothing to re-fetch
+            return Transaction.deposit_atomic(user_id, float(amount), payment_method=payment_method, description=description, idempotency_key=idempotency_key)
         except Exception as e:
             import traceback
             import sys
-            sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-            from database import get_db_connection
             # Log error for debugging
             print(f"Deposit mutation error: {str(e)}", file=sys.stderr)
             print(traceback.format_exc(), file=sys.stderr)
@@ -240,20 +384,13 @@ class Withdraw(graphene.Mutation):
     
     def mutate(self, info, amount, payment_method=None, description=None, idempotency_key=None):
         """Create withdrawal transaction (atomic)"""
-        token = get_token_from_request()
-        if not token:
-            raise Exception("Authentication required")
-        
-        payload = verify_token(token)
-        if not payload:
-            raise Exception("Invalid token")
+        payload = require_current_user()
         
         user_id = payload['user_id']
         if float(amount) <= 0:
             raise Exception('Amount must be greater than zero')
         
-        transaction_id = Transaction.withdraw_atomic(user_id, float(amount), payment_method=payment_method, description=description, idempotency_key=idempotency_key)
-        return Transaction.get_by_id(transaction_id)
+        return Transaction.withdraw_atomic(user_id, float(amount), payment_method=payment_method, description=description, idempotency_key=idempotency_key)
 
 class Transfer(graphene.Mutation):
     class Arguments:
@@ -268,13 +405,7 @@ class Transfer(graphene.Mutation):
     
     def mutate(self, info, receiver_id, amount, description=None, idempotency_key=None):
         """Create transfer transaction (atomic)"""
-        token = get_token_from_request()
-        if not token:
-            raise Exception("Authentication required")
-        
-        payload = verify_token(token)
-        if not payload:
-            raise Exception("Invalid token")
+        payload = require_current_user()
         
         user_id = payload['user_id']
         if user_id == receiver_id:
@@ -284,15 +415,49 @@ class Transfer(graphene.Mutation):
             raise Exception('Amount must be greater than zero')
         
         try:
-            result = Transaction.transfer_atomic(user_id, receiver_id, float(amount), description=description or f"Transfer to user {receiver_id}", idempotency_key=idempotency_key)
-            # transfer_atomic may return either a transaction id or a dict result
-            if isinstance(result, dict):
-                return result
-            return Transaction.get_by_id(result)
+            return Transaction.transfer_atomic(user_id, receiver_id, float(amount), description=description or f"Transfer to user {receiver_id}", idempotency_key=idempotency_key)
         except Exception as e:
             # Bubble up a clear error message
             raise Exception(str(e))
 
+class BatchTransfer(graphene.Mutation):
+    """
+    Apply many transfers from the current user in one DB transaction (e.g. payroll fan-out).
+    Items that fail validation or run out of balance are reported individually; the rest are applied.
+    """
+    class Arguments:
+        transfers = List(BatchTransferItemInput, required=True)
+    
+    Output = BatchTransferResponse
+    
+    def mutate(self, info, transfers):
+        """Create transfer transactions in a single batch (atomic)"""
+        payload = require_current_user()
+        
+        user_id = payload['user_id']
+        items = [
+            {
+                'sender_id': user_id,
+                'receiver_id': item.receiver_id,
+                'amount': item.amount,
+                'description': item.description,
+                'idempotency_key': item.idempotency_key
+            }
+            for item in transfers
+        ]
+        
+        try:
+            results = Transaction.transfer_batch(items)
+        except Exception as e:
+            raise Exception(str(e))
+        
+        succeeded = sum(1 for r in results if r['success'])
+        return BatchTransferResponse(
+            results=[BatchTransferResultType(**r) for r in results],
+            succeeded=succeeded,
+            failed=len(results) - succeeded
+        )
+
 class Pay(graphene.Mutation):
     """
     Mutasi untuk memproses pembayaran pesanan dari sistem eksternal (Food Delivery).
@@ -315,49 +480,34 @@ class Pay(graphene.Mutation):
                 message="Amount must be greater than zero"
             )
         
-        # Look up user by email (assuming NIM is stored as email or email contains NIM)
-        # Try direct email match first, then try email containing NIM
-        user = User.get_by_email(nim)
-        if not user:
-            # Try to find user where email starts with NIM (e.g., NIM@university.edu)
-            from database import execute_query
-            query = "SELECT * FROM users WHERE email LIKE %s"
-            users = execute_query(query, (f"{nim}%",), fetch_all=True)
-            if users:
-                user = users[0]
+        # NIM -> user_id through the indexed user_nims mapping (cached, see UserNim.pay). A full student email
+        # (NIM@university.edu) is still accepted and matched exactly on the unique email index.
+        nim = nim.strip()
+        # The success / failure notification is written to the outbox by pay_atomic itself, atomically with the
+        # payment, and delivered asynchronously by the notification dispatcher
+        payment = dict(
+            amount=amount,
+            description=f"Payment from Food Delivery System for NIM: {nim}",
+            payment_method='food_delivery',
+            notify=True
+        )
+        
+        # Perform atomic payment (check balance and debit)
+        try:
+            if '@' in nim:
+                user = User.get_by_email(nim)
+                result = Transaction.pay_atomic(user_id=user['user_id'], **payment) if user else None
             else:
+                result = UserNim.pay(nim, **payment)
+            if result is None:
                 return PaymentResponse(
                     status="FAILED",
                     trxId=None,
                     balanceRemaining=None,
                     message="User not found"
                 )
-        
-        user_id = user['user_id']
-        
-        # Perform atomic payment (check balance and debit)
-        try:
-            result = Transaction.pay_atomic(
-                user_id=user_id,
-                amount=float(amount),
-                description=f"Payment from Food Delivery System for NIM: {nim}",
-                payment_method='food_delivery'
-            )
             
             if result['success']:
-                # Calculate points earned (1 point per Rp 10,000)
-                points_earned = int(float(amount) / 10000)
-                
-                # Send success notification with points info
-                try:
-                    points_msg = f" dan mendapatkan {points_earned} poin reward!" if points_earned > 0 else "!"
-                    Notification.create(
-                        user_id=user_id,
-                        message=f"Pembayaran berhasil: Rp {amount:,.2f} untuk pesanan Food Delivery{points_msg} Saldo tersisa: Rp {result['balance_remaining']:,.2f}"
-                    )
-                except Exception:
-                    pass  # Notification failure shouldn't break payment
-                
                 return PaymentResponse(
                     status="SUCCESS",
                     trxId=str(result['transaction_id']),
@@ -365,15 +515,6 @@ class Pay(graphene.Mutation):
                     message=None
                 )
             else:
-                # Send failure notification
-                try:
-                    Notification.create(
-                        user_id=user_id,
-                        message=f"Pembayaran gagal: {result['message']}"
-                    )
-                except Exception:
-                    pass
-                
                 return PaymentResponse(
                     status="FAILED",
                     trxId=None,
@@ -392,6 +533,7 @@ class Mutation(ObjectType):
     deposit = Deposit.Field()
     withdraw = Withdraw.Field()
     transfer = Transfer.Field()
+    batch_transfer = BatchTransfer.Field()
     pay = Pay.Field()
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
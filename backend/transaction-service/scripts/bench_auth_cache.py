@@ -0,0 +1,57 @@
+"""Microbenchmark: per-resolver auth overhead with and without the token verification cache
+No services or database needed; runs against a throwaway Flask app.
+
+Each simulated GraphQL request runs RESOLVERS resolvers that each need the current user:
+- uncached: every resolver parses the Authorization header and does a full jwt.decode (the old path)
+- cached:   every resolver calls auth.current_user() (per-request memo + process-wide verified-token cache)
+
+Usage: python bench_auth_cache.py
+"""
+import os
+import sys
+import time
+
+import jwt
+from flask import Flask
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+from config import JWT_SECRET, JWT_ALGORITHM
+from auth import generate_token, get_token_from_request, current_user
+
+REQUESTS = int(os.getenv('REQUESTS', 20000))
+RESOLVERS = int(os.getenv('RESOLVERS', 4))
+
+app = Flask(__name__)
+token = generate_token(1, 'bench@example.com')
+headers = {'Authorization': f'Bearer {token}'}
+
+
+def uncached_resolver():
+    raw = get_token_from_request()
+    return jwt.decode(raw, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+
+
+def run(resolver):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        with app.test_request_context('/graphql', method='POST', headers=headers):
+            for _ in range(RESOLVERS):
+                assert resolver()['user_id'] == 1
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    # Baseline: cost of the request context alone, subtracted from both runs
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        with app.test_request_context('/graphql', method='POST', headers=headers):
+            pass
+    baseline = time.perf_counter() - start
+
+    uncached = run(uncached_resolver) - baseline
+    cached = run(current_user) - baseline
+
+    print(f'{REQUESTS} requests x {RESOLVERS} authenticated resolvers')
+    print(f'  uncached: {uncached / REQUESTS * 1e6:8.1f} us auth overhead per request')
+    print(f'  cached:   {cached / REQUESTS * 1e6:8.1f} us auth overhead per request')
+    print(f'  speedup:  {uncached / cached if cached > 0 else float("inf"):8.1f}x')
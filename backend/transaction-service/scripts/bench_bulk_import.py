@@ -0,0 +1,57 @@
+"""Load test: bulk import of deposits through POST /imports/transactions
+Assumptions:
+- transaction-service is running at TX_SVC (default http://localhost:5003)
+- X-API-KEY is taken from TRANSACTION_API_KEY if the service requires one
+
+The CSV is generated on the fly and uploaded with chunked transfer encoding, so neither side holds the whole
+file. Rows are spread over IMPORT_USERS wallets starting at FIRST_USER and carry unique idempotency keys.
+
+Usage: python bench_bulk_import.py   (tune with ROWS, IMPORT_USERS, FIRST_USER env vars)
+"""
+import json
+import os
+import time
+import uuid
+import requests
+
+TX_SVC = os.getenv('TX_SVC', 'http://localhost:5003')
+ROWS = int(os.getenv('ROWS', 100000))
+IMPORT_USERS = int(os.getenv('IMPORT_USERS', 1000))
+FIRST_USER = int(os.getenv('FIRST_USER', 99000))
+API_KEY = os.getenv('TRANSACTION_API_KEY')
+
+
+def generate_csv(run_id):
+    yield b'user_id,amount,type,payment_method,idempotency_key\n'
+    batch = []
+    for i in range(ROWS):
+        batch.append(f'{FIRST_USER + i % IMPORT_USERS},{1 + i % 100}.00,deposit,bulk_bench,bench-{run_id}-{i}\n')
+        if len(batch) == 1000:
+            yield ''.join(batch).encode('utf-8')
+            batch = []
+    if batch:
+        yield ''.join(batch).encode('utf-8')
+
+
+if __name__ == '__main__':
+    headers = {'Content-Type': 'text/csv'}
+    if API_KEY:
+        headers['X-API-KEY'] = API_KEY
+
+    start = time.perf_counter()
+    first_result_at = None
+    summary = None
+    with requests.post(f'{TX_SVC}/imports/transactions', data=generate_csv(uuid.uuid4().hex[:8]),
+                       headers=headers, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if first_result_at is None:
+                first_result_at = time.perf_counter() - start
+            entry = json.loads(line)
+            if 'summary' in entry:
+                summary = entry['summary']
+    elapsed = time.perf_counter() - start
+
+    print(f'{ROWS} rows over {IMPORT_USERS} wallets in {elapsed:.1f}s ({ROWS / elapsed:,.0f} rows/s)')
+    print(f'  first report line after {first_result_at:.2f}s')
+    print(f'  summary: {summary}')
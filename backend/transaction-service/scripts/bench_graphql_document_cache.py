@@ -0,0 +1,65 @@
+"""Microbenchmark: per-request CPU of the deposit mutation with and without the parsed-document cache
+No services or database needed; requests go through Flask's test client.
+
+The mutation is sent without a token, so the resolver stops at require_current_user() before touching the
+database: what remains is the per-request framework work (body parsing, GraphQL parse + validate, execution,
+serialization) that the cache targets. The resolver's error logging is silenced but still costs the same in
+every variant.
+- plain:     flask_graphql.GraphQLView (parse + validate on every request, the old path)
+- cached:    CachedGraphQLView with the full query text (document LRU hit)
+- persisted: CachedGraphQLView with only the sha256 (Automatic Persisted Query)
+
+Usage: python bench_graphql_document_cache.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+from flask import Flask
+from flask_graphql import GraphQLView
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+from graphql_view import CachedGraphQLView, query_hash
+from schema import schema
+
+REQUESTS = int(os.getenv('REQUESTS', 2000))
+
+DEPOSIT = """
+mutation Deposit($amount: Float!, $paymentMethod: String, $description: String, $idempotencyKey: String) {
+  deposit(amount: $amount, paymentMethod: $paymentMethod, description: $description, idempotencyKey: $idempotencyKey) {
+    transaction_id user_id amount type payment_method date description status
+  }
+}
+"""
+VARIABLES = {'amount': 10000.0, 'paymentMethod': 'bank_transfer', 'description': 'bench', 'idempotencyKey': 'bench'}
+PERSISTED = {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(DEPOSIT)}}
+
+app = Flask(__name__)
+app.add_url_rule('/plain', view_func=GraphQLView.as_view('plain', schema=schema))
+app.add_url_rule('/cached', view_func=CachedGraphQLView.as_view('cached', schema=schema))
+client = app.test_client()
+
+
+def run(path, body):
+    with contextlib.redirect_stderr(io.StringIO()):
+        # Warm-up (also registers the persisted query)
+        client.post(path, json={'query': DEPOSIT, 'variables': VARIABLES, 'extensions': PERSISTED})
+        start = time.process_time()
+        for _ in range(REQUESTS):
+            response = client.post(path, json=body)
+            assert response.status_code == 200 and b'Authentication required' in response.data, response.data
+        return (time.process_time() - start) / REQUESTS
+
+
+if __name__ == '__main__':
+    plain = run('/plain', {'query': DEPOSIT, 'variables': VARIABLES})
+    cached = run('/cached', {'query': DEPOSIT, 'variables': VARIABLES})
+    persisted = run('/cached', {'variables': VARIABLES, 'extensions': PERSISTED})
+
+    print(f'{REQUESTS} deposit mutations, CPU time per request')
+    print(f'  plain:     {plain * 1e6:8.1f} us')
+    print(f'  cached:    {cached * 1e6:8.1f} us  ({plain / cached:.1f}x)')
+    print(f'  persisted: {persisted * 1e6:8.1f} us  ({plain / persisted:.1f}x)')
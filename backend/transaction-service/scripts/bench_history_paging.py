@@ -0,0 +1,84 @@
+"""Benchmark: OFFSET vs keyset (cursor) pagination of transaction history
+Assumptions:
+- MySQL is reachable with the settings from the shared .env (DB_HOST, DB_USER, ...)
+- The transactions table has the idx_user_date / idx_user_type_date indexes from 04_schema_transaction.sql
+
+Seeds PAGE_SIZE * PAGES rows for a dedicated benchmark user, then times fetching page 1 and page PAGES
+with both strategies. Offset latency grows with page depth; keyset latency should stay flat.
+
+Usage: python bench_history_paging.py
+"""
+import os
+import sys
+import time
+import statistics
+import importlib.util
+
+BENCH_USER = int(os.getenv('BENCH_USER', 99900))
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+PAGES = int(os.getenv('PAGES', 500))
+REPEAT = int(os.getenv('REPEAT', 20))
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(base_dir, '..', 'shared'))
+spec = importlib.util.spec_from_file_location('tx_models', os.path.join(base_dir, 'models.py'))
+tx_models = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tx_models)
+Transaction = tx_models.Transaction
+
+from database import execute_query, get_db_connection
+
+
+def seed(total):
+    """Insert `total` deposits for the benchmark user, spread over distinct timestamps"""
+    execute_query("DELETE FROM transactions WHERE user_id = %s", (BENCH_USER,))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        batch = []
+        for i in range(total):
+            batch.append((BENCH_USER, 1.00, 'deposit', 'bench', i))
+            if len(batch) == 1000:
+                cursor.executemany("INSERT INTO transactions (user_id, amount, type, payment_method, date) VALUES (%s, %s, %s, %s, NOW() - INTERVAL %s SECOND)", batch)
+                batch = []
+        if batch:
+            cursor.executemany("INSERT INTO transactions (user_id, amount, type, payment_method, date) VALUES (%s, %s, %s, %s, NOW() - INTERVAL %s SECOND)", batch)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def timed(fn):
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+if __name__ == '__main__':
+    print(f'Seeding {PAGE_SIZE * PAGES} rows for user {BENCH_USER}...')
+    seed(PAGE_SIZE * PAGES)
+
+    # Keyset position of the last row before page PAGES, i.e. the cursor a client would hold after paging there
+    last_offset = PAGE_SIZE * (PAGES - 1)
+    anchor = execute_query(
+        "SELECT date, transaction_id FROM transactions WHERE user_id = %s ORDER BY date DESC, transaction_id DESC LIMIT 1 OFFSET %s",
+        (BENCH_USER, last_offset - 1), fetch_one=True
+    )
+    after = (anchor['date'], anchor['transaction_id'])
+
+    results = {
+        'offset page 1': timed(lambda: Transaction.get_by_type(BENCH_USER, 'deposit', PAGE_SIZE, 0)),
+        f'offset page {PAGES}': timed(lambda: Transaction.get_by_type(BENCH_USER, 'deposit', PAGE_SIZE, last_offset)),
+        'keyset page 1': timed(lambda: Transaction.get_by_type_after(BENCH_USER, 'deposit', PAGE_SIZE + 1)),
+        f'keyset page {PAGES}': timed(lambda: Transaction.get_by_type_after(BENCH_USER, 'deposit', PAGE_SIZE + 1, after)),
+    }
+
+    print(f'\nMedian latency over {REPEAT} runs (page size {PAGE_SIZE}):')
+    for name, ms in results.items():
+        print(f'  {name:<20} {ms:8.2f} ms')
+
+    execute_query("DELETE FROM transactions WHERE user_id = %s", (BENCH_USER,))
@@ -0,0 +1,108 @@
+"""Contention benchmark: Food Delivery charges per second to a single merchant, by balance shard count
+Assumptions:
+- MySQL is reachable with the settings from the shared .env (DB_HOST, DB_USER, ...)
+- wallet_balance_shards exists (03_schema_wallet.sql) and the pool is large enough for CONCURRENCY
+  (e.g. DB_POOL_SIZE=32)
+
+Runs the merchant charge path (Transaction.transfer_atomic from PAYERS distinct payers to MERCHANT) with
+CONCURRENCY threads for DURATION seconds per configuration. Shard count 0 is the unsharded baseline that locks the
+merchant's wallets row on every charge; other counts put the merchant in SHARDED_WALLETS with that many shards.
+After each run the merchant's total (wallet row + shards) is checked against the charges that succeeded.
+
+Usage: python bench_hot_merchant.py   (tune with SHARD_COUNTS, CONCURRENCY, DURATION, PAYERS env vars)
+"""
+import os
+import sys
+import time
+import threading
+import importlib.util
+from decimal import Decimal
+
+MERCHANT = int(os.getenv('MERCHANT', 99700))
+PAYERS = int(os.getenv('PAYERS', 64))
+SHARD_COUNTS = [int(n) for n in os.getenv('SHARD_COUNTS', '0,1,4,16,32').split(',')]
+CONCURRENCY = int(os.getenv('CONCURRENCY', 32))
+DURATION = float(os.getenv('DURATION', 10))
+CHARGE = 1.0
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(base_dir, '..', 'shared'))
+spec = importlib.util.spec_from_file_location('tx_models', os.path.join(base_dir, 'models.py'))
+tx_models = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tx_models)
+Transaction = tx_models.Transaction
+
+from database import execute_query
+
+PAYER_IDS = [MERCHANT + 1 + i for i in range(PAYERS)]
+
+
+def cleanup():
+    placeholders = ', '.join(['%s'] * (PAYERS + 1))
+    ids = tuple([MERCHANT] + PAYER_IDS)
+    execute_query(f"DELETE FROM transactions WHERE user_id IN ({placeholders}) OR receiver_id IN ({placeholders})", ids + ids)
+    execute_query(f"DELETE FROM wallets WHERE user_id IN ({placeholders})", ids)
+    execute_query(f"DELETE FROM transaction_daily_summary WHERE user_id IN ({placeholders})", ids)
+    execute_query("DELETE FROM wallet_balance_shards WHERE user_id = %s", (MERCHANT,))
+
+
+def merchant_total():
+    row = execute_query("""
+        SELECT balance + COALESCE((SELECT SUM(balance) FROM wallet_balance_shards WHERE user_id = %s), 0) AS total
+        FROM wallets WHERE user_id = %s
+    """, (MERCHANT, MERCHANT), fetch_one=True)
+    return Decimal(row['total']) if row else Decimal('0')
+
+
+def worker(index, deadline, latencies, errors):
+    payer = PAYER_IDS[index % PAYERS]
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            Transaction.transfer_atomic(payer, MERCHANT, CHARGE, description='bench charge')
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors.append(1)
+
+
+def run(shards):
+    tx_models.SHARDED_WALLETS.clear()
+    if shards:
+        tx_models.SHARDED_WALLETS[MERCHANT] = shards
+    before = merchant_total()
+    latencies, errors = [], []
+    deadline = time.perf_counter() + DURATION
+    threads = [threading.Thread(target=worker, args=(i, deadline, latencies, errors)) for i in range(CONCURRENCY)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    consistent = merchant_total() - before == Decimal(str(CHARGE)) * len(latencies)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000 if latencies else 0
+    label = f'{shards} shards' if shards else 'unsharded'
+    print(f'{label:<12} {len(latencies) / elapsed:>9.1f} charges/s   p50 {p50:6.1f} ms   p99 {p99:7.1f} ms   '
+          f'errors {len(errors)}   total {"ok" if consistent else "MISMATCH"}')
+
+
+if __name__ == '__main__':
+    cleanup()
+    for payer in PAYER_IDS:
+        Transaction.deposit_atomic(payer, 1_000_000.0, payment_method='bench')
+    Transaction.deposit_atomic(MERCHANT, 1.0, payment_method='bench')  # create the merchant wallet row
+
+    print(f'{CONCURRENCY} threads charging merchant {MERCHANT} from {PAYERS} payers, {DURATION:g}s per run')
+    try:
+        for shards in SHARD_COUNTS:
+            run(shards)
+        # A debit folds every shard back into the wallet row
+        tx_models.SHARDED_WALLETS[MERCHANT] = max(SHARD_COUNTS) or 1
+        total = merchant_total()
+        Transaction.withdraw_atomic(MERCHANT, float(total), payment_method='bench')
+        print(f'merchant withdrew its full total {total}: remaining {merchant_total()}')
+    finally:
+        cleanup()
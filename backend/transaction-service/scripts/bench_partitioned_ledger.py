@@ -0,0 +1,170 @@
+"""Benchmark: insert and history latency as the ledger grows (e.g. 1M vs 50M rows)
+Assumptions:
+- MySQL is reachable with the settings from the shared .env (DB_HOST, DB_USER, ...), on a scratch database:
+  the benchmark adds up to max(SIZES) rows and only removes them again with CLEANUP=1
+- The transactions table has the layout of 04_schema_transaction.sql. Run once on the monthly partitioned table
+  and once on an unpartitioned copy (database/schema.sql) to compare; the layout is printed with the results.
+
+Grows the table to each size in SIZES with rows for BENCH_USERS synthetic users spread evenly over the last
+MONTHS months (multi-row INSERTs of 1000 rows), with HISTORY_ROWS of them belonging to BENCH_USER. At each size
+it times INSERTS single-row ledger inserts (Transaction.create, landing in the current month) and REPEAT reads of
+BENCH_USER's first history page and of a page 30 days back (Transaction.get_by_user_id_after), and prints how
+many partitions the history query reads.
+
+Usage: python bench_partitioned_ledger.py   (tune with SIZES, MONTHS, BENCH_USERS, HISTORY_ROWS, INSERTS, REPEAT)
+"""
+import os
+import sys
+import time
+import statistics
+import importlib.util
+
+SIZES = [int(size) for size in os.getenv('SIZES', '1000000,50000000').split(',')]
+MONTHS = int(os.getenv('MONTHS', 24))
+FIRST_USER = int(os.getenv('FIRST_USER', 5000000))
+BENCH_USERS = int(os.getenv('BENCH_USERS', 100000))
+BENCH_USER = FIRST_USER
+HISTORY_ROWS = int(os.getenv('HISTORY_ROWS', 5000))
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+INSERTS = int(os.getenv('INSERTS', 2000))
+REPEAT = int(os.getenv('REPEAT', 50))
+CLEANUP = os.getenv('CLEANUP') == '1'
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(base_dir, '..', 'shared'))
+spec = importlib.util.spec_from_file_location('tx_models', os.path.join(base_dir, 'models.py'))
+tx_models = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(tx_models)
+Transaction = tx_models.Transaction
+
+from database import execute_query, get_db_connection
+
+SPAN_SECONDS = MONTHS * 30 * 86400
+BATCH = 1000
+
+
+def table_rows():
+    return execute_query("SELECT COUNT(*) AS n FROM transactions", fetch_one=True)['n']
+
+
+def layout():
+    row = execute_query("""
+        SELECT COUNT(*) AS partitions FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions' AND PARTITION_NAME IS NOT NULL
+    """, fetch_one=True)
+    return f"partitioned ({row['partitions']} partitions)" if row['partitions'] else 'unpartitioned'
+
+
+def grow(current, target):
+    """Insert target - current rows, spread evenly over the last MONTHS months"""
+    missing = target - current
+    # Every (missing / HISTORY_ROWS)-th row belongs to the history user, so its rows span the whole period too
+    history_every = max(missing // max(HISTORY_ROWS, 1), 1)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        batch = []
+        for i in range(missing):
+            user_id = BENCH_USER if i % history_every == 0 else FIRST_USER + 1 + i % (BENCH_USERS - 1)
+            age = SPAN_SECONDS - (i * SPAN_SECONDS) // missing
+            batch.extend((user_id, 1.00, 'deposit', 'bench', age))
+            if len(batch) == BATCH * 5:  # 5 parameters per row
+                _insert(cursor, batch)
+                batch = []
+                conn.commit()
+                if (i + 1) % 1000000 < BATCH:
+                    print(f'  {current + i + 1:,} rows ({time.perf_counter() - started:.0f}s)')
+        if batch:
+            _insert(cursor, batch)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _insert(cursor, params):
+    cursor.execute(
+        "INSERT INTO transactions (user_id, amount, type, payment_method, date) VALUES "
+        + ', '.join(['(%s, %s, %s, %s, NOW() - INTERVAL %s SECOND)'] * (len(params) // 5)),
+        tuple(params)
+    )
+
+
+def percentile(sorted_values, q):
+    return sorted_values[max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values))) - 1))]
+
+
+def time_inserts():
+    samples = []
+    for _ in range(INSERTS):
+        start = time.perf_counter()
+        Transaction.create(BENCH_USER, 1.00, 'deposit', payment_method='bench')
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return percentile(samples, 0.50), percentile(samples, 0.99)
+
+
+def time_history(after):
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        Transaction.get_by_user_id_after(BENCH_USER, PAGE_SIZE + 1, after)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def history_partitions(after):
+    """Partitions read by the history query (EXPLAIN's `partitions` column), or '-' without partitioning"""
+    query, params = tx_models._history_query(BENCH_USER, PAGE_SIZE + 1, after=after)
+    rows = execute_query("EXPLAIN " + query, params, fetch_all=True)
+    names = set()
+    for row in rows:
+        names.update(filter(None, (row.get('partitions') or '').split(',')))
+    return len(names) if names else '-'
+
+
+if __name__ == '__main__':
+    print(f'transactions: {layout()}')
+    results = []
+    for size in SIZES:
+        current = table_rows()
+        if current < size:
+            print(f'Growing transactions from {current:,} to {size:,} rows...')
+            grow(current, size)
+        anchor = execute_query(
+            "SELECT date, transaction_id FROM transactions WHERE user_id = %s AND date < NOW() - INTERVAL 30 DAY "
+            "ORDER BY date DESC, transaction_id DESC LIMIT 1",
+            (BENCH_USER,), fetch_one=True
+        )
+        back = (anchor['date'], anchor['transaction_id']) if anchor else None
+        insert_p50, insert_p99 = time_inserts()
+        results.append({
+            'rows': table_rows(),
+            'insert_p50': insert_p50,
+            'insert_p99': insert_p99,
+            'history_first': time_history(None),
+            'history_back': time_history(back),
+            'partitions_read': history_partitions(back),
+        })
+
+    print(f'\n{layout()}; inserts: {INSERTS}, history: median of {REPEAT} (page size {PAGE_SIZE})')
+    print(f"{'rows':>14}{'insert p50':>12}{'insert p99':>12}{'page 1':>10}{'-30 days':>10}{'partitions':>12}")
+    for r in results:
+        print(f"{r['rows']:>14,}{r['insert_p50']:>10.2f}ms{r['insert_p99']:>10.2f}ms"
+              f"{r['history_first']:>8.2f}ms{r['history_back']:>8.2f}ms{str(r['partitions_read']):>12}")
+
+    if CLEANUP:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            # Batched, so the undo log stays small
+            while True:
+                cursor.execute("DELETE FROM transactions WHERE user_id BETWEEN %s AND %s LIMIT 10000",
+                               (FIRST_USER, FIRST_USER + BENCH_USERS))
+                conn.commit()
+                if not cursor.rowcount:
+                    break
+        finally:
+            cursor.close()
+            conn.close()
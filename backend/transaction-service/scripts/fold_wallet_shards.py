@@ -0,0 +1,15 @@
+"""Fold the balance shards of sharded hot wallets back into their wallets rows
+Run it before removing a wallet from SHARDED_WALLETS: only designated wallets are folded automatically (on debit).
+Safe to run while the service is live; see WalletShards.fold_all.
+
+Usage: python fold_wallet_shards.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models import WalletShards
+
+
+if __name__ == '__main__':
+    print(f'Folded the shard balances of {WalletShards.fold_all()} wallet(s)')
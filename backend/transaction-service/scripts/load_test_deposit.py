@@ -0,0 +1,69 @@
+"""Load test: requests/sec for the /graphql deposit mutation
+Assumptions:
+- transaction-service is running at TX_SVC (default http://localhost:5003)
+- JWT_SECRET matches the service (the token is minted locally with shared/auth.py)
+
+Run it once against the dev server and once against the production server to compare:
+    SERVER_MODE=dev python ../app.py         -> python load_test_deposit.py
+    SERVER_MODE=production python ../app.py  -> python load_test_deposit.py
+
+Usage: python load_test_deposit.py   (tune with CONCURRENCY, DURATION, LOAD_USERS env vars)
+"""
+import os
+import sys
+import time
+import threading
+import statistics
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+from auth import generate_token
+
+TX_SVC = os.getenv('TX_SVC', 'http://localhost:5003')
+CONCURRENCY = int(os.getenv('CONCURRENCY', 32))
+DURATION = float(os.getenv('DURATION', 20))
+# Spread load over several wallets so the test measures the server, not one hot row lock
+LOAD_USERS = int(os.getenv('LOAD_USERS', 32))
+FIRST_USER = int(os.getenv('FIRST_USER', 99800))
+
+MUTATION = '''mutation Deposit($amount: Float!){ deposit(amount: $amount, paymentMethod: "loadtest") { transaction_id amount } }'''
+
+
+def worker(index, deadline, latencies, errors):
+    user_id = FIRST_USER + index % LOAD_USERS
+    session = requests.Session()
+    session.headers.update({
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {generate_token(user_id, f"load{user_id}@example.com")}'
+    })
+    payload = {'query': MUTATION, 'variables': {'amount': 1.0}}
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            r = session.post(f'{TX_SVC}/graphql', json=payload, timeout=30)
+            ok = r.status_code == 200 and not r.json().get('errors')
+        except Exception:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(1)
+
+
+if __name__ == '__main__':
+    latencies, errors = [], []
+    deadline = time.perf_counter() + DURATION
+    threads = [threading.Thread(target=worker, args=(i, deadline, latencies, errors)) for i in range(CONCURRENCY)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    print(f'{CONCURRENCY} concurrent clients for {elapsed:.1f}s against {TX_SVC}/graphql (deposit)')
+    print(f'  ok requests: {len(latencies)}   errors: {len(errors)}')
+    print(f'  throughput:  {len(latencies) / elapsed:.1f} req/s')
+    if latencies:
+        latencies.sort()
+        print(f'  p50: {statistics.median(latencies) * 1000:.1f} ms   p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms')
@@ -0,0 +1,53 @@
+"""Manage the monthly partitions of the transactions table (see archive.py)
+
+    python manage_partitions.py list                   partitions and their estimated row counts
+    python manage_partitions.py create [--ahead N]     split the next N months off pmax (default TRANSACTION_PARTITIONS_AHEAD)
+    python manage_partitions.py archive [--retention N] [--dir PATH]
+                                                       move months older than N months to compressed files
+
+Run `create` and `archive` daily (e.g. from cron); both are no-ops when there is nothing to do.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import archive
+from config import TRANSACTION_PARTITIONS_AHEAD, TRANSACTION_RETENTION_MONTHS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monthly partitions of the transactions table')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list')
+    create = commands.add_parser('create')
+    create.add_argument('--ahead', type=int, default=TRANSACTION_PARTITIONS_AHEAD, help='months after the current one')
+    archive_cmd = commands.add_parser('archive')
+    archive_cmd.add_argument('--retention', type=int, default=TRANSACTION_RETENTION_MONTHS,
+                             help='whole months before the current one that stay in the table')
+    archive_cmd.add_argument('--dir', default=None, help=f'archive directory (default {archive.ARCHIVE_DIR})')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == 'list':
+        for partition in archive.list_partitions():
+            print(f"  {partition['name']:<10}{partition['rows']:>14,} rows")
+        months = archive.archived_months()
+        print(f"{len(months)} archived months in {archive.ARCHIVE_DIR}" + (f" ({months[-1]:%Y-%m} .. {months[0]:%Y-%m})" if months else ''))
+    elif args.command == 'create':
+        created = archive.create_partitions(ahead=args.ahead)
+        print(f"Created {len(created)} partitions{': ' + ', '.join(created) if created else ''}")
+    else:
+        archived, held = archive.archive_partitions(retention_months=args.retention, archive_dir=args.dir)
+        for entry in archived:
+            print(f"  {entry['partition']}: {entry['rows']:,} rows -> {entry['path']}")
+        print(f"Archived {len(archived)} months in {time.perf_counter() - started:.1f}s")
+        if held:
+            print(f"{held['partition']} and later months not archived: {held['pending']:,} payment requests from "
+                  f"{held['month']} are still pending (confirm or cancel them first)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""Rebuild transaction_daily_summary from the full transaction history
+Use it once after creating the table on an existing database (backfill), or to repair drift. Months already
+archived by manage_partitions.py keep their summary rows as they are.
+Safe to run while the service is live; see TransactionSummary.rebuild.
+
+Usage: python rebuild_transaction_summary.py   (tune with BATCH_USERS env var)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models import TransactionSummary
+
+BATCH_USERS = int(os.getenv('BATCH_USERS', 1000))
+
+
+def progress(start, end, high):
+    print(f'  users {start}..{end} of {high}')
+
+
+if __name__ == '__main__':
+    started = time.perf_counter()
+    written = TransactionSummary.rebuild(batch_users=BATCH_USERS, progress=progress)
+    print(f'Rebuilt transaction_daily_summary: {written} rows in {time.perf_counter() - started:.1f}s')
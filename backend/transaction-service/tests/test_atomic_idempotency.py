@@ -1,30 +1,12 @@
 import pytest
-import sys, os
 
-# Skip tests early if mysql connector is not installed or DB not reachable
-try:
-    import mysql.connector  # noqa: F401
-except Exception:
-    pytest.skip("mysql connector not installed, skipping DB tests", allow_module_level=True)
+from conftest import require, load_service_module
 
-import importlib.util
+require('mysql.connector')
 
-# Utility to load modules from path to avoid name collision among 'models' modules
-def load_module_from_path(name, path):
-    spec = importlib.util.spec_from_file_location(name, path)
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    return mod
-
-current_dir = os.path.dirname(__file__)
-parent_dir = os.path.abspath(os.path.join(current_dir, '..'))
-
-# Load transaction-service models
-tx_models = load_module_from_path('tx_models', os.path.join(parent_dir, 'models.py'))
-# Load wallet-service models
-wallet_models = load_module_from_path('wallet_models', os.path.abspath(os.path.join(parent_dir, '..', 'wallet-service', 'models.py')))
-# Load shared database helper
-db_module = load_module_from_path('shared_db', os.path.abspath(os.path.join(parent_dir, '..', 'shared', 'database.py')))
+tx_models = load_service_module('tx_models', 'transaction-service')
+wallet_models = load_service_module('wallet_models', 'wallet-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
 
 Transaction = tx_models.Transaction
 Wallet = wallet_models.Wallet
@@ -81,11 +63,30 @@ def test_deposit_and_transfer_idempotency():
     assert float(Wallet.get_balance(TEST_RECEIVER)) == pytest.approx(30.0)
 
 
+def test_transfer_replay_after_sender_is_drained_returns_original():
+    balance = float(Wallet.get_balance(TEST_SENDER))
+    original = Transaction.transfer_atomic(TEST_SENDER, TEST_RECEIVER, balance, idempotency_key='transfer-drain')
+    assert float(Wallet.get_balance(TEST_SENDER)) == pytest.approx(0.0)
+
+    # The retry must not fail the balance check the original already passed
+    replay = Transaction.transfer_atomic(TEST_SENDER, TEST_RECEIVER, balance, idempotency_key='transfer-drain')
+    assert replay == original
+    assert float(Wallet.get_balance(TEST_SENDER)) == pytest.approx(0.0)
+    assert float(Wallet.get_balance(TEST_RECEIVER)) == pytest.approx(30.0 + balance)
+
+
 def test_insufficient_funds():
     with pytest.raises(Exception):
         Transaction.transfer_atomic(TEST_SENDER, TEST_RECEIVER, 1000.0, description="too big")
 
 
+def test_transfer_of_the_whole_balance_compares_cents():
+    Transaction.deposit_atomic(TEST_SENDER, 0.30, payment_method="test")
+    # 0.1 + 0.2 is 0.30000000000000004 as a float, but 0.30 in the DECIMAL(10,2) columns
+    Transaction.transfer_atomic(TEST_SENDER, TEST_RECEIVER, 0.1 + 0.2, description="exact balance")
+    assert Wallet.get_balance(TEST_SENDER) == 0
+
+
 def test_create_and_confirm_payment_idempotency():
     idempotency = 'pay-1'
     # cleanup
@@ -119,3 +120,15 @@ def test_food_delivery_charge_to_merchant():
     assert txid
     assert float(Wallet.get_balance(12345)) == pytest.approx(185.0)
     assert float(Wallet.get_balance(90001)) == pytest.approx(15.0)
+
+
+def test_replayed_payment_returns_the_original():
+    Transaction.deposit_atomic(TEST_SENDER, 50.0, payment_method="test")
+    before = float(Wallet.get_balance(TEST_SENDER))
+
+    first = Transaction.pay_atomic(TEST_SENDER, 20.0, idempotency_key='pay-replay-1')
+    replay = Transaction.pay_atomic(TEST_SENDER, 20.0, idempotency_key='pay-replay-1')
+    assert first['success'] and replay['success']
+    assert replay['transaction_id'] == first['transaction_id']
+    assert float(replay['balance_remaining']) == pytest.approx(before - 20.0)
+    assert float(Wallet.get_balance(TEST_SENDER)) == pytest.approx(before - 20.0)
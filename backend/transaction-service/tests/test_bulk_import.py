@@ -0,0 +1,93 @@
+import pytest
+import io
+import json
+
+from conftest import require, load_service_module, SteppedConnection
+
+require('mysql.connector')
+
+# bulk_import imports `models`; make sure it resolves to this service's models.py
+tx_models = load_service_module('models', 'transaction-service')
+bulk_import = load_service_module('bulk_import', 'transaction-service', 'bulk_import.py', models=tx_models)
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+execute_query = db_module.execute_query
+
+IMPORT_A = 99901
+IMPORT_B = 99902
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (%s,%s)", (IMPORT_A, IMPORT_B))
+    execute_query("DELETE FROM wallets WHERE user_id IN (%s,%s)", (IMPORT_A, IMPORT_B))
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def _balance(user_id):
+    row = execute_query("SELECT balance FROM wallets WHERE user_id = %s", (user_id,), fetch_one=True)
+    return float(row['balance']) if row else None
+
+
+def _run(text, fmt, chunk_size=2):
+    return list(bulk_import.run_import(io.BytesIO(text.encode('utf-8')), fmt, chunk_size=chunk_size))
+
+
+def test_csv_import_applies_valid_rows_and_reports_each_line():
+    csv_text = (
+        "user_id,amount,type,idempotency_key\n"
+        f"{IMPORT_A},100.00,deposit,bulk-test-1\n"
+        f"{IMPORT_A},abc,deposit,\n"
+        f"{IMPORT_B},50.50,,bulk-test-2\n"
+        f"{IMPORT_A},30,withdraw,bulk-test-3\n"
+        f"{IMPORT_B},500,withdraw,\n"
+        f"{IMPORT_A},1.001,deposit,\n"
+    )
+    results = _run(csv_text, 'csv')
+
+    assert [r['line'] for r in results] == [2, 3, 4, 5, 6, 7]
+    assert [r['status'] for r in results] == ['created', 'invalid', 'created', 'created', 'failed', 'invalid']
+    assert results[4]['message'] == 'Insufficient balance'
+    assert _balance(IMPORT_A) == pytest.approx(70.0)
+    assert _balance(IMPORT_B) == pytest.approx(50.5)
+
+    # Re-running the same upload only reports duplicates for keyed rows
+    again = _run(csv_text, 'csv')
+    assert [r['status'] for r in again if r['line'] in (2, 4, 5)] == ['duplicate'] * 3
+    assert [r['transaction_id'] for r in again if r['line'] in (2, 4, 5)] == \
+        [r['transaction_id'] for r in results if r['line'] in (2, 4, 5)]
+    assert _balance(IMPORT_A) == pytest.approx(70.0)
+
+
+def test_jsonl_import_rejects_repeated_key_within_upload():
+    lines = [
+        json.dumps({'user_id': IMPORT_B, 'amount': 10, 'idempotency_key': 'bulk-test-4'}),
+        'not json',
+        json.dumps({'user_id': IMPORT_B, 'amount': 10, 'idempotency_key': 'bulk-test-4'}),
+    ]
+    results = _run('\n'.join(lines) + '\n', 'jsonl', chunk_size=10)
+
+    assert [r['status'] for r in results] == ['created', 'invalid', 'failed']
+    assert results[2]['message'] == 'Duplicate idempotency key within import'
+    assert _balance(IMPORT_B) == pytest.approx(60.5)
+
+
+def test_reported_ids_are_each_rows_own_when_auto_increment_steps(monkeypatch):
+    get_db_connection = tx_models.get_db_connection
+    monkeypatch.setattr(tx_models, 'get_db_connection', lambda: SteppedConnection(get_db_connection()))
+
+    records = [(IMPORT_A, 1.0), (IMPORT_B, 2.0), (IMPORT_A, 3.0)]
+    lines = [json.dumps({'user_id': user_id, 'amount': amount}) for user_id, amount in records]
+    results = _run('\n'.join(lines) + '\n', 'jsonl', chunk_size=10)
+
+    assert [r['status'] for r in results] == ['created'] * 3
+    for (user_id, amount), result in zip(records, results):
+        row = execute_query("SELECT user_id, amount FROM transactions WHERE transaction_id = %s",
+                            (result['transaction_id'],), fetch_one=True)
+        assert row['user_id'] == user_id and float(row['amount']) == pytest.approx(amount)
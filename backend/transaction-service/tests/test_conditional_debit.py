@@ -0,0 +1,91 @@
+import pytest
+import threading
+from decimal import Decimal
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+execute_query = db_module.execute_query
+
+PAYER = 99871
+RACER = 99872
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (%s,%s)", (PAYER, RACER))
+    execute_query("DELETE FROM wallets WHERE user_id IN (%s,%s)", (PAYER, RACER))
+    execute_query("DELETE FROM transaction_daily_summary WHERE user_id IN (%s,%s)", (PAYER, RACER))
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def _wallet(user_id):
+    return execute_query("SELECT balance, points FROM wallets WHERE user_id = %s", (user_id,), fetch_one=True)
+
+
+def test_pay_keeps_exact_decimal_balance_and_adds_points():
+    Transaction.deposit_atomic(PAYER, 100000.0, payment_method='test')
+
+    # 0.1 + 0.2 style amounts used to drift when the new balance was computed as a float in Python
+    for _ in range(30):
+        result = Transaction.pay_atomic(PAYER, 0.1)
+        assert result['success'], result
+    result = Transaction.pay_atomic(PAYER, 20000.2)
+    assert result['success'], result
+
+    assert isinstance(result['balance_remaining'], Decimal)
+    assert result['balance_remaining'] == Decimal('79996.80')
+    wallet = _wallet(PAYER)
+    assert wallet['balance'] == Decimal('79996.80')
+    assert wallet['points'] == 2
+
+
+def test_pay_insufficient_balance_changes_nothing():
+    before = _wallet(PAYER)
+    result = Transaction.pay_atomic(PAYER, before['balance'] + Decimal('0.01'))
+
+    assert not result['success']
+    assert result['message'] == 'Insufficient Balance'
+    assert result['balance_remaining'] == before['balance']
+    assert _wallet(PAYER) == before
+
+
+def test_pay_without_wallet_reports_wallet_not_found():
+    result = Transaction.pay_atomic(RACER, 1.0)
+    assert not result['success']
+    assert result['message'] == 'Wallet not found'
+
+
+def test_concurrent_withdrawals_never_overdraw():
+    Transaction.deposit_atomic(RACER, 10.0, payment_method='test')
+    succeeded, failed = [], []
+
+    def withdraw():
+        try:
+            succeeded.append(Transaction.withdraw_atomic(RACER, 1.0, payment_method='test'))
+        except Exception as e:
+            failed.append(str(e))
+
+    threads = [threading.Thread(target=withdraw) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(succeeded) == 10
+    assert set(failed) == {'Insufficient balance'}
+    assert _wallet(RACER)['balance'] == Decimal('0.00')
+    # Rejected debits leave no ledger row behind
+    rows = execute_query("SELECT COUNT(*) AS n FROM transactions WHERE user_id = %s AND type = 'withdraw'", (RACER,), fetch_one=True)
+    assert rows['n'] == 10
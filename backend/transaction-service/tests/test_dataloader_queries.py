@@ -0,0 +1,81 @@
+import pytest
+import sys
+
+from conftest import require, service_dir, load_service_module
+
+require('mysql.connector', 'graphene', 'flask')
+
+import flask
+
+# schema.py imports `models` and `archive`; make sure they resolve to this service's modules
+sys.path.insert(0, service_dir('transaction-service'))
+tx_models = load_service_module('models', 'transaction-service')
+tx_schema = load_service_module('tx_schema', 'transaction-service', 'schema.py', models=tx_models)
+
+import instrumentation
+from auth import generate_token
+from database import execute_query
+
+SENDER = 99921
+RECEIVER = 99922
+PAGE = 50
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (%s,%s) OR receiver_id IN (%s,%s)", (SENDER, RECEIVER, SENDER, RECEIVER))
+    execute_query("DELETE FROM users WHERE user_id IN (%s,%s)", (SENDER, RECEIVER))
+
+
+def setup_module(module):
+    _cleanup()
+    for user_id in (SENDER, RECEIVER):
+        execute_query(
+            "INSERT INTO users (user_id, name, email, phone, password) VALUES (%s, %s, %s, %s, %s)",
+            (user_id, f"Loader {user_id}", f"loader{user_id}@test.local", f"08{user_id}", 'x')
+        )
+    for i in range(PAGE):
+        execute_query(
+            "INSERT INTO transactions (user_id, amount, type, receiver_id, status) VALUES (%s, %s, %s, %s, %s)",
+            (SENDER, 1 + i, 'transfer', RECEIVER, 'completed')
+        )
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def test_history_page_with_users_costs_two_queries():
+    app = flask.Flask(__name__)
+    statements = []
+    instrumentation.add_hook(lambda event: statements.append(event.fingerprint))
+    hook = instrumentation._hooks[-1]
+    try:
+        headers = {'Authorization': f"Bearer {generate_token(SENDER, 'loader@test.local')}"}
+        with app.test_request_context('/graphql', headers=headers):
+            result = tx_schema.schema.execute(
+                "{ myTransactions(limit: %d) { transaction_id sender { name } receiver { name } } }" % PAGE
+            )
+            # Flush the last statement's event (emitted lazily on the next execute / close)
+            execute_query("SELECT 1")
+    finally:
+        instrumentation.remove_hook(hook)
+
+    assert not result.errors, result.errors
+    rows = result.data['myTransactions']
+    assert len(rows) == PAGE
+    assert all(row['sender']['name'] == f"Loader {SENDER}" for row in rows)
+    assert all(row['receiver']['name'] == f"Loader {RECEIVER}" for row in rows)
+
+    statements = [sql for sql in statements if sql != 'SELECT ?']
+    assert len(statements) == 2, statements
+    assert 'FROM users WHERE user_id IN (...)' in statements[1]
+
+
+def test_connection_resolvers_treat_first_null_as_the_default():
+    app = flask.Flask(__name__)
+    headers = {'Authorization': f"Bearer {generate_token(SENDER, 'loader@test.local')}"}
+    with app.test_request_context('/graphql', headers=headers):
+        mine = tx_schema.Query.resolve_myTransactionsConnection(None, None, first=None)
+        by_type = tx_schema.Query.resolve_transactions_by_type_connection(None, None, 'transfer', first=None)
+
+    assert len(mine.edges) == len(by_type.edges) == tx_schema.DEFAULT_PAGE_SIZE
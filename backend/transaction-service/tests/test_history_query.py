@@ -0,0 +1,80 @@
+import pytest
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+execute_query = db_module.execute_query
+
+HISTORY_USER = 99971
+OTHER_USER = 99972
+
+# The OR form the history query used to have; kept here only as the reference result
+LEGACY_QUERY = """
+    SELECT * FROM transactions
+    WHERE user_id = %s OR receiver_id = %s
+    ORDER BY date DESC, transaction_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (%s,%s) OR receiver_id IN (%s,%s)", (HISTORY_USER, OTHER_USER, HISTORY_USER, OTHER_USER))
+
+
+def setup_module(module):
+    _cleanup()
+    # Interleave sent, received and unrelated rows across distinct timestamps
+    for i in range(60):
+        if i % 3 == 0:
+            row = (HISTORY_USER, 'deposit', None)
+        elif i % 3 == 1:
+            row = (HISTORY_USER, 'transfer', OTHER_USER)
+        else:
+            row = (OTHER_USER, 'transfer', HISTORY_USER)
+        execute_query(
+            "INSERT INTO transactions (user_id, amount, type, receiver_id, date) VALUES (%s, 1.00, %s, %s, NOW() - INTERVAL %s MINUTE)",
+            (row[0], row[1], row[2], i)
+        )
+    execute_query("ANALYZE TABLE transactions", fetch_all=True)
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+@pytest.mark.parametrize("limit,offset", [(10, 0), (10, 15), (50, 30)])
+def test_history_matches_legacy_or_query(limit, offset):
+    expected = execute_query(LEGACY_QUERY, (HISTORY_USER, HISTORY_USER, limit, offset), fetch_all=True)
+    actual = Transaction.get_by_user_id(HISTORY_USER, limit, offset)
+    assert [r['transaction_id'] for r in actual] == [r['transaction_id'] for r in expected]
+
+
+def test_history_keyset_pages_cover_whole_history():
+    expected = execute_query(LEGACY_QUERY, (HISTORY_USER, HISTORY_USER, 1000, 0), fetch_all=True)
+    seen = []
+    after = None
+    while True:
+        page = Transaction.get_by_user_id_after(HISTORY_USER, 7, after)
+        if not page:
+            break
+        seen.extend(r['transaction_id'] for r in page)
+        after = (page[-1]['date'], page[-1]['transaction_id'])
+    assert seen == [r['transaction_id'] for r in expected]
+
+
+@pytest.mark.parametrize("after", [None, ('2999-01-01 00:00:00', 1)])
+def test_history_query_plan_uses_per_side_indexes(after):
+    """Regression guard: each branch must be an ordered index read, never a scan, index merge or filesort."""
+    query, params = tx_models._history_query(HISTORY_USER, 50, after=after)
+    plan = execute_query("EXPLAIN " + query, params, fetch_all=True)
+    branches = [row for row in plan if row['table'] == 'transactions']
+    assert len(branches) == 2
+    assert {row['key'] for row in branches} == {'idx_user_date', 'idx_receiver_date'}
+    for row in branches:
+        assert row['type'] not in ('ALL', 'index', 'index_merge')
+        assert 'filesort' not in (row.get('Extra') or '')
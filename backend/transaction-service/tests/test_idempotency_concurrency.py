@@ -0,0 +1,73 @@
+import pytest
+import threading
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+execute_query = db_module.execute_query
+
+IDEM_USER = 99941
+IDEM_KEY = 'concurrent-deposit-1'
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id = %s OR idempotency_key IN (%s, %s)", (IDEM_USER, IDEM_KEY, 'concurrent-request-1'))
+    execute_query("DELETE FROM wallets WHERE user_id = %s", (IDEM_USER,))
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def _run_parallel(fn, n):
+    results, errors = [], []
+
+    def run():
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_parallel_identical_key_deposits_apply_once():
+    results, errors = _run_parallel(
+        lambda: Transaction.deposit_atomic(IDEM_USER, 10.0, payment_method='test', idempotency_key=IDEM_KEY), 100
+    )
+
+    assert not errors
+    # Every caller gets the single winning ledger row
+    assert len({row['transaction_id'] for row in results}) == 1
+
+    rows = execute_query("SELECT transaction_id FROM transactions WHERE idempotency_key = %s", (IDEM_KEY,), fetch_all=True)
+    assert len(rows) == 1
+    assert rows[0]['transaction_id'] == results[0]['transaction_id']
+
+    wallet = execute_query("SELECT balance FROM wallets WHERE user_id = %s", (IDEM_USER,), fetch_one=True)
+    assert float(wallet['balance']) == pytest.approx(10.0)
+
+
+def test_parallel_identical_key_payment_requests_create_one_row():
+    results, errors = _run_parallel(
+        lambda: Transaction.create_payment_request(5.0, description='idem', idempotency_key='concurrent-request-1'), 20
+    )
+
+    assert not errors
+    assert len(set(results)) == 1
+    rows = execute_query("SELECT transaction_id FROM transactions WHERE idempotency_key = %s", ('concurrent-request-1',), fetch_all=True)
+    assert len(rows) == 1
@@ -0,0 +1,99 @@
+import pytest
+import sys
+
+from conftest import require, service_dir, load_service_module
+
+require('mysql.connector', 'graphene', 'flask')
+
+import flask
+
+# schema.py imports `models` and `archive`; make sure they resolve to this service's modules
+sys.path.insert(0, service_dir('transaction-service'))
+tx_models = load_service_module('models', 'transaction-service')
+tx_schema = load_service_module('tx_schema', 'transaction-service', 'schema.py', models=tx_models)
+wallet_models = load_service_module('wallet_models', 'wallet-service')
+
+import instrumentation
+from auth import generate_token
+from database import execute_query, get_pool
+
+USER = 99881
+OTHER = 99882
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (%s,%s) OR receiver_id IN (%s,%s)", (USER, OTHER, USER, OTHER))
+    execute_query("DELETE FROM wallets WHERE user_id IN (%s,%s)", (USER, OTHER))
+    execute_query("DELETE FROM transaction_daily_summary WHERE user_id IN (%s,%s)", (USER, OTHER))
+
+
+def setup_module(module):
+    _cleanup()
+    # Wallets exist up front so every measured mutation takes its steady-state path
+    tx_models.Transaction.deposit_atomic(USER, 100.0, payment_method='test')
+    tx_models.Transaction.deposit_atomic(OTHER, 1.0, payment_method='test')
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def _measure(fn):
+    """Run fn and return (result, pool checkouts, statements executed)"""
+    statements = []
+    hook = statements.append
+    instrumentation.add_hook(hook)
+    checkouts = get_pool().metrics()['checkouts']
+    try:
+        result = fn()
+    finally:
+        instrumentation.remove_hook(hook)
+    return result, get_pool().metrics()['checkouts'] - checkouts, [event.fingerprint for event in statements]
+
+
+def _execute(query):
+    app = flask.Flask(__name__)
+    headers = {'Authorization': f"Bearer {generate_token(USER, 'roundtrip@test.local')}"}
+    with app.test_request_context('/graphql', headers=headers):
+        return tx_schema.schema.execute(query)
+
+
+# Before: each mutation checked out a second connection (and committed a second time) for Transaction.get_by_id
+# after commit: deposit 2 checkouts / 4 statements, withdraw 2 / 5, transfer 2 / 7. The read-back now runs on
+# the mutation's own connection before commit.
+@pytest.mark.parametrize('mutation, field, max_statements', [
+    ('mutation { deposit(amount: 5, paymentMethod: "test") { transaction_id amount type date status } }', 'deposit', 4),
+    ('mutation { withdraw(amount: 2, paymentMethod: "test") { transaction_id amount type date status } }', 'withdraw', 5),
+    ('mutation { transfer(receiverId: %d, amount: 1) { transaction_id amount type date receiver_id } }' % OTHER, 'transfer', 7),
+])
+def test_mutation_uses_one_connection_and_returns_full_row(mutation, field, max_statements):
+    result, checkouts, statements = _measure(lambda: _execute(mutation))
+
+    assert not result.errors, result.errors
+    row = result.data[field]
+    assert row['transaction_id'] and row['date'] and row['type']
+    assert checkouts == 1, statements
+    assert len(statements) <= max_statements, statements
+    # The ledger row is read back at most once, on the mutation's own connection
+    assert sum('FROM transactions WHERE transaction_id = ?' in sql for sql in statements) == 1
+
+
+def test_replayed_deposit_returns_original_row():
+    first = tx_models.Transaction.deposit_atomic(USER, 3.0, payment_method='test', idempotency_key='roundtrip-dep-1')
+    replay, checkouts, _ = _measure(
+        lambda: tx_models.Transaction.deposit_atomic(USER, 3.0, payment_method='test', idempotency_key='roundtrip-dep-1')
+    )
+    assert replay['transaction_id'] == first['transaction_id']
+    assert checkouts == 1
+
+
+def test_update_balance_returns_updated_wallet_from_one_connection():
+    # Before: the UpdateBalance mutation did get, (create,) update, get: up to 4 checkouts
+    wallet, checkouts, statements = _measure(lambda: wallet_models.Wallet.update_balance(USER, 10.0, 'add'))
+    assert checkouts == 1, statements
+    assert wallet['user_id'] == USER
+    assert float(wallet['balance']) == pytest.approx(float(wallet_models.Wallet.get_balance(USER)))
+
+    wallet, checkouts, _ = _measure(lambda: wallet_models.Wallet.update_points(USER, 3, 'add'))
+    assert checkouts == 1
+    assert wallet['points'] == 3
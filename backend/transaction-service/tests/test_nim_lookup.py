@@ -0,0 +1,101 @@
+import pytest
+import sys
+
+from conftest import require, service_dir, load_service_module
+
+require('mysql.connector', 'bcrypt')
+
+# models.py imports `passwords`, whose pool processes unpickle functions by that module name
+sys.path.insert(0, service_dir('user-service'))
+user_models = load_service_module('user_models', 'user-service')
+tx_models = load_service_module('tx_models', 'transaction-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+User = user_models.User
+UserNim = tx_models.UserNim
+execute_query = db_module.execute_query
+
+EMAIL_PATTERN = 'nimtest-%@test.local'
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (SELECT user_id FROM users WHERE email LIKE %s)", (EMAIL_PATTERN,))
+    execute_query("DELETE FROM user_nims WHERE user_id IN (SELECT user_id FROM users WHERE email LIKE %s)", (EMAIL_PATTERN,))
+    execute_query("DELETE FROM wallets WHERE user_id IN (SELECT user_id FROM users WHERE email LIKE %s)", (EMAIL_PATTERN,))
+    execute_query("DELETE FROM users WHERE email LIKE %s", (EMAIL_PATTERN,))
+    tx_models.nim_cache.clear()
+
+
+def setup_module(module):
+    _cleanup()
+    # Cheapest bcrypt cost; hashing speed is not under test here
+    user_models.hasher.rounds = 4
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def test_registration_maps_email_local_part():
+    user = User.create('NIM Test', 'nimtest-1@test.local', '0899300001', 's3cret')
+    assert UserNim.resolve('nimtest-1') == user['user_id']
+
+
+def test_known_nims_are_cached_and_unknown_ones_are_not():
+    user = User.create('NIM Test', 'nimtest-2@test.local', '0899300002', 's3cret')
+    checkouts = db_module.get_pool().metrics()['checkouts']
+    assert UserNim.resolve('nimtest-2') == user['user_id']
+    assert UserNim.resolve('nimtest-2') == user['user_id']
+    assert db_module.get_pool().metrics()['checkouts'] - checkouts == 1
+
+    # A student can pay as soon as they are registered
+    assert UserNim.resolve('nimtest-missing') is None
+    user = User.create('NIM Test', 'nimtest-2b@test.local', '0899300012', 's3cret', nim='nimtest-missing')
+    assert UserNim.resolve('nimtest-missing') == user['user_id']
+
+
+def test_explicit_nim_must_be_free_and_profile_update_moves_it():
+    with pytest.raises(user_models.DuplicateUserError) as taken:
+        User.create('NIM Test', 'nimtest-3@test.local', '0899300003', 's3cret', nim='nimtest-1')
+    assert str(taken.value) == "NIM already registered"
+    assert User.get_by_email('nimtest-3@test.local') is None
+
+    # The default NIM is skipped rather than refused when someone already holds it
+    owner = User.create('NIM Test', 'nimtest-4@test.local', '0899300004', 's3cret', nim='nimtest-5')
+    user = User.create('NIM Test', 'nimtest-5@test.local', '0899300005', 's3cret')
+    assert UserNim.resolve('nimtest-5') == owner['user_id']
+
+    assert User.update_profile(user['user_id'], nim='nimtest-5b')
+    assert UserNim.resolve('nimtest-5b') == user['user_id']
+    with pytest.raises(user_models.DuplicateUserError):
+        User.update_profile(user['user_id'], nim='nimtest-1')
+    rows = execute_query("SELECT nim FROM user_nims WHERE user_id = %s", (user['user_id'],), fetch_all=True)
+    assert [row['nim'] for row in rows] == ['nimtest-5b']
+
+
+def test_nim_moved_to_another_user_charges_the_new_owner_at_once():
+    previous = User.create('NIM Test', 'nimtest-6@test.local', '0899300006', 's3cret')
+    new_owner = User.create('NIM Test', 'nimtest-7@test.local', '0899300007', 's3cret')
+    for user in (previous, new_owner):
+        tx_models.Transaction.deposit_atomic(user['user_id'], 100.0, payment_method='test')
+    assert UserNim.resolve('nimtest-6') == previous['user_id']
+
+    assert User.update_profile(previous['user_id'], nim='nimtest-6b')
+    assert User.update_profile(new_owner['user_id'], nim='nimtest-6')
+
+    # The previous owner is still cached; the payment's debit finds the NIM moved and resolves it again
+    assert tx_models.nim_cache.get('nimtest-6') == previous['user_id']
+    result = UserNim.pay('nimtest-6', 25.0, payment_method='test')
+    assert result['success']
+    assert tx_models.nim_cache.get('nimtest-6') == new_owner['user_id']
+    balances = execute_query("SELECT user_id, balance FROM wallets WHERE user_id IN (%s,%s)",
+                             (previous['user_id'], new_owner['user_id']), fetch_all=True)
+    assert {row['user_id']: float(row['balance']) for row in balances} == {
+        previous['user_id']: 100.0, new_owner['user_id']: 75.0}
+    rows = execute_query("SELECT user_id FROM transactions WHERE user_id IN (%s,%s) AND type = 'withdraw'",
+                         (previous['user_id'], new_owner['user_id']), fetch_all=True)
+    assert [row['user_id'] for row in rows] == [new_owner['user_id']]
+
+
+def test_unknown_nim_pays_nothing():
+    assert UserNim.pay('nimtest-nobody', 10.0) is None
@@ -0,0 +1,95 @@
+import pytest
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+# notification_dispatcher imports `models`; make sure it resolves to this service's models.py
+tx_models = load_service_module('models', 'transaction-service')
+dispatcher = load_service_module('notification_dispatcher', 'transaction-service', 'notification_dispatcher.py', models=tx_models)
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+execute_query = db_module.execute_query
+
+OUTBOX_USER = 99931
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id = %s", (OUTBOX_USER,))
+    execute_query("DELETE FROM wallets WHERE user_id = %s", (OUTBOX_USER,))
+    execute_query("DELETE FROM notification_outbox WHERE user_id = %s", (OUTBOX_USER,))
+    execute_query("DELETE FROM notifications WHERE user_id = %s", (OUTBOX_USER,))
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def _outbox_rows():
+    return execute_query("SELECT message FROM notification_outbox WHERE user_id = %s ORDER BY outbox_id", (OUTBOX_USER,), fetch_all=True)
+
+
+def _notifications():
+    return execute_query("SELECT message FROM notifications WHERE user_id = %s ORDER BY notification_id", (OUTBOX_USER,), fetch_all=True)
+
+
+def test_payment_writes_outbox_and_dispatcher_delivers():
+    Transaction.deposit_atomic(OUTBOX_USER, 50000.0, payment_method='test', idempotency_key='outbox-dep-1')
+
+    ok = Transaction.pay_atomic(OUTBOX_USER, 20000.0, notify=True)
+    failed = Transaction.pay_atomic(OUTBOX_USER, 100000.0, notify=True)
+    assert ok['success'] and not failed['success']
+
+    pending = _outbox_rows()
+    assert len(pending) == 2
+    assert pending[0]['message'].startswith('Pembayaran berhasil')
+    assert pending[1]['message'] == 'Pembayaran gagal: Insufficient Balance'
+    assert _notifications() == []
+
+    while dispatcher.dispatch_batch(batch_size=100):
+        pass
+
+    assert _outbox_rows() == []
+    delivered = [row['message'] for row in _notifications()]
+    assert delivered == [row['message'] for row in pending]
+
+
+def test_payment_without_notify_skips_outbox():
+    Transaction.pay_atomic(OUTBOX_USER, 1000.0)
+    assert _outbox_rows() == []
+
+
+def test_dispatch_error_backs_off_once(monkeypatch):
+    class Stop:
+        def __init__(self):
+            self.waits = []
+
+        def is_set(self):
+            return len(self.waits) > 0
+
+        def wait(self, timeout):
+            self.waits.append(timeout)
+
+    class Wakeup:
+        waits = 0
+
+        def wait(self, timeout):
+            Wakeup.waits += 1
+
+        def clear(self):
+            pass
+
+    def failing_batch(batch_size):
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr(dispatcher, 'dispatch_batch', failing_batch)
+    monkeypatch.setattr(dispatcher, '_dispatch_wakeup', Wakeup())
+    stop = Stop()
+    dispatcher.run(stop, poll_interval=0.5)
+    assert stop.waits == [0.5]
+    assert Wakeup.waits == 0
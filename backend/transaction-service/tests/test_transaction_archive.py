@@ -0,0 +1,136 @@
+import pytest
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+archive = load_service_module('tx_archive', 'transaction-service', 'archive.py')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+execute_query = db_module.execute_query
+
+TEST_USER = 99841
+OTHER_USER = 99842
+KEY_PREFIX = 'archtest-'
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (%s,%s)", (TEST_USER, OTHER_USER))
+    execute_query("DELETE FROM transaction_idempotency_keys WHERE idempotency_key LIKE %s", (KEY_PREFIX + '%',))
+    archive._history_cache.clear()
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def _month(name):
+    return {'name': name, 'month': date(int(name[1:5]), int(name[5:7]), 1), 'rows': 0}
+
+
+def test_months_to_create_continue_from_pold_or_last_month():
+    fresh = [{'name': 'pold', 'month': None, 'rows': 0, 'pold_end': date(2026, 8, 1)},
+             {'name': 'pmax', 'month': None, 'rows': 0}]
+    assert archive.months_to_create(fresh, date(2026, 10, 18), 1) == [
+        date(2026, 8, 1), date(2026, 9, 1), date(2026, 10, 1), date(2026, 11, 1)]
+
+    current = [_month('p202610'), _month('p202611'), {'name': 'pmax', 'month': None, 'rows': 0}]
+    assert archive.months_to_create(current, date(2026, 10, 18), 3) == [date(2026, 12, 1), date(2027, 1, 1)]
+    assert archive.months_to_create(current, date(2026, 10, 18), 1) == []
+
+
+def test_months_to_archive_keeps_retention_window():
+    partitions = [{'name': 'pold', 'month': None, 'rows': 0},
+                  _month('p202508'), _month('p202509'), _month('p202510'), _month('p202610')]
+    assert [p['name'] for p in archive.months_to_archive(partitions, date(2026, 10, 18), 12)] == ['p202508', 'p202509']
+
+
+def _by_user(rows):
+    # What archive_partition's by-user query returns: each row under its sender and its receiver, newest first
+    filed = [dict(row, owner=row['user_id']) for row in rows if row['user_id'] is not None]
+    filed += [dict(row, owner=row['receiver_id']) for row in rows
+              if row['receiver_id'] is not None and row['receiver_id'] != row['user_id']]
+    filed.sort(key=lambda row: (-row['owner'], row['date'], row['transaction_id']), reverse=True)
+    return filed
+
+
+def test_months_with_pending_payments_hold_back_archival():
+    due = [_month('p202508'), _month('p202509'), _month('p202510')]
+    pending = {'p202509': 2}
+    assert archive.split_archivable(due, lambda p: pending.get(p['name'], 0)) == (due[:1], (due[1], 2))
+    assert archive.split_archivable(due, lambda p: 0) == (due, None)
+
+
+def test_read_history_pages_across_archived_months(tmp_path, monkeypatch):
+    def row(transaction_id, when, user_id=TEST_USER, receiver_id=None):
+        return {'transaction_id': transaction_id, 'user_id': user_id, 'receiver_id': receiver_id,
+                'amount': Decimal('1.50'), 'type': 'transfer', 'date': when}
+
+    for month, rows in [(date(2025, 1, 1), [row(1, datetime(2025, 1, 5)), row(2, datetime(2025, 1, 9)),
+                                            row(3, datetime(2025, 1, 9), user_id=OTHER_USER)]),
+                        (date(2025, 2, 1), [row(4, datetime(2025, 2, 1), user_id=OTHER_USER, receiver_id=TEST_USER),
+                                            row(5, datetime(2025, 2, 3))])]:
+        path = archive.archive_path(month, str(tmp_path))
+        assert archive.write_archive(path, iter(rows)) == len(rows)
+        assert archive.write_user_index(path, iter(_by_user(rows))) == 2
+        # Not visible to history until published
+        assert month not in archive.archived_months(str(tmp_path))
+        archive._publish(path)
+
+    # A user's page is read from the by-user files alone, never by decompressing a whole month
+    def whole_month(*args, **kwargs):
+        raise AssertionError("read a whole archive month")
+    monkeypatch.setattr(archive.gzip, 'open', whole_month)
+
+    assert archive.read_history(99843, 10, archive_dir=str(tmp_path)) == []
+    assert [r['transaction_id'] for r in archive.read_history(OTHER_USER, 10, archive_dir=str(tmp_path))] == [4, 3]
+
+    first = archive.read_history(TEST_USER, 2, archive_dir=str(tmp_path))
+    assert [r['transaction_id'] for r in first] == [5, 4]
+    assert first[0]['amount'] == Decimal('1.50') and first[0]['date'] == datetime(2025, 2, 3)
+
+    after = (first[-1]['date'].strftime('%Y-%m-%d %H:%M:%S'), first[-1]['transaction_id'])
+    rest = archive.read_history(TEST_USER, 10, after=after, archive_dir=str(tmp_path))
+    assert [r['transaction_id'] for r in rest] == [2, 1]
+    for path in (archive.archive_path(date(2025, 1, 1), str(tmp_path)),
+                 archive.user_index_path(archive.archive_path(date(2025, 1, 1), str(tmp_path)))):
+        assert os.stat(path).st_mode & 0o222 == 0
+
+
+def test_by_user_file_skips_rows_without_a_user(tmp_path):
+    # An external payment request (create_payment_request) has no user_id
+    rows = [{'transaction_id': 1, 'user_id': None, 'receiver_id': None, 'amount': Decimal('5.00'),
+             'type': 'deposit', 'date': datetime(2025, 3, 2)},
+            {'transaction_id': 2, 'user_id': TEST_USER, 'receiver_id': None, 'amount': Decimal('1.00'),
+             'type': 'deposit', 'date': datetime(2025, 3, 4)}]
+    path = archive.archive_path(date(2025, 3, 1), str(tmp_path))
+    archive.write_archive(path, iter(rows))
+    filed = [dict(rows[0], owner=None), dict(rows[1], owner=TEST_USER)]
+    assert archive.write_user_index(path, iter(filed)) == 1
+    archive._publish(path)
+
+    assert [r['transaction_id'] for r in archive.read_history(TEST_USER, 10, archive_dir=str(tmp_path))] == [2]
+
+
+def test_idempotency_keys_survive_partitioning():
+    first = Transaction.create_with_idempotency(TEST_USER, 10.00, 'deposit', idempotency_key=KEY_PREFIX + '1')
+    assert Transaction.create_with_idempotency(TEST_USER, 10.00, 'deposit', idempotency_key=KEY_PREFIX + '1') == first
+
+    # Deleting the row releases its key
+    execute_query("DELETE FROM transactions WHERE transaction_id = %s", (first,))
+    second = Transaction.create_with_idempotency(TEST_USER, 10.00, 'deposit', idempotency_key=KEY_PREFIX + '1')
+    assert second != first
+
+    # A key whose row was archived (partition dropped, no trigger) stays taken
+    execute_query("INSERT INTO transaction_idempotency_keys (idempotency_key) VALUES (%s)", (KEY_PREFIX + 'archived',))
+    with pytest.raises(ValueError):
+        Transaction.create_with_idempotency(TEST_USER, 10.00, 'deposit', idempotency_key=KEY_PREFIX + 'archived')
@@ -0,0 +1,106 @@
+import pytest
+import threading
+from datetime import date, timedelta
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+TransactionSummary = tx_models.TransactionSummary
+execute_query = db_module.execute_query
+
+SUMMARY_USER = 99911
+SUMMARY_OTHER = 99912
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (%s,%s) OR receiver_id IN (%s,%s)", (SUMMARY_USER, SUMMARY_OTHER, SUMMARY_USER, SUMMARY_OTHER))
+    execute_query("DELETE FROM wallets WHERE user_id IN (%s,%s)", (SUMMARY_USER, SUMMARY_OTHER))
+    execute_query("DELETE FROM transaction_daily_summary WHERE user_id IN (%s,%s)", (SUMMARY_USER, SUMMARY_OTHER))
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def _totals(user_id, granularity='total'):
+    today = date.today()
+    rows = TransactionSummary.get(user_id, today, today, granularity)
+    return {row['type']: (int(row['tx_count']), float(row['total_amount'])) for row in rows}
+
+
+def test_atomic_paths_maintain_summary_and_rebuild_matches():
+    Transaction.deposit_atomic(SUMMARY_USER, 100.0, payment_method='test', idempotency_key='summary-dep-1')
+    Transaction.deposit_atomic(SUMMARY_USER, 100.0, payment_method='test', idempotency_key='summary-dep-1')  # replay
+    Transaction.deposit_atomic(SUMMARY_USER, 50.0, payment_method='test')
+    Transaction.withdraw_atomic(SUMMARY_USER, 20.0, payment_method='test')
+    Transaction.transfer_atomic(SUMMARY_USER, SUMMARY_OTHER, 30.0)
+    Transaction.pay_atomic(SUMMARY_USER, 10.0)
+    Transaction.pay_atomic(SUMMARY_USER, 10000.0)  # insufficient balance: not counted
+
+    expected_user = {'deposit': (2, 150.0), 'withdraw': (2, 30.0), 'transfer_out': (1, 30.0)}
+    expected_other = {'transfer_in': (1, 30.0)}
+    assert _totals(SUMMARY_USER) == expected_user
+    assert _totals(SUMMARY_OTHER) == expected_other
+
+    day_rows = TransactionSummary.get(SUMMARY_USER, date.today(), date.today(), 'day')
+    assert {row['period'] for row in day_rows} == {date.today().isoformat()}
+
+    # Dropping the incremental rows and rebuilding from history gives the same totals
+    execute_query("DELETE FROM transaction_daily_summary WHERE user_id IN (%s,%s)", (SUMMARY_USER, SUMMARY_OTHER))
+    TransactionSummary._rebuild_range(SUMMARY_USER, SUMMARY_OTHER, date.today().replace(day=1))
+    assert _totals(SUMMARY_USER) == expected_user
+    assert _totals(SUMMARY_OTHER) == expected_other
+
+
+def test_rebuild_keeps_summaries_of_archived_months():
+    # What an archive run leaves behind: a month's summary rows, with its ledger rows gone from the table
+    archived_day = date(2001, 1, 15)
+    execute_query(
+        "INSERT INTO transaction_daily_summary (user_id, day, type, tx_count, total_amount) VALUES (%s, %s, 'deposit', 3, 75.00)",
+        (SUMMARY_OTHER, archived_day)
+    )
+
+    TransactionSummary.rebuild()
+
+    rows = TransactionSummary.get(SUMMARY_OTHER, archived_day, archived_day, 'total')
+    assert [(row['type'], int(row['tx_count']), float(row['total_amount'])) for row in rows] == [('deposit', 3, 75.0)]
+    assert _totals(SUMMARY_OTHER) == {'transfer_in': (1, 30.0)}
+
+
+def test_confirmed_payment_counts_once_on_its_own_day():
+    created = date.today() - timedelta(days=3)
+    transaction_id = Transaction.create_with_idempotency(SUMMARY_USER, 40.0, 'deposit', payment_method='external',
+                                                         idempotency_key='summary-confirm-1', status='pending')
+    execute_query("UPDATE transactions SET date = %s WHERE transaction_id = %s", (created, transaction_id))
+    balance = lambda: float(execute_query("SELECT balance FROM wallets WHERE user_id = %s", (SUMMARY_USER,),
+                                          fetch_one=True)['balance'])
+    before = balance()
+
+    # The provider's callback delivered twice at once
+    barrier = threading.Barrier(2)
+    def confirm():
+        barrier.wait()
+        Transaction.confirm_payment_by_idempotency('summary-confirm-1')
+    threads = [threading.Thread(target=confirm) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert balance() == pytest.approx(before + 40.0)
+    rows = TransactionSummary.get(SUMMARY_USER, created, created, 'day')
+    assert [(row['period'], row['type'], int(row['tx_count'])) for row in rows] == [(created.isoformat(), 'deposit', 1)]
+
+
+def test_invalid_granularity_is_rejected():
+    with pytest.raises(ValueError):
+        TransactionSummary.get(SUMMARY_USER, date.today(), date.today(), 'week')
@@ -0,0 +1,98 @@
+import pytest
+import threading
+
+from conftest import require, load_service_module, SteppedConnection
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+wallet_models = load_service_module('wallet_models', 'wallet-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+Wallet = wallet_models.Wallet
+execute_query = db_module.execute_query
+
+PAYER = 99981
+PAYEES = [99982, 99983, 99984]
+ALL_USERS = [PAYER] + PAYEES
+
+
+def _cleanup():
+    placeholders = ', '.join(['%s'] * len(ALL_USERS))
+    execute_query(f"DELETE FROM transactions WHERE user_id IN ({placeholders}) OR receiver_id IN ({placeholders})", tuple(ALL_USERS + ALL_USERS))
+    execute_query(f"DELETE FROM wallets WHERE user_id IN ({placeholders})", tuple(ALL_USERS))
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def test_batch_applies_items_and_reports_per_item_results():
+    Transaction.deposit_atomic(PAYER, 100.0, payment_method='test', description='setup', idempotency_key='batch-setup')
+
+    results = Transaction.transfer_batch([
+        {'sender_id': PAYER, 'receiver_id': PAYEES[0], 'amount': 30.0, 'idempotency_key': 'batch-1'},
+        {'sender_id': PAYER, 'receiver_id': PAYEES[1], 'amount': 0, 'idempotency_key': 'batch-2'},
+        {'sender_id': PAYER, 'receiver_id': PAYEES[2], 'amount': 500.0, 'idempotency_key': 'batch-3'},
+        {'sender_id': PAYER, 'receiver_id': PAYEES[1], 'amount': 20.0, 'idempotency_key': 'batch-4'},
+    ])
+
+    assert [r['success'] for r in results] == [True, False, False, True]
+    assert results[2]['message'] == 'Insufficient balance'
+    assert results[0]['transaction']['receiver_id'] == PAYEES[0]
+    assert results[3]['transaction']['receiver_id'] == PAYEES[1]
+
+    assert float(Wallet.get_balance(PAYER)) == pytest.approx(50.0)
+    assert float(Wallet.get_balance(PAYEES[0])) == pytest.approx(30.0)
+    assert float(Wallet.get_balance(PAYEES[1])) == pytest.approx(20.0)
+
+    # Replaying the batch returns the existing rows and moves no money
+    replay = Transaction.transfer_batch([
+        {'sender_id': PAYER, 'receiver_id': PAYEES[0], 'amount': 30.0, 'idempotency_key': 'batch-1'},
+    ])
+    assert replay[0]['success']
+    assert replay[0]['transaction']['transaction_id'] == results[0]['transaction']['transaction_id']
+    assert float(Wallet.get_balance(PAYER)) == pytest.approx(50.0)
+
+
+def test_opposite_batches_do_not_deadlock():
+    a, b = PAYEES[0], PAYEES[1]
+    errors = []
+
+    def run(sender, receiver):
+        try:
+            for _ in range(20):
+                Transaction.transfer_batch([{'sender_id': sender, 'receiver_id': receiver, 'amount': 1.0}])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(a, b)), threading.Thread(target=run, args=(b, a))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    # Money is conserved between the pair
+    assert float(Wallet.get_balance(a)) + float(Wallet.get_balance(b)) == pytest.approx(50.0)
+
+
+def test_results_are_the_items_own_rows_when_ids_are_not_consecutive(monkeypatch):
+    get_db_connection = tx_models.get_db_connection
+    monkeypatch.setattr(tx_models, 'get_db_connection', lambda: SteppedConnection(get_db_connection()))
+
+    items = [{'sender_id': PAYEES[0], 'receiver_id': payee, 'amount': amount, 'description': f'stepped-{amount}'}
+             for payee, amount in [(PAYEES[1], 1.0), (PAYEES[2], 2.0), (PAYER, 3.0)]]
+    results = Transaction.transfer_batch(items)
+
+    assert all(r['success'] for r in results)
+    assert len({r['transaction']['transaction_id'] for r in results}) == 3
+    for item, result in zip(items, results):
+        row = result['transaction']
+        assert (row['user_id'], row['receiver_id'], row['description']) == (item['sender_id'], item['receiver_id'], item['description'])
+        assert float(row['amount']) == pytest.approx(item['amount'])
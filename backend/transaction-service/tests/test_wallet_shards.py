@@ -0,0 +1,104 @@
+import pytest
+import threading
+from datetime import date
+
+from conftest import require, load_service_module
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+wallet_models = load_service_module('wallet_models', 'wallet-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+Transaction = tx_models.Transaction
+TransactionSummary = tx_models.TransactionSummary
+WalletShards = tx_models.WalletShards
+Wallet = wallet_models.Wallet
+execute_query = db_module.execute_query
+
+MERCHANT = 99891
+PAYERS = [99892, 99893]
+ALL_USERS = [MERCHANT] + PAYERS
+SHARDS = 4
+
+
+def _cleanup():
+    placeholders = ', '.join(['%s'] * len(ALL_USERS))
+    execute_query(f"DELETE FROM transactions WHERE user_id IN ({placeholders}) OR receiver_id IN ({placeholders})", tuple(ALL_USERS) * 2)
+    execute_query(f"DELETE FROM wallets WHERE user_id IN ({placeholders})", tuple(ALL_USERS))
+    execute_query(f"DELETE FROM transaction_daily_summary WHERE user_id IN ({placeholders})", tuple(ALL_USERS))
+    execute_query("DELETE FROM wallet_balance_shards WHERE user_id = %s", (MERCHANT,))
+    wallet_models.wallet_cache.clear()
+
+
+def setup_module(module):
+    _cleanup()
+    tx_models.SHARDED_WALLETS[MERCHANT] = SHARDS
+
+
+def teardown_module(module):
+    tx_models.SHARDED_WALLETS.pop(MERCHANT, None)
+    _cleanup()
+
+
+def _wallet_row_balance(user_id):
+    row = execute_query("SELECT balance FROM wallets WHERE user_id = %s", (user_id,), fetch_one=True)
+    return float(row['balance'])
+
+
+def _shard_total(user_id):
+    row = execute_query("SELECT COALESCE(SUM(balance), 0) AS total FROM wallet_balance_shards WHERE user_id = %s", (user_id,), fetch_one=True)
+    return float(row['total'])
+
+
+def test_concurrent_charges_credit_shards_and_debit_folds_them():
+    Transaction.deposit_atomic(MERCHANT, 5.0, payment_method='test')
+    for payer in PAYERS:
+        Transaction.deposit_atomic(payer, 1000.0, payment_method='test')
+
+    errors = []
+
+    def charge(payer, n):
+        try:
+            for _ in range(n):
+                Transaction.transfer_atomic(payer, MERCHANT, 2.0, description='shard test')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=charge, args=(PAYERS[i % 2], 10)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+    # Credits never touched the merchant's wallets row; the wallet service reports row + shards
+    assert _wallet_row_balance(MERCHANT) == pytest.approx(5.0)
+    assert _shard_total(MERCHANT) == pytest.approx(80.0)
+    shard_rows = execute_query("SELECT shard_id FROM wallet_balance_shards WHERE user_id = %s", (MERCHANT,), fetch_all=True)
+    assert all(0 <= row['shard_id'] < SHARDS for row in shard_rows)
+    assert float(Wallet.get_by_user_id(MERCHANT)['balance']) == pytest.approx(85.0)
+    assert float(Wallet.get_by_user_ids([MERCHANT])[0]['balance']) == pytest.approx(85.0)
+
+    # Summary rows spread over shards still add up per type
+    today = date.today()
+    totals = {row['type']: (int(row['tx_count']), float(row['total_amount']))
+              for row in TransactionSummary.get(MERCHANT, today, today, 'total')}
+    assert totals['transfer_in'] == (40, pytest.approx(80.0))
+
+    # A debit above the wallet row but within the total succeeds, and folds the shards into the row
+    with pytest.raises(Exception):
+        Transaction.withdraw_atomic(MERCHANT, 85.01, payment_method='test')
+    Transaction.withdraw_atomic(MERCHANT, 85.0, payment_method='test')
+    assert _wallet_row_balance(MERCHANT) == pytest.approx(0.0)
+    assert _shard_total(MERCHANT) == pytest.approx(0.0)
+    assert float(Wallet.get_by_user_id(MERCHANT)['balance']) == pytest.approx(0.0)
+
+
+def test_fold_all_moves_shard_balances_into_wallet_row():
+    Transaction.transfer_atomic(PAYERS[0], MERCHANT, 3.0)
+    assert _shard_total(MERCHANT) == pytest.approx(3.0)
+
+    assert WalletShards.fold_all() >= 1
+    assert _shard_total(MERCHANT) == pytest.approx(0.0)
+    assert _wallet_row_balance(MERCHANT) == pytest.approx(3.0)
@@ -4,7 +4,6 @@ Handles registration, login, and user profile
 """
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from flask_graphql import GraphQLView
 import sys
 import os
 
@@ -12,7 +11,11 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
 
 from config import SERVICE_PORTS, CORS_ORIGINS
+from server import serve
+from graphql_view import CachedGraphQLView
+from instrumentation import register_metrics_route
 from schema import schema
+from passwords import hasher
 
 app = Flask(__name__)
 CORS(app, origins=CORS_ORIGINS)
@@ -30,9 +33,12 @@ def _log_graphql_request_body():
 # GraphQL endpoint
 app.add_url_rule(
     '/graphql',
-    view_func=GraphQLView.as_view('graphql', schema=schema, graphiql=True)
+    view_func=CachedGraphQLView.as_view('graphql', schema=schema, graphiql=True)
 )
 
+# GET /metrics: DB pool, per-query stats (DB_TRACE=1), cache counters and password hashing pool counters
+register_metrics_route(app, 'user-service', extra=lambda: {'password_hasher': hasher.stats()})
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -40,5 +46,5 @@ def health():
 
 if __name__ == '__main__':
     port = SERVICE_PORTS['user']
-    app.run(host='0.0.0.0', port=port, debug=True)
+    serve(app, port)
 
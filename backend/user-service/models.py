@@ -3,24 +3,95 @@ User Service Models
 """
 import sys
 import os
-import bcrypt
+import re
+from datetime import datetime
+from mysql.connector import IntegrityError, errorcode
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from database import execute_query
+from config import WALLETS_TABLE, USER_NIMS_TABLE
+from database import execute_query, get_db_connection
+from passwords import hasher
+
+# Messages for a registration / profile update that hits the unique index on users.email, users.phone or
+# user_nims.nim
+DUPLICATE_MESSAGES = {
+    'email': "Email already registered",
+    'phone': "Phone number already registered",
+    'nim': "NIM already registered",
+}
+
+_DUPLICATE_KEY_RE = re.compile(r"for key '(?:[^'.]*\.)?([^']+)'")
+
+
+class DuplicateUserError(Exception):
+    """Registration or profile update violated a unique index; `field` is 'email', 'phone' or 'nim'"""
+
+    def __init__(self, field):
+        super().__init__(DUPLICATE_MESSAGES.get(field, "User already registered"))
+        self.field = field
+
+
+def _duplicate_user_error(e):
+    """DuplicateUserError for an ER_DUP_ENTRY IntegrityError"""
+    match = _DUPLICATE_KEY_RE.search(e.msg or '')
+    return DuplicateUserError(match.group(1) if match else None)
+
+
+def nim_from_email(email):
+    """Default NIM of a user: the local part of a student email (NIM@university.edu)"""
+    return email.split('@', 1)[0]
+
 
 class User:
     @staticmethod
-    def create(name, email, phone, password):
-        """Create a new user"""
-        # Hash password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
-        query = """
-            INSERT INTO users (name, email, phone, password)
-            VALUES (%s, %s, %s, %s)
+    def create(name, email, phone, password, nim=None):
+        """Create a new user, their empty wallet and their NIM mapping (USER_NIMS_TABLE) in one transaction.
+
+        Duplicates are caught by the unique indexes on email and phone rather than looked up first, so
+        concurrent registrations cannot both succeed. Without an explicit `nim` the email's local part is used,
+        unless another user already has it. Raises DuplicateUserError, or HasherBusy when the password hashing
+        pool is saturated. Returns the new user (without password), built without a re-read.
         """
-        user_id = execute_query(query, (name, email, phone, hashed_password))
-        return user_id
+        # Hash password (in the hashing process pool)
+        hashed_password = hasher.hash_password(password)
+        created_at = datetime.now().replace(microsecond=0)
+        
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            conn.start_transaction()
+            cursor.execute("""
+                INSERT INTO users (name, email, phone, password, created_at)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (name, email, phone, hashed_password, created_at))
+            user_id = cursor.lastrowid
+            # The wallet exists from the start, so the first my_wallet is a plain read
+            cursor.execute(f"INSERT INTO {WALLETS_TABLE} (user_id, balance, points) VALUES (%s, 0.00, 0)", (user_id,))
+            # An explicit NIM must be free; the default one is only claimed if nobody has it yet
+            cursor.execute(
+                f"INSERT {'' if nim else 'IGNORE '}INTO {USER_NIMS_TABLE} (user_id, nim) VALUES (%s, %s)",
+                (user_id, nim or nim_from_email(email))
+            )
+            conn.commit()
+        except IntegrityError as e:
+            if conn:
+                conn.rollback()
+            if e.errno != errorcode.ER_DUP_ENTRY:
+                raise
+            raise _duplicate_user_error(e) from e
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+        
+        return {'user_id': user_id, 'name': name, 'email': email, 'phone': phone, 'created_at': str(created_at)}
     
     @staticmethod
     def get_by_email(email):
@@ -41,13 +112,38 @@ class User:
         return execute_query(query, (user_id,), fetch_one=True)
     
     @staticmethod
-    def verify_password(plain_password, hashed_password):
-        """Verify password"""
-        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    def get_by_ids(user_ids):
+        """Get several users by ID in one query (order not preserved, missing IDs skipped)"""
+        if not user_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        query = f"SELECT user_id, name, email, phone, created_at FROM users WHERE user_id IN ({placeholders})"
+        return execute_query(query, tuple(user_ids), fetch_all=True)
+    
+    @staticmethod
+    def verify_password(plain_password, hashed_password, user_id=None):
+        """Verify password (in the hashing process pool; raises HasherBusy when it is saturated).
+        With user_id, a stored hash made with a cost other than PASSWORD_HASH_ROUNDS is replaced on success."""
+        matches, new_hash = hasher.check_password(plain_password, hashed_password)
+        if matches and new_hash and user_id is not None:
+            try:
+                User.update_password_hash(user_id, hashed_password, new_hash)
+            except Exception as e:
+                # The old hash still works; the next login tries again
+                print(f"Password rehash failed for user {user_id}: {e}", file=sys.stderr)
+        return matches
     
     @staticmethod
-    def update_profile(user_id, name=None, phone=None):
-        """Update user profile"""
+    def update_password_hash(user_id, old_hash, new_hash):
+        """Replace a user's password hash, unless the password changed since old_hash was read"""
+        query = "UPDATE users SET password = %s WHERE user_id = %s AND password = %s"
+        execute_query(query, (new_hash, user_id, old_hash))
+        return True
+    
+    @staticmethod
+    def update_profile(user_id, name=None, phone=None, nim=None):
+        """Update user profile. A new NIM replaces the user's mapping in USER_NIMS_TABLE in the same transaction.
+        Raises DuplicateUserError if the phone or NIM belongs to another user."""
         updates = []
         params = []
         
@@ -58,11 +154,34 @@ class User:
             updates.append("phone = %s")
             params.append(phone)
         
-        if not updates:
+        if not updates and not nim:
             return False
         
-        params.append(user_id)
-        query = f"UPDATE users SET {', '.join(updates)} WHERE user_id = %s"
-        execute_query(query, tuple(params))
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            conn.start_transaction()
+            if updates:
+                cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE user_id = %s", tuple(params) + (user_id,))
+            if nim:
+                cursor.execute(f"DELETE FROM {USER_NIMS_TABLE} WHERE user_id = %s", (user_id,))
+                cursor.execute(f"INSERT INTO {USER_NIMS_TABLE} (user_id, nim) VALUES (%s, %s)", (user_id, nim))
+            conn.commit()
+        except IntegrityError as e:
+            if conn:
+                conn.rollback()
+            if e.errno != errorcode.ER_DUP_ENTRY:
+                raise
+            raise _duplicate_user_error(e) from e
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
         return True
-
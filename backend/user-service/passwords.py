@@ -0,0 +1,119 @@
+"""
+Password hashing off the request threads
+
+bcrypt is slow on purpose (about 250 ms of CPU at cost 12), so each serving process hands hashing to its own
+pool of PASSWORD_HASH_WORKERS processes instead of pinning a request thread for the duration. At most
+PASSWORD_HASH_QUEUE jobs wait for a free process; beyond that HasherBusy is raised at once and the mutations
+answer HTTP 429, rather than queueing logins until they time out.
+
+New hashes use PASSWORD_HASH_ROUNDS. check_password also returns a replacement hash when the stored one was
+made with another cost, so changing the setting migrates users as they log in.
+"""
+import sys
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+from config import PASSWORD_HASH_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE
+
+
+class HasherBusy(Exception):
+    """Every hashing process is busy and the wait queue is full"""
+
+
+def hash_rounds(hashed):
+    """Cost factor of a bcrypt hash ('$2b$12$...'), or None if it cannot be read"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed, rounds):
+    """(matches, replacement hash at `rounds` if the stored hash used another cost, else None)"""
+    if not bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8')):
+        return False, None
+    if hash_rounds(hashed) == rounds:
+        return True, None
+    return True, _hash(password, rounds)
+
+
+class PasswordHasher:
+    """Bounded process pool running bcrypt; workers=0 runs it on the calling thread"""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, queue_size=PASSWORD_HASH_QUEUE, rounds=PASSWORD_HASH_ROUNDS):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rounds = rounds
+        # One slot per job running or waiting; a job that finds none is refused instead of queued
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._stats = {'hashed': 0, 'checked': 0, 'rehashed': 0, 'rejected': 0}
+
+    def hash_password(self, password):
+        """bcrypt hash of `password` at the configured cost. Raises HasherBusy when the queue is full."""
+        hashed = self._run(_hash, password, self.rounds)
+        self._count('hashed')
+        return hashed
+
+    def check_password(self, password, hashed):
+        """(matches, replacement hash or None), see _check. Raises HasherBusy when the queue is full."""
+        matches, new_hash = self._run(_check, password, hashed, self.rounds)
+        self._count('checked')
+        if new_hash:
+            self._count('rehashed')
+        return matches, new_hash
+
+    def close(self):
+        """Stop the hashing processes; a later job starts new ones"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers, queue_size=self.queue_size, rounds=self.rounds)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise HasherBusy('Too many logins in progress, please retry shortly')
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A hashing process died (e.g. OOM-killed); start a fresh pool for the next job
+            with self._lock:
+                self._executor = None
+            raise
+        finally:
+            self._slots.release()
+
+    def _get_executor(self):
+        with self._lock:
+            # Created on first use and per PID, so every gunicorn worker (forked after import) gets its own.
+            # spawn: forking a process that already runs request threads is not safe.
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+
+hasher = PasswordHasher()
@@ -7,8 +7,22 @@ import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from auth import generate_token, verify_token, get_token_from_request
-from models import User
+from auth import generate_token, current_user
+from graphql_view import set_http_status
+from loaders import RowLoader, get_loader
+from models import User, DuplicateUserError
+from passwords import HasherBusy
+
+def _hasher_busy(e):
+    """Refuse a login / registration quickly while the password hashing pool is saturated"""
+    set_http_status(429, {'Retry-After': '1'})
+    return Exception(str(e))
+
+class UserLoader(RowLoader):
+    key_field = 'user_id'
+
+    def fetch_many(self, user_ids):
+        return User.get_by_ids(user_ids)
 
 class UserType(ObjectType):
     userId = Int(name='userId')
@@ -33,6 +47,8 @@ class RegisterInput(graphene.InputObjectType):
     email = String(required=True)
     phone = String(required=True)
     password = String(required=True)
+    # Student number used by Food Delivery payments; defaults to the email's local part
+    nim = String()
 
 class LoginInput(graphene.InputObjectType):
     email = String()
@@ -45,11 +61,7 @@ class Query(ObjectType):
     
     def resolve_me(self, info):
         """Get current user from token"""
-        token = get_token_from_request()
-        if not token:
-            return None
-        
-        payload = verify_token(token)
+        payload = current_user()
         if not payload:
             return None
         
@@ -57,7 +69,7 @@ class Query(ObjectType):
     
     def resolve_user(self, info, userId):
         """Get user by ID"""
-        return User.get_by_id(userId)
+        return get_loader(UserLoader).load(userId)
 
 class Register(graphene.Mutation):
     class Arguments:
@@ -66,38 +78,26 @@ class Register(graphene.Mutation):
     Output = AuthResponse
     
     def mutate(self, info, input):
-        """Register a new user"""
-        # Check if email exists
-        existing_user = User.get_by_email(input.email)
-        if existing_user:
-            return AuthResponse(
-                token=None,
-                user=None,
-                message="Email already registered"
+        """Register a new user (one insert of the user and their wallet; duplicates hit the unique indexes)"""
+        try:
+            user = User.create(
+                name=input.name,
+                email=input.email,
+                phone=input.phone,
+                password=input.password,
+                nim=input.nim
             )
-        
-        # Check if phone exists
-        existing_user = User.get_by_phone(input.phone)
-        if existing_user:
+        except DuplicateUserError as e:
             return AuthResponse(
                 token=None,
                 user=None,
-                message="Phone number already registered"
+                message=str(e)
             )
-        
-        # Create user
-        user_id = User.create(
-            name=input.name,
-            email=input.email,
-            phone=input.phone,
-            password=input.password
-        )
+        except HasherBusy as e:
+            raise _hasher_busy(e)
         
         # Generate token
-        token = generate_token(user_id, input.email)
-        
-        # Get created user
-        user = User.get_by_id(user_id)
+        token = generate_token(user['user_id'], user['email'])
         
         return AuthResponse(
             token=token,
@@ -133,8 +133,12 @@ class Login(graphene.Mutation):
                 message="User not found"
             )
         
-        # Verify password
-        if not User.verify_password(input.password, user['password']):
+        # Verify password (and rehash it if it was stored with another cost factor)
+        try:
+            verified = User.verify_password(input.password, user['password'], user_id=user['user_id'])
+        except HasherBusy as e:
+            raise _hasher_busy(e)
+        if not verified:
             return AuthResponse(
                 token=None,
                 user=None,
@@ -0,0 +1,73 @@
+import pytest
+import sys
+import threading
+
+from conftest import require, service_dir, load_service_module
+
+require('bcrypt')
+
+import bcrypt
+
+# Pool processes unpickle the hashing functions by module name, so load it as `passwords`
+sys.path.insert(0, service_dir('user-service'))
+passwords = load_service_module('passwords', 'user-service', 'passwords.py')
+sys.modules['passwords'] = passwords
+
+
+@pytest.fixture
+def hasher():
+    hasher = passwords.PasswordHasher(workers=1, queue_size=1, rounds=4)
+    yield hasher
+    hasher.close()
+
+
+def test_hash_and_check_in_pool(hasher):
+    hashed = hasher.hash_password('s3cret')
+    assert passwords.hash_rounds(hashed) == 4
+    assert hasher.check_password('s3cret', hashed) == (True, None)
+    assert hasher.check_password('wrong', hashed) == (False, None)
+
+
+def test_check_returns_rehash_when_cost_differs(hasher):
+    old = bcrypt.hashpw(b's3cret', bcrypt.gensalt(5)).decode('utf-8')
+
+    matches, new_hash = hasher.check_password('s3cret', old)
+    assert matches
+    assert passwords.hash_rounds(new_hash) == 4
+    assert bcrypt.checkpw(b's3cret', new_hash.encode('utf-8'))
+    # A wrong password never produces a replacement hash
+    assert hasher.check_password('wrong', old) == (False, None)
+    assert hasher.stats()['rehashed'] == 1
+
+
+def test_full_queue_is_refused_immediately(hasher):
+    # workers + queue_size = 2 jobs may be in flight; hold both slots
+    slots = hasher._slots
+    assert slots.acquire(blocking=False) and slots.acquire(blocking=False)
+    try:
+        with pytest.raises(passwords.HasherBusy):
+            hasher.hash_password('s3cret')
+    finally:
+        slots.release()
+        slots.release()
+    assert hasher.stats()['rejected'] == 1
+    assert hasher.check_password('s3cret', hasher.hash_password('s3cret'))[0]
+
+
+def test_concurrent_checks_share_the_pool(hasher):
+    hashed = hasher.hash_password('s3cret')
+    results = []
+
+    def check():
+        try:
+            results.append(hasher.check_password('s3cret', hashed)[0])
+        except passwords.HasherBusy:
+            results.append('busy')
+
+    threads = [threading.Thread(target=check) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert True in results
+    assert set(results) <= {True, 'busy'}
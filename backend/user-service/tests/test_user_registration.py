@@ -0,0 +1,78 @@
+import pytest
+import sys
+import threading
+
+from conftest import require, service_dir, load_service_module
+
+require('mysql.connector', 'bcrypt')
+
+# models.py imports `passwords`, whose pool processes unpickle functions by that module name
+sys.path.insert(0, service_dir('user-service'))
+user_models = load_service_module('user_models', 'user-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+User = user_models.User
+execute_query = db_module.execute_query
+
+EMAIL_PATTERN = 'regtest-%@test.local'
+
+
+def _cleanup():
+    execute_query("DELETE FROM user_nims WHERE user_id IN (SELECT user_id FROM users WHERE email LIKE %s)", (EMAIL_PATTERN,))
+    execute_query("DELETE FROM wallets WHERE user_id IN (SELECT user_id FROM users WHERE email LIKE %s)", (EMAIL_PATTERN,))
+    execute_query("DELETE FROM users WHERE email LIKE %s", (EMAIL_PATTERN,))
+
+
+def setup_module(module):
+    _cleanup()
+    # Cheapest bcrypt cost; hashing speed is not under test here
+    user_models.hasher.rounds = 4
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def test_create_inserts_user_and_wallet_on_one_connection():
+    checkouts = db_module.get_pool().metrics()['checkouts']
+    user = User.create('Reg Test', 'regtest-1@test.local', '0899100001', 's3cret')
+    assert db_module.get_pool().metrics()['checkouts'] - checkouts == 1
+
+    assert user['email'] == 'regtest-1@test.local' and user['created_at']
+    stored = User.get_by_id(user['user_id'])
+    assert str(stored['created_at']) == user['created_at']
+    wallet = execute_query("SELECT balance, points FROM wallets WHERE user_id = %s", (user['user_id'],), fetch_one=True)
+    assert float(wallet['balance']) == 0.0 and wallet['points'] == 0
+
+
+def test_duplicates_map_to_existing_messages_and_leave_no_wallet():
+    wallets_before = execute_query("SELECT COUNT(*) AS n FROM wallets", fetch_one=True)['n']
+
+    with pytest.raises(user_models.DuplicateUserError) as email:
+        User.create('Reg Test', 'regtest-1@test.local', '0899100002', 's3cret')
+    assert str(email.value) == "Email already registered"
+
+    with pytest.raises(user_models.DuplicateUserError) as phone:
+        User.create('Reg Test', 'regtest-2@test.local', '0899100001', 's3cret')
+    assert str(phone.value) == "Phone number already registered"
+
+    assert execute_query("SELECT COUNT(*) AS n FROM wallets", fetch_one=True)['n'] == wallets_before
+
+
+def test_concurrent_registrations_of_one_email_create_one_user():
+    results = []
+
+    def register(i):
+        try:
+            results.append(User.create('Reg Test', 'regtest-race@test.local', f'089920{i:04d}', 's3cret')['user_id'])
+        except user_models.DuplicateUserError as e:
+            results.append(str(e))
+
+    threads = [threading.Thread(target=register, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len([r for r in results if isinstance(r, int)]) == 1
+    assert results.count("Email already registered") == 7
@@ -4,12 +4,14 @@ Handles balance, points, and wallet operations
 """
 from flask import Flask
 from flask_cors import CORS
-from flask_graphql import GraphQLView
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
 from config import SERVICE_PORTS, CORS_ORIGINS
+from server import serve
+from graphql_view import CachedGraphQLView
+from instrumentation import register_metrics_route
 from schema import schema
 
 app = Flask(__name__)
@@ -18,16 +20,26 @@ CORS(app, origins=CORS_ORIGINS)
 # GraphQL endpoint
 app.add_url_rule(
     '/graphql',
-    view_func=GraphQLView.as_view('graphql', schema=schema, graphiql=True)
+    view_func=CachedGraphQLView.as_view('graphql', schema=schema, graphiql=True)
 )
 
+# GET /metrics: DB pool, per-query stats (DB_TRACE=1) and cache counters
+register_metrics_route(app, 'wallet-service')
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     from flask import jsonify
     return jsonify({'status': 'healthy', 'service': 'wallet-service'}), 200
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the in-process caches"""
+    from flask import jsonify
+    from cache import get_all_stats
+    return jsonify(get_all_stats()), 200
+
 if __name__ == '__main__':
     port = SERVICE_PORTS['wallet']
-    app.run(host='0.0.0.0', port=port, debug=True)
+    serve(app, port)
 
@@ -5,7 +5,22 @@ import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from database import execute_query
+from database import execute_query, get_db_connection
+from cache import get_cache
+from mysql.connector import IntegrityError, errorcode
+
+# Read-through cache of wallet rows keyed by user_id. Every write path (here and in the transaction
+# service's *_atomic methods) must invalidate it after commit; those writes happen in other processes, so
+# it only caches with a shared backend (CACHE_BACKEND=redis, see shared/config.py).
+wallet_cache = get_cache('wallet')
+
+# Wallet columns with the balance of sharded hot wallets (transaction-service WalletShards) added up in the
+# same statement; for every other wallet the subquery is an empty primary-key range
+WALLET_COLUMNS = """
+    wallet_id, user_id,
+    balance + COALESCE((SELECT SUM(s.balance) FROM wallet_balance_shards s WHERE s.user_id = wallets.user_id), 0) AS balance,
+    points, created_at, updated_at
+"""
 
 class Wallet:
     @staticmethod
@@ -20,38 +35,95 @@ class Wallet:
     
     @staticmethod
     def get_by_user_id(user_id):
-        """Get wallet by user ID"""
-        query = """
-            SELECT wallet_id, user_id, balance, points, created_at, updated_at
-            FROM wallets WHERE user_id = %s
-        """
-        return execute_query(query, (user_id,), fetch_one=True)
+        """Get wallet by user ID (served from wallet_cache when possible)"""
+        cached = wallet_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+        
+        snapshot = wallet_cache.snapshot()
+        query = f"SELECT {WALLET_COLUMNS} FROM wallets WHERE user_id = %s"
+        wallet = execute_query(query, (user_id,), fetch_one=True)
+        if wallet:
+            wallet_cache.set(user_id, dict(wallet), snapshot)
+        return wallet
+    
+    @staticmethod
+    def get_by_user_ids(user_ids):
+        """Get several wallets by user ID: cached rows first, the rest in one query (order not preserved)"""
+        wallets = []
+        missing = []
+        for user_id in user_ids:
+            cached = wallet_cache.get(user_id)
+            if cached is not None:
+                wallets.append(dict(cached))
+            else:
+                missing.append(user_id)
+        if not missing:
+            return wallets
+        
+        snapshot = wallet_cache.snapshot()
+        placeholders = ', '.join(['%s'] * len(missing))
+        query = f"SELECT {WALLET_COLUMNS} FROM wallets WHERE user_id IN ({placeholders})"
+        for wallet in execute_query(query, tuple(missing), fetch_all=True):
+            wallet_cache.set(wallet['user_id'], dict(wallet), snapshot)
+            wallets.append(wallet)
+        return wallets
+    
+    @staticmethod
+    def invalidate(*user_ids):
+        """Drop cached wallet rows after a write"""
+        wallet_cache.delete(*user_ids)
+    
+    @staticmethod
+    def _add(column, user_id, amount):
+        """Add `amount` to `column` of the user's wallet, creating the wallet if needed.
+        Returns the updated row, read back on the same connection before commit."""
+        conn = None
+        cursor = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"UPDATE wallets SET {column} = {column} + %s WHERE user_id = %s", (amount, user_id))
+            if cursor.rowcount == 0:
+                try:
+                    cursor.execute(f"INSERT INTO wallets (user_id, {column}) VALUES (%s, %s)", (user_id, amount))
+                except IntegrityError as e:
+                    # The wallet exists (created concurrently, or the update did not change the row)
+                    if e.errno != errorcode.ER_DUP_ENTRY:
+                        raise
+                    cursor.execute(f"UPDATE wallets SET {column} = {column} + %s WHERE user_id = %s", (amount, user_id))
+            cursor.execute(f"SELECT {WALLET_COLUMNS} FROM wallets WHERE user_id = %s", (user_id,))
+            wallet = cursor.fetchone()
+            conn.commit()
+        except Exception:
+            if conn:
+                conn.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+        Wallet.invalidate(user_id)
+        return wallet
     
     @staticmethod
     def update_balance(user_id, amount, operation='add'):
-        """Update wallet balance"""
+        """Update wallet balance (creating the wallet if needed); returns the updated row, or False for an unknown operation"""
         if operation == 'add':
-            query = "UPDATE wallets SET balance = balance + %s WHERE user_id = %s"
-        elif operation == 'subtract':
-            query = "UPDATE wallets SET balance = balance - %s WHERE user_id = %s"
-        else:
-            return False
-        
-        execute_query(query, (amount, user_id))
-        return True
+            return Wallet._add('balance', user_id, amount)
+        if operation == 'subtract':
+            return Wallet._add('balance', user_id, -amount)
+        return False
     
     @staticmethod
     def update_points(user_id, points, operation='add'):
-        """Update wallet points"""
+        """Update wallet points (creating the wallet if needed); returns the updated row, or False for an unknown operation"""
         if operation == 'add':
-            query = "UPDATE wallets SET points = points + %s WHERE user_id = %s"
-        elif operation == 'subtract':
-            query = "UPDATE wallets SET points = points - %s WHERE user_id = %s"
-        else:
-            return False
-        
-        execute_query(query, (points, user_id))
-        return True
+            return Wallet._add('points', user_id, points)
+        if operation == 'subtract':
+            return Wallet._add('points', user_id, -points)
+        return False
     
     @staticmethod
     def get_balance(user_id):
@@ -7,9 +7,16 @@ import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
-from auth import verify_token, get_token_from_request
+from auth import current_user, require_current_user
+from loaders import RowLoader, get_loader
 from models import Wallet
 
+class WalletLoader(RowLoader):
+    key_field = 'user_id'
+
+    def fetch_many(self, user_ids):
+        return Wallet.get_by_user_ids(user_ids)
+
 class WalletType(ObjectType):
     # Force snake_case field names to match frontend queries
     wallet_id = Int(name='wallet_id')
@@ -43,11 +50,7 @@ class Query(ObjectType):
     
     def resolve_my_wallet(self, info):
         """Get current user's wallet"""
-        token = get_token_from_request()
-        if not token:
-            return None
-        
-        payload = verify_token(token)
+        payload = current_user()
         if not payload:
             return None
         
@@ -61,7 +64,7 @@ class Query(ObjectType):
     
     def resolve_wallet(self, info, user_id):
         """Get wallet by user ID"""
-        return Wallet.get_by_user_id(user_id)
+        return get_loader(WalletLoader).load(user_id)
 
 class UpdateBalance(graphene.Mutation):
     class Arguments:
@@ -72,25 +75,15 @@ class UpdateBalance(graphene.Mutation):
     
     def mutate(self, info, amount, operation):
         """Update wallet balance"""
-        token = get_token_from_request()
-        if not token:
-            raise Exception("Authentication required")
-        
-        payload = verify_token(token)
-        if not payload:
-            raise Exception("Invalid token")
+        payload = require_current_user()
         
         user_id = payload['user_id']
         
-        # Ensure wallet exists
-        wallet = Wallet.get_by_user_id(user_id)
+        # Creates the wallet if needed and returns the updated row from the same connection
+        wallet = Wallet.update_balance(user_id, float(amount), operation)
         if not wallet:
-            Wallet.create(user_id)
-        
-        # Update balance
-        Wallet.update_balance(user_id, float(amount), operation)
-        
-        return Wallet.get_by_user_id(user_id)
+            raise Exception("operation must be 'add' or 'subtract'")
+        return wallet
 
 class UpdatePoints(graphene.Mutation):
     class Arguments:
@@ -101,25 +94,15 @@ class UpdatePoints(graphene.Mutation):
     
     def mutate(self, info, points, operation):
         """Update wallet points"""
-        token = get_token_from_request()
-        if not token:
-            raise Exception("Authentication required")
-        
-        payload = verify_token(token)
-        if not payload:
-            raise Exception("Invalid token")
+        payload = require_current_user()
         
         user_id = payload['user_id']
         
-        # Ensure wallet exists
-        wallet = Wallet.get_by_user_id(user_id)
+        # Creates the wallet if needed and returns the updated row from the same connection
+        wallet = Wallet.update_points(user_id, points, operation)
         if not wallet:
-            Wallet.create(user_id)
-        
-        # Update points
-        Wallet.update_points(user_id, points, operation)
-        
-        return Wallet.get_by_user_id(user_id)
+            raise Exception("operation must be 'add' or 'subtract'")
+        return wallet
 
 class Mutation(ObjectType):
     update_balance = UpdateBalance.Field()
@@ -0,0 +1,127 @@
+import pytest
+import subprocess
+import sys
+import threading
+
+from conftest import BACKEND_DIR, require, load_service_module
+
+require('mysql.connector')
+
+tx_models = load_service_module('tx_models', 'transaction-service')
+wallet_models = load_service_module('wallet_models', 'wallet-service')
+db_module = load_service_module('shared_db', 'shared', 'database.py')
+
+import cache as cache_module
+import config
+
+Transaction = tx_models.Transaction
+Wallet = wallet_models.Wallet
+execute_query = db_module.execute_query
+
+# Writers and readers share this process here, so a per-process cache is exercised whatever CACHE_BACKEND is
+wallet_cache = tx_models.wallet_cache = wallet_models.wallet_cache = cache_module.LRUTTLCache('wallet')
+
+# Deposits 1.00 to the user given as argv[1] from a separate process, like the transaction service would
+DEPOSIT_SCRIPT = """
+import sys
+from conftest import load_service_module
+tx_models = load_service_module('tx_models', 'transaction-service')
+tx_models.Transaction.deposit_atomic(int(sys.argv[1]), 1.0, payment_method='test')
+"""
+
+CACHE_USER = 99961
+CACHE_OTHER = 99962
+
+
+def _cleanup():
+    execute_query("DELETE FROM transactions WHERE user_id IN (%s,%s) OR receiver_id IN (%s,%s)", (CACHE_USER, CACHE_OTHER, CACHE_USER, CACHE_OTHER))
+    execute_query("DELETE FROM wallets WHERE user_id IN (%s,%s)", (CACHE_USER, CACHE_OTHER))
+    wallet_cache.clear()
+
+
+def setup_module(module):
+    _cleanup()
+
+
+def teardown_module(module):
+    _cleanup()
+
+
+def _db_balance(user_id):
+    row = execute_query("SELECT balance FROM wallets WHERE user_id = %s", (user_id,), fetch_one=True)
+    return float(row['balance'])
+
+
+def test_read_through_and_write_invalidation():
+    Transaction.deposit_atomic(CACHE_USER, 10.0, payment_method='test', idempotency_key='cache-dep-1')
+
+    hits_before = wallet_cache.stats.hits
+    assert float(Wallet.get_by_user_id(CACHE_USER)['balance']) == pytest.approx(10.0)
+    assert float(Wallet.get_by_user_id(CACHE_USER)['balance']) == pytest.approx(10.0)
+    assert wallet_cache.stats.hits > hits_before
+
+    # Every write path must invalidate the cached row
+    Transaction.withdraw_atomic(CACHE_USER, 3.0, payment_method='test')
+    assert float(Wallet.get_balance(CACHE_USER)) == pytest.approx(7.0)
+    Transaction.transfer_atomic(CACHE_USER, CACHE_OTHER, 2.0)
+    assert float(Wallet.get_balance(CACHE_USER)) == pytest.approx(5.0)
+    assert float(Wallet.get_balance(CACHE_OTHER)) == pytest.approx(2.0)
+    Transaction.pay_atomic(CACHE_USER, 1.0)
+    assert float(Wallet.get_balance(CACHE_USER)) == pytest.approx(4.0)
+    Wallet.update_balance(CACHE_USER, 6.0, 'add')
+    assert float(Wallet.get_balance(CACHE_USER)) == pytest.approx(10.0)
+    Wallet.update_points(CACHE_USER, 5, 'add')
+    assert Wallet.get_points(CACHE_USER) == 5
+
+
+def test_concurrent_deposits_and_reads_converge():
+    start = _db_balance(CACHE_USER)
+    # 3 writers + 2 readers stay within the default pool size of 5
+    writers, deposits_each = 3, 10
+    done = threading.Event()
+    errors = []
+
+    def deposit():
+        try:
+            for _ in range(deposits_each):
+                Transaction.deposit_atomic(CACHE_USER, 1.0, payment_method='test')
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        # Readers may briefly see a balance from just before the latest commit, but never anything
+        # that was not a real committed balance
+        try:
+            while not done.is_set():
+                balance = float(Wallet.get_balance(CACHE_USER))
+                if not (start <= balance <= start + writers * deposits_each) or balance != int(balance):
+                    errors.append(AssertionError(f"impossible balance observed: {balance}"))
+                    return
+        except Exception as e:
+            errors.append(e)
+
+    writer_threads = [threading.Thread(target=deposit) for _ in range(writers)]
+    reader_threads = [threading.Thread(target=read) for _ in range(2)]
+    for t in reader_threads + writer_threads:
+        t.start()
+    for t in writer_threads:
+        t.join()
+    done.set()
+    for t in reader_threads:
+        t.join()
+
+    assert not errors
+    # Once writes stop, the cached read must match the database immediately (no waiting for the TTL)
+    expected = start + writers * deposits_each
+    assert _db_balance(CACHE_USER) == pytest.approx(expected)
+    assert float(Wallet.get_balance(CACHE_USER)) == pytest.approx(expected)
+
+
+@pytest.mark.skipif(config.CACHE_BACKEND == 'memory', reason="CACHE_BACKEND=memory misses other processes' writes")
+def test_configured_cache_sees_writes_from_another_process():
+    wallet = load_service_module('wallet_models_configured', 'wallet-service').Wallet
+    before = float(wallet.get_balance(CACHE_OTHER))
+
+    subprocess.run([sys.executable, '-c', DEPOSIT_SCRIPT, str(CACHE_OTHER)], cwd=BACKEND_DIR, check=True)
+
+    assert float(wallet.get_balance(CACHE_OTHER)) == pytest.approx(before + 1.0)
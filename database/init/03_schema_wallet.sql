@@ -10,3 +10,12 @@ CREATE TABLE IF NOT EXISTS wallets (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     UNIQUE KEY unique_user_wallet (user_id)
 );
+
+-- Sub-balances of hot wallets listed in the transaction service's SHARDED_WALLETS. A wallet's balance is
+-- wallets.balance plus the sum of its shard rows; debits fold the shards back into the wallets row.
+CREATE TABLE IF NOT EXISTS wallet_balance_shards (
+    user_id INT NOT NULL,
+    shard_id SMALLINT NOT NULL,
+    balance DECIMAL(10,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (user_id, shard_id)
+);
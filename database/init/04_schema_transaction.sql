@@ -1,20 +1,81 @@
 -- 04_schema_transaction.sql
 USE doswallet_transaction_db;
 
+-- Partitioned by month on date (PARTITION BY RANGE below): history reads prune to the months they touch and
+-- old months leave the table as a whole partition. pYYYYMM holds month YYYY-MM; pold everything before the
+-- first monthly partition; pmax everything after the last one. Partitions for coming months are split off pmax
+-- and months past the retention window are archived to files by
+-- backend/transaction-service/scripts/manage_partitions.py (see transaction-service/archive.py).
+-- A partitioned table's unique keys must contain date, so the primary key is (transaction_id, date) and
+-- idempotency keys are kept unique by transaction_idempotency_keys instead of a unique index here.
 CREATE TABLE IF NOT EXISTS transactions (
-    transaction_id INT AUTO_INCREMENT PRIMARY KEY,
+    transaction_id INT AUTO_INCREMENT,
     user_id INT NULL,
     amount DECIMAL(10,2) NOT NULL,
     type VARCHAR(20) NOT NULL COMMENT 'deposit, withdraw, transfer',
     payment_method VARCHAR(50),
-    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     receiver_id INT NULL,
     description TEXT,
     idempotency_key VARCHAR(100) DEFAULT NULL,
     status ENUM('pending','completed','failed') DEFAULT 'completed',
     qr_payload TEXT DEFAULT NULL,
-    INDEX idx_user_id (user_id),
+    PRIMARY KEY (transaction_id, date),
     INDEX idx_date (date),
     INDEX idx_type (type),
-    UNIQUE KEY unique_idempotency (idempotency_key)
+    -- Composite indexes for keyset (date, transaction_id) history pagination. History reads the
+    -- user_id and receiver_id sides separately (no OR), so each side needs its own ordered index.
+    -- idx_user_date also covers plain user_id lookups, replacing the old idx_user_id.
+    INDEX idx_user_date (user_id, date, transaction_id),
+    INDEX idx_receiver_date (receiver_id, date, transaction_id),
+    INDEX idx_user_type_date (user_id, type, date, transaction_id),
+    INDEX idx_idempotency (idempotency_key)
+)
+PARTITION BY RANGE (UNIX_TIMESTAMP(date)) (
+    PARTITION pold VALUES LESS THAN (UNIX_TIMESTAMP('2026-01-01 00:00:00')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- One row per idempotency key ever used by the ledger. Written in the same DB transaction as the ledger row,
+-- before it, so its primary key arbitrates concurrent requests with the same key. Rows stay after their
+-- transaction is archived, so an archived key cannot be reused.
+CREATE TABLE IF NOT EXISTS transaction_idempotency_keys (
+    idempotency_key VARCHAR(100) PRIMARY KEY
+);
+
+-- Deleting a ledger row frees its key. Archival drops whole partitions, which fires no triggers, so the keys of
+-- archived transactions stay taken.
+DROP TRIGGER IF EXISTS transactions_release_idempotency_key;
+CREATE TRIGGER transactions_release_idempotency_key AFTER DELETE ON transactions FOR EACH ROW
+    DELETE FROM transaction_idempotency_keys WHERE idempotency_key = OLD.idempotency_key;
+
+-- Transactional outbox for notifications: payment paths insert here in the same DB transaction as the
+-- payment; notification_dispatcher.py moves rows into notifications in batches and deletes them.
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    message TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-user, per-day, per-type totals of completed transactions (types: deposit, withdraw, transfer_out,
+-- transfer_in). Maintained in the same DB transaction as every ledger insert; backfill or repair with
+-- backend/transaction-service/scripts/rebuild_transaction_summary.py.
+CREATE TABLE IF NOT EXISTS transaction_daily_summary (
+    user_id INT NOT NULL,
+    day DATE NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    -- Credits to a sharded wallet are spread over shards like its balance; readers SUM over shards
+    shard SMALLINT NOT NULL DEFAULT 0,
+    tx_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(15,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (user_id, day, type, shard)
+);
+
+-- NIM -> user_id for the Food Delivery Pay mutation. Owned by the transaction service, written by the user
+-- service on registration / profile update (USER_NIMS_TABLE); backfill with migration/backfill_user_nims.sql.
+CREATE TABLE IF NOT EXISTS user_nims (
+    user_id INT PRIMARY KEY,
+    nim VARCHAR(100) NOT NULL,
+    UNIQUE KEY nim (nim)
 );
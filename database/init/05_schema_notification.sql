@@ -8,5 +8,14 @@ CREATE TABLE IF NOT EXISTS notifications (
     date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     read_status BOOLEAN DEFAULT FALSE,
     INDEX idx_user_id (user_id),
-    INDEX idx_read_status (read_status)
+    -- Listing (all or unread only, newest first) and mark_all_as_read's unread rows
+    INDEX idx_user_read_date (user_id, read_status, date)
+);
+
+-- Unread notifications per user, kept in step with notifications by every writer (Notification.create /
+-- mark_as_read / mark_all_as_read, the outbox dispatcher) so the badge count is a primary key read.
+-- Recompute with notification-service/scripts/reconcile_unread_counts.py.
+CREATE TABLE IF NOT EXISTS notification_unread_counts (
+    user_id INT PRIMARY KEY,
+    unread INT NOT NULL DEFAULT 0
 );
@@ -5,6 +5,10 @@
 CREATE USER IF NOT EXISTS 'dos_user'@'%' IDENTIFIED BY 'dos_user_pass';
 ALTER USER 'dos_user'@'%' IDENTIFIED BY 'dos_user_pass';
 GRANT ALL PRIVILEGES ON doswallet_user_db.* TO 'dos_user'@'%';
+-- Registration creates the new user's wallet in the same transaction
+GRANT INSERT ON doswallet_wallet_db.* TO 'dos_user'@'%';
+-- ... and keeps the transaction service's NIM lookup table in sync (created by 04_schema_transaction.sql)
+GRANT SELECT, INSERT, UPDATE, DELETE ON doswallet_transaction_db.user_nims TO 'dos_user'@'%';
 
 -- Wallet Service
 CREATE USER IF NOT EXISTS 'dos_wallet'@'%' IDENTIFIED BY 'dos_wallet_pass';
@@ -15,6 +19,10 @@ GRANT ALL PRIVILEGES ON doswallet_wallet_db.* TO 'dos_wallet'@'%';
 CREATE USER IF NOT EXISTS 'dos_tx'@'%' IDENTIFIED BY 'dos_tx_pass';
 ALTER USER 'dos_tx'@'%' IDENTIFIED BY 'dos_tx_pass';
 GRANT ALL PRIVILEGES ON doswallet_transaction_db.* TO 'dos_tx'@'%';
+-- The transaction service's notification dispatcher delivers its outbox into the notification DB
+GRANT INSERT ON doswallet_notification_db.* TO 'dos_tx'@'%';
+-- ... and bumps the unread counters of the delivered users (created by 05_schema_notification.sql)
+GRANT SELECT, UPDATE ON doswallet_notification_db.notification_unread_counts TO 'dos_tx'@'%';
 
 -- Notification Service
 CREATE USER IF NOT EXISTS 'dos_notify'@'%' IDENTIFIED BY 'dos_notify_pass';
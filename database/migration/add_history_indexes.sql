@@ -0,0 +1,28 @@
+-- add_history_indexes.sql
+-- Bring the indexes of an existing doswallet_transaction_db.transactions table up to init/04_schema_transaction.sql:
+-- the (..., date, transaction_id) indexes behind keyset history paging and the per-side history reads, and no
+-- idx_user_id (idx_user_date covers it). All changes are made by one online ALTER.
+-- Safe to re-run: indexes that already exist (or are already gone) are skipped.
+-- Single-database setups (database/schema.sql): set @schema to 'doswallet'.
+
+SET @schema = 'doswallet_transaction_db';
+
+SELECT CONCAT_WS(', ',
+    IF(SUM(INDEX_NAME = 'idx_user_date') = 0, 'ADD INDEX idx_user_date (user_id, date, transaction_id)', NULL),
+    IF(SUM(INDEX_NAME = 'idx_receiver_date') = 0, 'ADD INDEX idx_receiver_date (receiver_id, date, transaction_id)', NULL),
+    IF(SUM(INDEX_NAME = 'idx_user_type_date') = 0, 'ADD INDEX idx_user_type_date (user_id, type, date, transaction_id)', NULL),
+    IF(SUM(INDEX_NAME = 'idx_user_id') > 0, 'DROP INDEX idx_user_id', NULL)
+) INTO @changes
+FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = @schema AND TABLE_NAME = 'transactions';
+
+SET @sql = IF(@changes = '', 'DO 0',
+              CONCAT('ALTER TABLE `', @schema, '`.transactions ', @changes, ', ALGORITHM=INPLACE, LOCK=NONE'));
+PREPARE add_history_indexes FROM @sql;
+EXECUTE add_history_indexes;
+DEALLOCATE PREPARE add_history_indexes;
+
+SELECT 'history_indexes' AS status, GROUP_CONCAT(DISTINCT INDEX_NAME ORDER BY INDEX_NAME) AS indexes
+FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = @schema AND TABLE_NAME = 'transactions'
+  AND INDEX_NAME IN ('idx_user_date', 'idx_receiver_date', 'idx_user_type_date', 'idx_user_id');
@@ -0,0 +1,11 @@
+-- backfill_user_nims.sql
+-- Fill the transaction service's NIM lookup table for users registered before it existed.
+-- The NIM is the local part of the email (NIM@university.edu); when several users share one, the oldest keeps it.
+-- Safe to re-run: users that already have a NIM are skipped.
+-- Single-database setups (database/schema.sql): replace both schema names with `doswallet`.
+
+INSERT IGNORE INTO doswallet_transaction_db.user_nims (user_id, nim)
+SELECT user_id, SUBSTRING_INDEX(email, '@', 1) FROM doswallet_user_db.users
+ORDER BY user_id;
+
+SELECT 'user_nims_backfilled' AS status, COUNT(1) AS rows FROM doswallet_transaction_db.user_nims;
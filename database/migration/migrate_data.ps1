@@ -10,7 +10,8 @@ $files = @(
   "database/migration/migrate_users.sql",
   "database/migration/migrate_wallets.sql",
   "database/migration/migrate_transactions.sql",
-  "database/migration/migrate_notifications.sql"
+  "database/migration/migrate_notifications.sql",
+  "database/migration/backfill_user_nims.sql"
 )
 
 # Ensure per-service databases and users exist (run init script if present)
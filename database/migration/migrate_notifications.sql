@@ -5,4 +5,9 @@ INSERT INTO doswallet_notification_db.notifications (notification_id, user_id, m
 SELECT notification_id, user_id, message, date, read_status FROM doswallet.notifications
 ON DUPLICATE KEY UPDATE message=VALUES(message), read_status=VALUES(read_status), date=VALUES(date);
 
+-- Unread counters for the copied notifications
+INSERT INTO doswallet_notification_db.notification_unread_counts (user_id, unread)
+SELECT user_id, SUM(read_status = FALSE) FROM doswallet_notification_db.notifications GROUP BY user_id
+ON DUPLICATE KEY UPDATE unread=VALUES(unread);
+
 SELECT 'notifications_migrated' AS status, COUNT(1) AS rows FROM doswallet_notification_db.notifications;
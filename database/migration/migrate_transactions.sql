@@ -5,4 +5,8 @@ INSERT INTO doswallet_transaction_db.transactions (transaction_id, user_id, amou
 SELECT transaction_id, user_id, amount, type, payment_method, date, receiver_id, description, idempotency_key, status, qr_payload FROM doswallet.transactions
 ON DUPLICATE KEY UPDATE amount=VALUES(amount), status=VALUES(status), description=VALUES(description);
 
+-- Reserve the copied idempotency keys
+INSERT IGNORE INTO doswallet_transaction_db.transaction_idempotency_keys (idempotency_key)
+SELECT idempotency_key FROM doswallet_transaction_db.transactions WHERE idempotency_key IS NOT NULL;
+
 SELECT 'transactions_migrated' AS status, COUNT(1) AS rows FROM doswallet_transaction_db.transactions;
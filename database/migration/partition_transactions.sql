@@ -0,0 +1,38 @@
+-- partition_transactions.sql
+-- One-off upgrade of an existing doswallet_transaction_db.transactions table to the monthly partitioned layout
+-- of init/04_schema_transaction.sql. Rebuilds the table: run it in a maintenance window, then create the
+-- monthly partitions with backend/transaction-service/scripts/manage_partitions.py create
+-- (rows already in the table move from pold / pmax into their months).
+
+USE doswallet_transaction_db;
+
+CREATE TABLE IF NOT EXISTS transaction_idempotency_keys (
+    idempotency_key VARCHAR(100) PRIMARY KEY
+);
+
+INSERT IGNORE INTO transaction_idempotency_keys (idempotency_key)
+SELECT idempotency_key FROM transactions WHERE idempotency_key IS NOT NULL;
+
+-- Deleting a ledger row frees its key. Archival drops whole partitions, which fires no triggers, so the keys of
+-- archived transactions stay taken.
+DROP TRIGGER IF EXISTS transactions_release_idempotency_key;
+CREATE TRIGGER transactions_release_idempotency_key AFTER DELETE ON transactions FOR EACH ROW
+    DELETE FROM transaction_idempotency_keys WHERE idempotency_key = OLD.idempotency_key;
+
+ALTER TABLE transactions
+    MODIFY date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (transaction_id, date),
+    DROP INDEX unique_idempotency,
+    ADD INDEX idx_idempotency (idempotency_key);
+
+-- pold ends at the first month that gets its own partition; older rows stay in pold
+ALTER TABLE transactions
+    PARTITION BY RANGE (UNIX_TIMESTAMP(date)) (
+        PARTITION pold VALUES LESS THAN (UNIX_TIMESTAMP('2026-01-01 00:00:00')),
+        PARTITION pmax VALUES LESS THAN MAXVALUE
+    );
+
+SELECT 'transactions_partitioned' AS status, COUNT(1) AS partitions
+FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = 'doswallet_transaction_db' AND TABLE_NAME = 'transactions';
@@ -20,7 +20,9 @@ $migrationFiles = @(
     "database/migration/migrate_users.sql",
     "database/migration/migrate_wallets.sql",
     "database/migration/migrate_transactions.sql",
-    "database/migration/migrate_notifications.sql"
+    "database/migration/add_history_indexes.sql",
+    "database/migration/migrate_notifications.sql",
+    "database/migration/backfill_user_nims.sql"
 )
 
 function Exec-MySQLFile($path) {
@@ -11,7 +11,9 @@ MIGS=(
   "database/migration/migrate_users.sql"
   "database/migration/migrate_wallets.sql"
   "database/migration/migrate_transactions.sql"
+  "database/migration/add_history_indexes.sql"
   "database/migration/migrate_notifications.sql"
+  "database/migration/backfill_user_nims.sql"
 )
 
 # Check container
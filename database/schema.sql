@@ -27,26 +27,84 @@ CREATE TABLE IF NOT EXISTS wallets (
     UNIQUE KEY unique_user_wallet (user_id)
 );
 
+-- Sub-balances of hot wallets listed in the transaction service's SHARDED_WALLETS. A wallet's balance is
+-- wallets.balance plus the sum of its shard rows; debits fold the shards back into the wallets row.
+CREATE TABLE IF NOT EXISTS wallet_balance_shards (
+    user_id INT NOT NULL,
+    shard_id SMALLINT NOT NULL,
+    balance DECIMAL(10,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (user_id, shard_id)
+);
+
 -- Transaction Table
+-- Same columns and keys as database/init/04_schema_transaction.sql, where the table is also partitioned by
+-- month. Partitioned InnoDB tables cannot have foreign keys, so this single-database schema keeps its foreign
+-- keys and stays unpartitioned.
 CREATE TABLE IF NOT EXISTS transactions (
-    transaction_id INT AUTO_INCREMENT PRIMARY KEY,
+    transaction_id INT AUTO_INCREMENT,
     user_id INT NOT NULL,
     amount DECIMAL(10,2) NOT NULL,
     type VARCHAR(20) NOT NULL COMMENT 'deposit, withdraw, transfer',
     payment_method VARCHAR(50),
-    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     receiver_id INT NULL,
     description TEXT,
     idempotency_key VARCHAR(100) DEFAULT NULL,
     status ENUM('pending','completed','failed') DEFAULT 'completed',
     qr_payload TEXT DEFAULT NULL,
+    PRIMARY KEY (transaction_id, date),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (receiver_id) REFERENCES users(user_id) ON DELETE SET NULL,
-    INDEX idx_user_id (user_id),
     INDEX idx_date (date),
-    INDEX idx_type (type)
-    ,
-    UNIQUE KEY unique_idempotency (idempotency_key)
+    INDEX idx_type (type),
+    -- Composite indexes for keyset (date, transaction_id) history pagination. History reads the
+    -- user_id and receiver_id sides separately (no OR), so each side needs its own ordered index.
+    -- idx_user_date also covers plain user_id lookups, replacing the old idx_user_id.
+    INDEX idx_user_date (user_id, date, transaction_id),
+    INDEX idx_receiver_date (receiver_id, date, transaction_id),
+    INDEX idx_user_type_date (user_id, type, date, transaction_id),
+    INDEX idx_idempotency (idempotency_key)
+);
+
+-- Idempotency keys used by the ledger; their primary key arbitrates concurrent requests with the same key
+CREATE TABLE IF NOT EXISTS transaction_idempotency_keys (
+    idempotency_key VARCHAR(100) PRIMARY KEY
+);
+
+-- Deleting a ledger row frees its key
+DROP TRIGGER IF EXISTS transactions_release_idempotency_key;
+CREATE TRIGGER transactions_release_idempotency_key AFTER DELETE ON transactions FOR EACH ROW
+    DELETE FROM transaction_idempotency_keys WHERE idempotency_key = OLD.idempotency_key;
+
+-- Per-user, per-day, per-type totals of completed transactions (types: deposit, withdraw, transfer_out,
+-- transfer_in). Maintained in the same DB transaction as every ledger insert; backfill or repair with
+-- backend/transaction-service/scripts/rebuild_transaction_summary.py.
+CREATE TABLE IF NOT EXISTS transaction_daily_summary (
+    user_id INT NOT NULL,
+    day DATE NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    -- Credits to a sharded wallet are spread over shards like its balance; readers SUM over shards
+    shard SMALLINT NOT NULL DEFAULT 0,
+    tx_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(15,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (user_id, day, type, shard)
+);
+
+-- Transactional outbox for notifications: payment paths insert here in the same DB transaction as the
+-- payment; notification_dispatcher.py moves rows into notifications in batches and deletes them.
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    message TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- NIM -> user_id for the Food Delivery Pay mutation. Owned by the transaction service, written by the user
+-- service on registration / profile update (USER_NIMS_TABLE); backfill with migration/backfill_user_nims.sql.
+CREATE TABLE IF NOT EXISTS user_nims (
+    user_id INT PRIMARY KEY,
+    nim VARCHAR(100) NOT NULL,
+    UNIQUE KEY nim (nim)
 );
 
 -- Notification Table
@@ -58,6 +116,15 @@ CREATE TABLE IF NOT EXISTS notifications (
     read_status BOOLEAN DEFAULT FALSE,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
-    INDEX idx_read_status (read_status)
+    -- Listing (all or unread only, newest first) and mark_all_as_read's unread rows
+    INDEX idx_user_read_date (user_id, read_status, date)
+);
+
+-- Unread notifications per user, kept in step with notifications by every writer (Notification.create /
+-- mark_as_read / mark_all_as_read, the outbox dispatcher) so the badge count is a primary key read.
+-- Recompute with notification-service/scripts/reconcile_unread_counts.py.
+CREATE TABLE IF NOT EXISTS notification_unread_counts (
+    user_id INT PRIMARY KEY,
+    unread INT NOT NULL DEFAULT 0
 );
 